@@ -0,0 +1,224 @@
+import asyncio
+import glob
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from cache import open_db
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# ----------------- Configuration -----------------
+
+AUDIO_CACHE_DIR   = os.getenv('HIMARI_AUDIO_CACHE_DIR', '')            # empty = off
+AUDIO_CACHE_MB    = int(os.getenv('HIMARI_AUDIO_CACHE_MB', '2048'))     # disk budget
+AUDIO_CACHE_PLAYS = int(os.getenv('HIMARI_AUDIO_CACHE_PLAYS', '3'))     # plays before a track is kept
+AUDIO_QUOTA_MB    = int(os.getenv('HIMARI_AUDIO_QUOTA_MB', '1024'))     # downloads per 24 h
+AUDIO_CACHE_JOBS  = 1
+AUDIO_TIMEOUT     = 300
+QUOTA_WINDOW      = 24 * 3600
+
+FETCH_OPTS = ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+
+# -------------------------------------------------
+
+MB = 1024 * 1024
+
+
+class AudioCache:
+    """
+    Opus/WebM copies of the bot's most-played tracks, keyed by videoId, so
+    they play from local disk: no googlevideo round trip before the first
+    frame, and no signed URL to expire or get throttled mid-song.
+
+    A track is fetched once it has been played ``min_plays`` times, in the
+    background with ffmpeg's codec copy (no decode), into ``dir``. Files
+    are evicted least recently played first once they pass ``budget_mb``,
+    and downloads stop for the day once ``quota_mb`` has been fetched in
+    the last 24 hours.
+
+    The bot processes of launcher.py can share ``dir``: the index, the
+    budget and the quota live in its database, a download counts against
+    the quota from the moment it starts, and each process writes its
+    partial files under its own name.
+    """
+
+    def __init__(
+        self,
+        dir: Optional[str] = AUDIO_CACHE_DIR,
+        budget_mb: int = AUDIO_CACHE_MB,
+        min_plays: int = AUDIO_CACHE_PLAYS,
+        quota_mb: int = AUDIO_QUOTA_MB,
+        ffmpeg: str = 'ffmpeg',
+    ):
+        self.dir       = dir or None
+        self.budget    = budget_mb * MB
+        self.quota     = quota_mb * MB
+        self.min_plays = min_plays
+        self.ffmpeg    = ffmpeg
+        self.size      = 0
+        self.entries: 'OrderedDict[str, Tuple[int, int]]' = OrderedDict()   # videoId -> (bytes, abr), LRU first
+        self._jobs = asyncio.Semaphore(AUDIO_CACHE_JOBS)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.db = None
+        if self.dir:
+            os.makedirs(self.dir, exist_ok=True)
+            self.db = open_db(os.path.join(self.dir, 'index.db'))
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS audio (video_id TEXT PRIMARY KEY, size INTEGER NOT NULL, '
+                'abr INTEGER NOT NULL, last_played REAL NOT NULL)'
+            )
+            # downloads within the quota window, by every process; size is the estimate until done
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS fetches (id INTEGER PRIMARY KEY, started REAL NOT NULL, size INTEGER NOT NULL)'
+            )
+            self._load()
+
+    def _load(self):
+        # half-written downloads from a previous run; younger ones may be another process's
+        for part in glob.glob(os.path.join(self.dir, '*.part')):
+            try:
+                if os.path.getmtime(part) < time.time() - 2 * AUDIO_TIMEOUT:
+                    os.remove(part)
+            except FileNotFoundError:
+                pass
+        rows = self.db.execute('SELECT video_id, size, abr FROM audio ORDER BY last_played').fetchall()
+        for video_id, size, abr in rows:
+            if os.path.exists(self._file(video_id)):
+                self.entries[video_id] = (size, abr)
+                self.size += size
+            else:
+                self.db.execute('DELETE FROM audio WHERE video_id = ?', (video_id,))
+        logger.info(f"Audio cache has {len(self.entries)} tracks ({self.size / MB:.0f} MB)")
+
+    def _file(self, video_id: str) -> str:
+        return os.path.join(self.dir, f"{video_id}.webm")
+
+    # ---- lookups ----
+
+    def _lookup(self, video_id: str) -> Optional[Tuple[int, int]]:
+        entry = self.entries.get(video_id)
+        if entry is None and self.db is not None:
+            # fetched by another process sharing the directory
+            row = self.db.execute('SELECT size, abr FROM audio WHERE video_id = ?', (video_id,)).fetchone()
+            if row is not None and os.path.exists(self._file(video_id)):
+                entry = self.entries[video_id] = tuple(row)
+                self.size += entry[0]
+        return entry
+
+    def has(self, video_id: str) -> bool:
+        return self._lookup(video_id) is not None
+
+    def open(self, video_id: str) -> Optional[Tuple[str, int]]:
+        """
+        (path, bitrate) of the local copy, counting as a play for eviction.
+        """
+        entry = self._lookup(video_id)
+        if entry is None:
+            return None
+        path = self._file(video_id)
+        if not os.path.exists(path):
+            self._drop(video_id)
+            return None
+        self.entries.move_to_end(video_id)
+        self.db.execute('UPDATE audio SET last_played = ? WHERE video_id = ?', (time.time(), video_id))
+        return path, entry[1]
+
+    # ---- filling ----
+
+    def _spent(self, now: float) -> int:
+        self.db.execute('DELETE FROM fetches WHERE started <= ?', (now - QUOTA_WINDOW,))
+        return self.db.execute('SELECT COALESCE(SUM(size), 0) FROM fetches').fetchone()[0]
+
+    def consider(self, video_id: str, url: str, *, plays: int, codec: str, abr: int, duration: float):
+        """
+        Start fetching a track in the background if it's popular enough, an
+        Opus stream (so it can be copied as-is), and fits today's quota.
+        """
+        if self.dir is None or plays < self.min_plays or codec != 'opus':
+            return
+        if video_id in self._inflight or self.has(video_id):
+            return
+        now = time.time()
+        estimate = int((abr or 160) * 1000 / 8 * (duration or 300))
+        if self._spent(now) + estimate > self.quota or estimate > self.budget:
+            return
+        # reserved up front, so fetches still running count against the quota too
+        fetch_id = self.db.execute('INSERT INTO fetches (started, size) VALUES (?, ?)', (now, estimate)).lastrowid
+        task = self._inflight[video_id] = asyncio.create_task(
+            self._fetch(video_id, url, abr, fetch_id), name=f'audio-cache {video_id}'
+        )
+        task.add_done_callback(lambda _: self._inflight.pop(video_id, None))
+
+    async def _fetch(self, video_id: str, url: str, abr: int, fetch_id: int):
+        path = self._file(video_id)
+        part = f"{path}.{os.getpid()}.part"
+        try:
+            async with self._jobs:
+                async with timed('audio_cache_fetch'):
+                    await self._run(url, part)
+                size = os.path.getsize(part)
+                os.replace(part, path)
+        except Exception:
+            logger.warning(f"Could not cache audio for {video_id}", exc_info=True)
+            if os.path.exists(part):
+                os.remove(part)
+            self.db.execute('DELETE FROM fetches WHERE id = ?', (fetch_id,))
+            return
+        self.db.execute('UPDATE fetches SET size = ? WHERE id = ?', (size, fetch_id))
+        if video_id in self.entries:
+            self.size -= self.entries[video_id][0]
+        self.entries[video_id] = (size, int(abr or 0))
+        self.size += size
+        self.db.execute(
+            'INSERT OR REPLACE INTO audio (video_id, size, abr, last_played) VALUES (?, ?, ?, ?)',
+            (video_id, size, int(abr or 0), time.time())
+        )
+        self._evict()
+
+    async def _run(self, url: str, out: str):
+        proc = await asyncio.create_subprocess_exec(
+            self.ffmpeg, '-hide_banner', '-nostats', '-loglevel', 'error', *FETCH_OPTS, '-i', url,
+            '-vn', '-c:a', 'copy', '-f', 'webm', out,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, stderr = await asyncio.wait_for(proc.communicate(), AUDIO_TIMEOUT)
+        except asyncio.TimeoutError:
+            proc.kill()
+            raise
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with {proc.returncode}: {stderr.decode(errors='replace')[-200:]}")
+
+    # ---- eviction ----
+
+    def _drop(self, video_id: str):
+        size, _ = self.entries.pop(video_id, (0, 0))
+        self.size -= size
+        self.db.execute('DELETE FROM audio WHERE video_id = ?', (video_id,))
+        try:
+            os.remove(self._file(video_id))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        # the budget is for the directory, whichever process fetched the files
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM audio').fetchone()[0]
+        if total <= self.budget:
+            return
+        for video_id, size in self.db.execute('SELECT video_id, size FROM audio ORDER BY last_played').fetchall():
+            if total <= self.budget:
+                break
+            self._drop(video_id)
+            total -= size
+
+    def close(self):
+        for task in self._inflight.values():
+            task.cancel()
+        if self.db is not None:
+            self.db.close()
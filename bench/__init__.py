@@ -0,0 +1,11 @@
+"""
+Offline benchmarks for Himari's hot paths.
+
+Everything runs against local stand-ins (a fake LrcLib HTTP server, stub
+YTMusic / yt-dlp resolvers with configurable latency, a simulated voice
+client), so results don't depend on the network. From the repo root:
+
+    python -m bench.run --guilds 16 --out before.json
+    python -m bench.run --guilds 16 --out after.json
+    python -m bench.compare before.json after.json
+"""
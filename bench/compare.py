@@ -0,0 +1,73 @@
+import argparse
+import json
+import sys
+from typing import Dict, Iterator, Tuple
+
+# which direction is better, by metric-name suffix
+LOWER_IS_BETTER  = ('_ms', '_s', 'limited', 'http_requests')
+HIGHER_IS_BETTER = ('_per_s',)
+
+
+def flatten(tree: dict, prefix: str = '') -> Iterator[Tuple[str, float]]:
+    for key, value in tree.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, float(value)
+
+
+def direction(metric: str) -> int:
+    """
+    +1 if bigger is better, -1 if smaller is better, 0 if it's informational.
+    """
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(before: dict, after: dict, threshold: float) -> Tuple[list, int]:
+    old: Dict[str, float] = dict(flatten(before['results']))
+    new: Dict[str, float] = dict(flatten(after['results']))
+    rows, regressions = [], 0
+    for metric in sorted(old.keys() & new.keys()):
+        a, b = old[metric], new[metric]
+        sign = direction(metric)
+        change = (b - a) / a if a else 0.0
+        verdict = ''
+        if sign and abs(change) >= threshold:
+            better = change * sign > 0
+            verdict = 'better' if better else 'WORSE'
+            regressions += not better
+        rows.append((metric, a, b, change, verdict))
+    return rows, regressions
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description='Compare two bench.run result files')
+    p.add_argument('before')
+    p.add_argument('after')
+    p.add_argument('--threshold', type=float, default=0.10, help='relative change worth flagging')
+    args = p.parse_args(argv)
+
+    with open(args.before, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(args.after, encoding='utf-8') as f:
+        after = json.load(f)
+    if before.get('params') != after.get('params'):
+        print('warning: the two runs used different parameters', file=sys.stderr)
+
+    rows, regressions = compare(before, after, args.threshold)
+    width = max((len(r[0]) for r in rows), default=10)
+    print(f"{'metric':<{width}}  {before.get('commit') or 'before':>12}  {after.get('commit') or 'after':>12}  change")
+    for metric, a, b, change, verdict in rows:
+        print(f"{metric:<{width}}  {a:>12.3f}  {b:>12.3f}  {change:+7.1%} {verdict}")
+    if regressions:
+        print(f"\n{regressions} metric(s) regressed by {args.threshold:.0%} or more")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+import random
+from typing import List, Tuple
+
+WORDS = (
+    'kimi', 'no', 'koe', 'ga', 'kikoeru', 'yoru', 'sora', 'hikari', 'ashita', 'yume',
+    'love', 'tonight', 'forever', 'dancing', 'in', 'the', 'rain', 'heart', 'beat', 'again',
+    '君', 'の', '声', '夜', '空', '光', '明日', '夢', '星', '風',
+)
+
+
+def _stamp(t: float) -> str:
+    m, s = divmod(t, 60)
+    return f"[{int(m):02}:{s:05.2f}]"
+
+
+def synthetic_lrc(
+    lines: int = 2000,
+    *,
+    seed: int = 0,
+    gap: Tuple[float, float] = (0.3, 4.0),
+    repeat: float = 0.25,
+    word_tags: float = 0.1,
+    offset: int = 0,
+) -> str:
+    """
+    A long, messy LRC document: chorus lines carrying several timestamps,
+    enhanced ``<mm:ss.xx>`` word tags, metadata and blank lines.
+    """
+    rng = random.Random(seed)
+    out = ['[ar:Bench Artist]', '[ti:Bench Title]', '[by:himari bench]']
+    if offset:
+        out.append(f'[offset:{offset}]')
+    chorus: List[str] = []
+    t = 0.0
+    n = 0
+    while n < lines:
+        t += rng.uniform(*gap)
+        if chorus and rng.random() < repeat:
+            # chorus lines come back: emit one line with several stamps
+            text  = rng.choice(chorus)
+            times = [t]
+            for _ in range(rng.randint(1, 3)):
+                t += rng.uniform(*gap)
+                times.append(t)
+            out.append(''.join(_stamp(x) for x in times) + text)
+            n += len(times)
+            continue
+        words = [rng.choice(WORDS) for _ in range(rng.randint(2, 9))]
+        if rng.random() < word_tags:
+            step = rng.uniform(0.1, 0.4)
+            text = ' '.join(f"<{_stamp(t + i * step)[1:-1]}>{w}" for i, w in enumerate(words))
+        else:
+            text = ' '.join(words)
+        if len(chorus) < 8 and rng.random() < 0.2:
+            chorus.append(text)
+        out.append(_stamp(t) + text)
+        if rng.random() < 0.02:
+            out.append('')
+        n += 1
+    return '\n'.join(out)
+
+
+def corpus(documents: int = 50, lines: int = 2000, seed: int = 0) -> List[str]:
+    return [synthetic_lrc(lines, seed=seed + i, offset=(250 if i % 5 == 0 else 0)) for i in range(documents)]
@@ -0,0 +1,252 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import discord
+from aiohttp import web
+
+from bench.corpus import synthetic_lrc
+from player import FRAME_SECONDS
+from resolver import StreamResolver
+
+# ---------------- LrcLib ----------------
+
+
+class FakeLrcLib:
+    """
+    Local LrcLib stand-in serving /api/get, /api/get/{id} and /api/search.
+
+    Every song title it's asked about gets a deterministic synthetic
+    record; titles starting with ``instrumental`` have no lyrics and ones
+    starting with ``missing`` aren't found at all.
+    """
+
+    def __init__(self, latency: float = 0.05, lines: int = 80):
+        self.latency  = latency
+        self.lines    = lines
+        self.requests = 0
+        self._ids: Dict[str, int] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ''
+
+    def _record(self, title: str, artist: str, duration: int) -> Optional[dict]:
+        if title.lower().startswith('missing'):
+            return None
+        track_id = self._ids.setdefault(f"{title}|{artist}", len(self._ids) + 1)
+        instrumental = title.lower().startswith('instrumental')
+        return {
+            'id': track_id,
+            'trackName': title,
+            'artistName': artist,
+            'duration': duration,
+            'instrumental': instrumental,
+            'plainLyrics': None,
+            'syncedLyrics': None if instrumental else synthetic_lrc(self.lines, seed=track_id),
+        }
+
+    async def _delay(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def _get(self, request: web.Request):
+        await self._delay()
+        q = request.query
+        record = self._record(q.get('track_name', ''), q.get('artist_name', ''), int(q.get('duration', 0)))
+        return web.json_response(record) if record else web.json_response({'code': 404}, status=404)
+
+    async def _get_by_id(self, request: web.Request):
+        await self._delay()
+        track_id = int(request.match_info['id'])
+        key = next((k for k, v in self._ids.items() if v == track_id), None)
+        if key is None:
+            return web.json_response({'code': 404}, status=404)
+        title, artist = key.split('|', 1)
+        return web.json_response(self._record(title, artist, 200))
+
+    async def _search(self, request: web.Request):
+        await self._delay()
+        q = request.query
+        if 'track_name' in q:
+            title, artist = q['track_name'], q.get('artist_name', '')
+        else:
+            title, _, artist = q.get('q', '').rpartition(' ')
+        record = self._record(title or artist, artist, 200)
+        return web.json_response([record] if record else [])
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/api/get', self._get)
+        app.router.add_get('/api/get/{id}', self._get_by_id)
+        app.router.add_get('/api/search', self._search)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+# ---------------- YTMusic / yt-dlp ----------------
+
+
+class StubResolver(StreamResolver):
+    """
+    StreamResolver whose YTMusic search and yt-dlp extraction are replaced
+    by sleeps (on the same worker threads, under the same limits).
+    """
+
+    def __init__(self, search_latency: float = 0.3, extract_latency: float = 0.8, jitter: float = 0.2, **kwargs):
+        super().__init__(socket=None, **kwargs)
+        self.search_latency  = search_latency
+        self.extract_latency = extract_latency
+        self.jitter = jitter
+
+    def _sleep(self, base: float):
+        time.sleep(max(0.0, base * (1 + random.uniform(-self.jitter, self.jitter))))
+
+    def _search(self, query: str) -> Optional[dict]:
+        self._sleep(self.search_latency)
+        video_id = f"v{abs(hash(query)) % 10 ** 10:010d}"
+        return {
+            'videoId': video_id,
+            'title': query.title(),
+            'artists': [{'name': 'Bench Artist'}],
+            'album': {'name': 'Bench Album'},
+            'duration': '3:20',
+        }
+
+    def _extract(self, url: str) -> dict:
+        self._sleep(self.extract_latency)
+        expire = int(time.time()) + 6 * 3600
+        return {
+            'url': f"https://rr1---bench.googlevideo.com/videoplayback?expire={expire}&id={url[-11:]}",
+            'thumbnail': None,
+            'acodec': 'opus',
+            'abr': 128,
+        }
+
+
+# ---------------- Voice ----------------
+
+
+class FakeSource(discord.AudioSource):
+    def __init__(self, frames: int = 500):
+        self.frames = frames
+
+    def read(self) -> bytes:
+        if self.frames <= 0:
+            return b''
+        self.frames -= 1
+        return b'\xf8\xff\xfe'
+
+    def is_opus(self) -> bool:
+        return True
+
+
+class FakeVoiceClient:
+    """
+    Reads the source on its own thread like discord.py's AudioPlayer,
+    ``speed`` times faster than real time.
+    """
+
+    def __init__(self, speed: float = 50.0):
+        self.speed     = speed
+        self.connected = True
+        self._stop     = threading.Event()
+        self._resume   = threading.Event()
+        self._resume.set()
+        self._thread: Optional[threading.Thread] = None
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def play(self, source: discord.AudioSource, *, after: Callable[[Optional[Exception]], None]):
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._pump, args=(source, after, self._stop), daemon=True)
+        self._thread.start()
+
+    def _pump(self, source, after, stop: threading.Event):
+        while not stop.is_set():
+            self._resume.wait()
+            if not source.read():
+                break
+            time.sleep(FRAME_SECONDS / self.speed)
+        after(None)
+
+    def stop(self):
+        self._stop.set()
+        self._resume.set()
+
+    def pause(self):
+        self._resume.clear()
+
+    def resume(self):
+        self._resume.set()
+
+    async def disconnect(self):
+        self.stop()
+        self.connected = False
+
+
+class FakeVoiceChannel:
+    def __init__(self, speed: float = 50.0, latency: float = 0.05):
+        self.speed   = speed
+        self.latency = latency
+
+    async def connect(self) -> FakeVoiceClient:
+        await asyncio.sleep(self.latency)
+        return FakeVoiceClient(self.speed)
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.voice_client = None
+
+
+# ---------------- Messages ----------------
+
+
+class _FakeResponse:
+    def __init__(self, status: int, retry_after: float):
+        self.status  = status
+        self.reason  = 'Too Many Requests'
+        self.headers = {'Retry-After': str(retry_after)}
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+
+
+class FakeMessage:
+    """
+    A message whose ``edit()`` takes ``latency`` seconds and answers 429
+    with probability ``rate_limit``.
+    """
+
+    _ids = 0
+
+    def __init__(self, channel: FakeChannel, latency: float = 0.08, rate_limit: float = 0.0):
+        FakeMessage._ids += 1
+        self.id         = FakeMessage._ids
+        self.channel    = channel
+        self.latency    = latency
+        self.rate_limit = rate_limit
+        self.edits: List[float] = []    # seconds each successful edit took
+        self.limited    = 0
+
+    async def edit(self, *, embed: discord.Embed):
+        started = time.perf_counter()
+        await asyncio.sleep(self.latency)
+        if self.rate_limit and random.random() < self.rate_limit:
+            self.limited += 1
+            raise discord.HTTPException(_FakeResponse(429, 1.0), 'rate limited')
+        self.edits.append(time.perf_counter() - started)
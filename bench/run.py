@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import discord
+
+from bench.corpus import corpus
+from bench.fakes import FakeChannel, FakeGuild, FakeLrcLib, FakeMessage, FakeSource, FakeVoiceChannel, StubResolver
+from cache import ResolveCache
+from lyrics import LrcLibClient, LyricsCache, parse_lrc
+from player import GuildPlayer
+from renderer import NowPlayingRenderer
+from tracks import TrackSource
+
+logger = logging.getLogger('bench')
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """
+    Count, mean, p50, p99 and max, in milliseconds.
+    """
+    if not samples:
+        return {'count': 0}
+    ms = sorted(s * 1000 for s in samples)
+    pct = statistics.quantiles(ms, n=100, method='inclusive') if len(ms) > 1 else [ms[0]] * 99
+    return {
+        'count': len(ms),
+        'mean_ms': round(statistics.fmean(ms), 4),
+        'p50_ms': round(pct[49], 4),
+        'p99_ms': round(pct[98], 4),
+        'max_ms': round(ms[-1], 4),
+    }
+
+
+# ---------------- Scenarios ----------------
+
+
+async def bench_parse(args) -> Dict[str, Any]:
+    """
+    parse_lrc over synthetic documents, plus window() lookups across each.
+    """
+    docs = corpus(args.documents, args.lines)
+    parses, windows = [], []
+    total_lines = 0
+    started = time.perf_counter()
+    for raw in docs:
+        t0 = time.perf_counter()
+        timeline = parse_lrc(raw)
+        parses.append(time.perf_counter() - t0)
+        total_lines += len(timeline)
+        end = timeline.times[-1] if len(timeline) else 0.0
+        t0 = time.perf_counter()
+        for i in range(1000):
+            timeline.window(end * i / 1000)
+        windows.append((time.perf_counter() - t0) / 1000)
+    took = time.perf_counter() - started
+    return {
+        'parse': summarize(parses),
+        'window': summarize(windows),
+        'lines_per_s': round(total_lines / sum(parses), 1),
+        'wall_s': round(took, 3),
+    }
+
+
+async def bench_lyrics(args) -> Dict[str, Any]:
+    """
+    LyricsCache lookups from N guilds against the fake LrcLib: a cold
+    pass, where guilds overlap on popular tracks, then a warm pass.
+    """
+    server = FakeLrcLib(latency=args.lrclib_latency)
+    await server.start()
+    client = LrcLibClient(server.url)
+    lyrics = LyricsCache(path=None, client=client)
+    songs = [(f"Song {i}", f"Artist {i % 7}", '' if i % 3 else f"Album {i}", 180 + i) for i in range(args.tracks)]
+    songs += [('instrumental groove', 'Artist 0', '', 200), ('missing track', 'Artist 1', '', 200)]
+
+    async def guild(g: int, samples: List[float]):
+        # every guild plays the popular half plus a slice of its own
+        mine = songs[:len(songs) // 2] + songs[len(songs) // 2:][g::args.guilds]
+        for title, artist, album, duration in mine:
+            t0 = time.perf_counter()
+            await lyrics.load(title, artist, album, duration)
+            samples.append(time.perf_counter() - t0)
+
+    result = {}
+    try:
+        for phase in ('cold', 'warm'):
+            samples: List[float] = []
+            before = server.requests
+            started = time.perf_counter()
+            await asyncio.gather(*(guild(g, samples) for g in range(args.guilds)))
+            took = time.perf_counter() - started
+            result[phase] = {
+                **summarize(samples),
+                'lookups_per_s': round(len(samples) / took, 1),
+                'http_requests': server.requests - before,
+            }
+    finally:
+        await client.close()
+        await server.stop()
+        lyrics.close()
+    return result
+
+
+async def bench_resolve_play(args) -> Dict[str, Any]:
+    """
+    Query -> search -> extract -> player -> first frame, for N guilds each
+    queueing a few tracks, half of them repeats that hit the resolve cache.
+    """
+    resolver = StubResolver(args.search_latency, args.extract_latency)
+    cache = ResolveCache(path=None)
+    tracks = TrackSource(resolver, cache)
+    samples: List[float] = []
+    requested: Dict[int, float] = {}   # id(track) -> when it was asked for
+    done = asyncio.Event()
+    remaining = args.guilds * args.tracks
+
+    async def prepare(player, track, start=0.0):
+        # the bot's make_source, up to spawning ffmpeg
+        source, codec, bitrate, remote = await tracks.open_stream(track, player.guild.id)
+        tracks.source_args(track, player.guild.id, codec, bitrate, remote, start)
+        return FakeSource(frames=args.frames)
+
+    async def on_start(player, track):
+        nonlocal remaining
+        samples.append(time.perf_counter() - requested[id(track)])
+        remaining -= 1
+        if remaining <= 0:
+            done.set()
+
+    async def on_error(player, track):
+        logger.warning(f"bench track failed: {track!r}")
+
+    players = []
+
+    async def guild(g: int):
+        player = GuildPlayer(FakeGuild(g), prepare=prepare, on_start=on_start, on_error=on_error)
+        players.append(player)
+        channel = FakeVoiceChannel(speed=args.speed)
+        for t in range(args.tracks):
+            # every other query is one the whole bot has already seen
+            query = f"popular song {t}" if t % 2 else f"guild {g} song {t}"
+            t0 = time.perf_counter()
+            track = await tracks.fetch(query, g)
+            requested[id(track)] = t0
+            await player.enqueue([track], voice_channel=channel)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(guild(g) for g in range(args.guilds)))
+        await asyncio.wait_for(done.wait(), timeout=args.timeout)
+    finally:
+        for p in players:
+            await p.stop()
+            p.close()
+        resolver.close()
+        cache.close()
+    took = time.perf_counter() - started
+    return {
+        **summarize(samples),
+        'plays_per_s': round(len(samples) / took, 2),
+        'cache': cache.stats(),
+    }
+
+
+async def bench_render(args) -> Dict[str, Any]:
+    """
+    Now-playing embeds for N guilds, one busy channel per guild, driven
+    by fast-moving synthetic lyrics for ``--seconds``.
+    """
+    renderer = NowPlayingRenderer()
+    timeline = parse_lrc(corpus(1, 400)[0])
+    messages = []
+    start = time.monotonic()
+
+    def render_for(speed: float) -> Callable[[], Optional[tuple]]:
+        def render():
+            elapsed = (time.monotonic() - start) * speed
+            prev_line, curr_line, next_line = timeline.window(elapsed)
+            return (f"`{int(elapsed)}`", f"{prev_line}\n> **{curr_line}**\n{next_line}")
+        return render
+
+    for g in range(args.guilds):
+        msg = FakeMessage(FakeChannel(g), latency=args.edit_latency, rate_limit=args.rate_limit)
+        embed = discord.Embed(title='Now Playing')
+        embed.add_field(name='Progress', value='`0`', inline=False)
+        embed.add_field(name='Lyrics', value='...', inline=False)
+        renderer.track(msg, embed, render_for(1 + g % 3))
+        messages.append(msg)
+
+    await asyncio.sleep(args.seconds)
+    stats = renderer.stats()
+    renderer.close()
+    edits = [t for m in messages for t in m.edits]
+    return {
+        'edit': summarize(edits),
+        'edits_per_s': round(len(edits) / args.seconds, 2),
+        'edits_per_guild_per_s': round(len(edits) / args.seconds / args.guilds, 3),
+        'skipped': stats['skipped'],
+        'limited': sum(m.limited for m in messages),
+    }
+
+
+SCENARIOS = {
+    'parse': bench_parse,
+    'lyrics': bench_lyrics,
+    'resolve_play': bench_resolve_play,
+    'render': bench_render,
+}
+
+# -------------------------------------------------
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description='Offline Himari benchmarks')
+    p.add_argument('scenarios', nargs='*', help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    p.add_argument('--guilds', type=int, default=16, help='concurrent guilds')
+    p.add_argument('--tracks', type=int, default=8, help='tracks per guild')
+    p.add_argument('--documents', type=int, default=50, help='LRC documents to parse')
+    p.add_argument('--lines', type=int, default=2000, help='lines per LRC document')
+    p.add_argument('--search-latency', type=float, default=0.3)
+    p.add_argument('--extract-latency', type=float, default=0.8)
+    p.add_argument('--lrclib-latency', type=float, default=0.05)
+    p.add_argument('--edit-latency', type=float, default=0.08)
+    p.add_argument('--rate-limit', type=float, default=0.0, help='chance an edit gets a 429')
+    p.add_argument('--frames', type=int, default=100, help='frames per fake track')
+    p.add_argument('--speed', type=float, default=50.0, help='fake playback speed-up')
+    p.add_argument('--seconds', type=float, default=10.0, help='render scenario duration')
+    p.add_argument('--timeout', type=float, default=300.0)
+    p.add_argument('--out', help='write results as JSON here')
+    args = p.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        p.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    return args
+
+
+async def main(argv=None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    results = {}
+    for name in args.scenarios:
+        logger.info(f"Running {name}...")
+        results[name] = await SCENARIOS[name](args)
+        logger.info(f"{name}: {json.dumps(results[name])}")
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'timestamp': time.time(),
+        'params': {k: v for k, v in vars(args).items() if k not in ('scenarios', 'out')},
+        'results': results,
+    }
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,175 @@
+import logging
+import os
+import secrets
+import threading
+from typing import Dict, Optional, Set
+
+import discord
+
+from player import FRAME_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# ----------------- Configuration -----------------
+
+BROADCAST_BUFFER = float(os.getenv('HIMARI_BROADCAST_BUFFER', '10'))  # seconds of audio kept for listeners
+PREBUFFER        = 10                 # frames a new or lagging listener starts behind the live edge
+OPUS_SILENCE     = b'\xf8\xff\xfe'    # one silent Opus frame, sent while the host has nothing
+
+# -------------------------------------------------
+
+
+class FrameRing:
+    """
+    Fixed-size ring of encoded Opus frames, written by one thread and read
+    by any number of others, each at its own sequence number. Frames are
+    immutable bytes, so readers share them instead of copying.
+    """
+
+    __slots__ = ('capacity', 'frames', 'head', 'closed', '_cond')
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.frames   = [b''] * capacity
+        self.head     = 0        # sequence number of the next frame to be written
+        self.closed   = False
+        self._cond    = threading.Condition()
+
+    def push(self, frame: bytes):
+        with self._cond:
+            self.frames[self.head % self.capacity] = frame
+            self.head += 1
+            self._cond.notify_all()
+
+    def wait(self, seq: int, timeout: float) -> bool:
+        """
+        Wait until frame ``seq`` is written; False on timeout or close.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self.head > seq or self.closed, timeout) and self.head > seq
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class StationTee(discord.AudioSource):
+    """
+    The host's own source: every frame the host plays is published to the
+    station as it's read, so the host's audio thread paces the broadcast.
+    """
+
+    def __init__(self, source: discord.AudioSource, ring: FrameRing):
+        self.source = source
+        self.ring   = ring
+
+    def read(self) -> bytes:
+        data = self.source.read()
+        if data:
+            self.ring.push(data)
+        return data
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self):
+        self.source.cleanup()
+
+
+class StationListener(discord.AudioSource):
+    """
+    A listening guild's view of a station, reading the shared ring at its
+    own cursor. It plays silence while the host is between tracks or
+    paused, skips ahead if it falls more than the buffer behind, and ends
+    when the station closes.
+    """
+
+    def __init__(self, station: 'Station'):
+        self.station = station
+        self.ring    = station.ring
+        self.cursor  = max(0, self.ring.head - PREBUFFER)
+
+    def read(self) -> bytes:
+        ring = self.ring
+        if ring.head - self.cursor > ring.capacity:
+            self.cursor = ring.head - PREBUFFER
+        if self.cursor >= ring.head:
+            if ring.closed:
+                return b''
+            if not ring.wait(self.cursor, FRAME_SECONDS * 2):
+                return b'' if ring.closed else OPUS_SILENCE
+        frame = ring.frames[self.cursor % ring.capacity]
+        self.cursor += 1
+        return frame
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self):
+        self.station.listeners.discard(self)
+
+
+class Station:
+    """
+    One guild's broadcast: the host decodes each track once, and any
+    number of guilds listen along through their own voice clients.
+    """
+
+    def __init__(self, host_id: int, buffer: float = BROADCAST_BUFFER):
+        self.host_id = host_id
+        self.code    = secrets.token_hex(3)
+        self.ring    = FrameRing(max(PREBUFFER * 2, int(buffer / FRAME_SECONDS)))
+        self.listeners: Set[StationListener] = set()
+        self.now_playing: Optional[str] = None
+
+    def tee(self, source: discord.AudioSource) -> StationTee:
+        return StationTee(source, self.ring)
+
+    def listen(self) -> StationListener:
+        listener = StationListener(self)
+        self.listeners.add(listener)
+        return listener
+
+    @property
+    def closed(self) -> bool:
+        return self.ring.closed
+
+    def close(self):
+        self.ring.close()
+
+
+class Stations:
+    """
+    Live stations by host guild and by join code.
+    """
+
+    def __init__(self):
+        self.by_host: Dict[int, Station] = {}
+        self.by_code: Dict[str, Station] = {}
+
+    def start(self, host_id: int) -> Station:
+        station = self.by_host.get(host_id)
+        if station is None or station.closed:
+            station = self.by_host[host_id] = Station(host_id)
+            self.by_code[station.code] = station
+            logger.info(f"Guild {host_id} started broadcasting as {station.code}")
+        return station
+
+    def hosted_by(self, host_id: int) -> Optional[Station]:
+        return self.by_host.get(host_id)
+
+    def find(self, code: str) -> Optional[Station]:
+        station = self.by_code.get(code.strip().lower())
+        return station if station and not station.closed else None
+
+    def stop(self, host_id: int) -> Optional[Station]:
+        station = self.by_host.pop(host_id, None)
+        if station is not None:
+            self.by_code.pop(station.code, None)
+            station.close()
+        return station
+
+    def close(self):
+        for host_id in list(self.by_host):
+            self.stop(host_id)
@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# ----------------- Configuration -----------------
+
+CACHE_DB        = os.getenv('HIMARI_CACHE_DB')  # e.g. ./himari_cache.db, unset = memory only
+QUERY_TTL       = float(os.getenv('HIMARI_QUERY_TTL', str(7 * 24 * 3600)))
+QUERY_MAXSIZE   = int(os.getenv('HIMARI_QUERY_MAXSIZE', '4096'))
+STREAM_MAXSIZE  = int(os.getenv('HIMARI_STREAM_MAXSIZE', '1024'))
+STREAM_MARGIN   = 10 * 60     # drop signed URLs this long before they expire
+STREAM_FALLBACK = 60 * 60     # lifetime when the URL carries no expire=
+
+# -------------------------------------------------
+
+
+def stream_expiry(url: str, now: Optional[float] = None) -> float:
+    """
+    When a googlevideo URL should stop being used, based on its ``expire=``.
+    """
+    now = time.time() if now is None else now
+    try:
+        expire = float(parse_qs(urlparse(url).query)['expire'][0])
+    except (KeyError, IndexError, ValueError):
+        return now + STREAM_FALLBACK
+    return max(now, expire - STREAM_MARGIN)
+
+
+def open_db(path: Optional[str]) -> Optional[sqlite3.Connection]:
+    if not path:
+        return None
+    db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    return db
+
+
+class TTLCache:
+    """
+    LRU-bounded mapping whose entries carry their own expiry time.
+
+    When given a sqlite connection, entries are written through to the
+    ``name`` table and the live ones are loaded back on start-up, so the cache
+    survives restarts. Values must be JSON-serialisable, or ``dumps`` and
+    ``loads`` must convert them to and from text.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        db: Optional[sqlite3.Connection] = None,
+        dumps: Callable[[Any], str] = json.dumps,
+        loads: Callable[[str], Any] = json.loads,
+    ):
+        self.name    = name
+        self.maxsize = maxsize
+        self.hits    = 0
+        self.misses  = 0
+        self._data: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._db     = db
+        self._dumps  = dumps
+        self._loads  = loads
+        if db is not None:
+            db.execute(
+                f'CREATE TABLE IF NOT EXISTS {name} '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)'
+            )
+            self._load()
+
+    def _load(self):
+        now = time.time()
+        self._db.execute(f'DELETE FROM {self.name} WHERE expires <= ?', (now,))
+        rows = self._db.execute(
+            f'SELECT key, value, expires FROM {self.name} ORDER BY expires DESC LIMIT ?',
+            (self.maxsize,)
+        ).fetchall()
+        for key, value, expires in reversed(rows):
+            self._data[key] = (self._loads(value), expires)
+        logger.info(f"Loaded {len(rows)} entries into cache '{self.name}'")
+
+    def get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self._miss()
+            return None
+        value, expires = entry
+        if expires <= time.time():
+            self.delete(key)
+            self._miss()
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        CACHE_REQUESTS.inc(cache=self.name, result='hit')
+        return value
+
+    def peek(self, key: str) -> Any:
+        """
+        Like ``get``, but not counted as a hit or miss and leaving the LRU order alone.
+        """
+        entry = self._data.get(key)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    def _miss(self):
+        self.misses += 1
+        CACHE_REQUESTS.inc(cache=self.name, result='miss')
+
+    def set(self, key: str, value: Any, expires: float):
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        evicted = []
+        while len(self._data) > self.maxsize:
+            evicted.append(self._data.popitem(last=False)[0])
+        if self._db is not None:
+            self._db.execute(
+                f'INSERT OR REPLACE INTO {self.name} (key, value, expires) VALUES (?, ?, ?)',
+                (key, self._dumps(value), expires)
+            )
+            if evicted:
+                self._db.executemany(f'DELETE FROM {self.name} WHERE key = ?', [(k,) for k in evicted])
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+        if self._db is not None:
+            self._db.execute(f'DELETE FROM {self.name} WHERE key = ?', (key,))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+class ResolveCache:
+    """
+    Two-level resolve cache shared by every guild.
+
+    ``queries`` maps a normalised search query to the track metadata
+    (including its videoId) and lives for days. ``streams`` maps a videoId
+    to its direct stream URL and expires shortly before YouTube's signed
+    ``expire=`` timestamp.
+    """
+
+    def __init__(self, path: Optional[str] = CACHE_DB):
+        self.db      = open_db(path)
+        self.queries = TTLCache('queries', QUERY_MAXSIZE, self.db)
+        self.streams = TTLCache('streams', STREAM_MAXSIZE, self.db)
+
+    @staticmethod
+    def query_key(query: str) -> str:
+        return ' '.join(query.lower().split())
+
+    def get_query(self, query: str) -> Optional[dict]:
+        return self.queries.get(self.query_key(query))
+
+    def set_query(self, query: str, meta: dict):
+        self.queries.set(self.query_key(query), meta, time.time() + QUERY_TTL)
+
+    def get_stream(self, video_id: str) -> Optional[dict]:
+        return self.streams.get(video_id)
+
+    def set_stream(self, video_id: str, stream: dict):
+        self.streams.set(video_id, stream, stream_expiry(stream['url']))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {'queries': self.queries.stats(), 'streams': self.streams.stats()}
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
@@ -0,0 +1,232 @@
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ----------------- Configuration -----------------
+
+EXTRACTOR_SOCKET     = os.getenv('HIMARI_EXTRACTOR_SOCKET', './himari_extractor.sock')
+EXTRACTOR_PROCESSES  = int(os.getenv('HIMARI_EXTRACTOR_PROCESSES', str(os.cpu_count() or 1)))
+EXTRACTOR_PENDING    = int(os.getenv('HIMARI_EXTRACTOR_PENDING', str(EXTRACTOR_PROCESSES * 4)))
+EXTRACTOR_PER_CLIENT = int(os.getenv('HIMARI_EXTRACTOR_PER_CLIENT', str(EXTRACTOR_PROCESSES * 2)))
+LINE_LIMIT           = 1 << 20
+
+# the bits of an extract_info result the bot uses; the rest (every format,
+# every thumbnail) isn't worth pickling and shipping over the socket
+STREAM_FIELDS = ('id', 'title', 'url', 'thumbnail', 'acodec', 'abr', 'duration')
+
+# -------------------------------------------------
+
+# Wire format: one JSON object per line in both directions.
+#   request  {"id": 7, "op": "search" | "extract", "arg": "..."}
+#   reply    {"id": 7, "ok": true, "result": ...}
+#            {"id": 7, "ok": false, "error": "DownloadError: ..."}
+# Replies come back in completion order, matched up by id.
+
+
+class ExtractorError(RuntimeError):
+    """
+    The extraction server ran the request and it failed.
+    """
+
+
+# ---- worker processes ----
+
+_resolver = None
+
+
+def _init_worker():
+    # each process gets its own warm YoutubeDL and YTMusic
+    global _resolver
+    from resolver import StreamResolver
+    _resolver = StreamResolver(workers=1, socket=None)
+    _resolver._ydl()
+    _resolver._yt()
+
+
+def _work(op: str, arg: str) -> Any:
+    if op == 'search':
+        return _resolver._search(arg)
+    if op == 'extract':
+        info = _resolver._extract(arg)
+        return {k: info.get(k) for k in STREAM_FIELDS}
+    if op == 'radio':
+        return _resolver._radio(arg)
+    raise ValueError(f"Unknown op {op!r}")
+
+
+# ---- server ----
+
+class ExtractorServer:
+    """
+    Serves searches and extractions to every bot process from one shared
+    pool of worker processes, so yt-dlp's signature deciphering gets its
+    own cores instead of fighting the gateways for the GIL.
+
+    Backpressure is plain flow control: once ``pending`` requests (or
+    ``per_client`` from one connection) are in flight the server stops
+    reading, the socket buffer fills up, and the clients' ``drain()``
+    waits until a worker frees up.
+    """
+
+    def __init__(
+        self,
+        path: str = EXTRACTOR_SOCKET,
+        processes: int = EXTRACTOR_PROCESSES,
+        pending: int = EXTRACTOR_PENDING,
+        per_client: int = EXTRACTOR_PER_CLIENT,
+    ):
+        self.path       = path
+        self.processes  = processes
+        self.per_client = per_client
+        self._slots     = asyncio.Semaphore(pending)
+        self._pool      = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+        )
+        self.served = 0
+        self.failed = 0
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle, self.path, limit=LINE_LIMIT)
+        logger.info(f"Extractor listening on {self.path} with {self.processes} processes")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = asyncio.Semaphore(self.per_client)
+        tasks  = set()
+        try:
+            while True:
+                # take the slots before reading, so a busy server leaves
+                # requests sitting in the client's socket buffer
+                await client.acquire()
+                await self._slots.acquire()
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    line = b''
+                if not line:
+                    self._slots.release()
+                    client.release()
+                    break
+                task = asyncio.create_task(self._serve_one(line, writer, client))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+    async def _serve_one(self, line: bytes, writer: asyncio.StreamWriter, client: asyncio.Semaphore):
+        rid = None
+        try:
+            req = json.loads(line)
+            rid = req['id']
+            result = await asyncio.get_running_loop().run_in_executor(self._pool, _work, req['op'], req['arg'])
+            reply = {'id': rid, 'ok': True, 'result': result}
+            self.served += 1
+        except Exception as e:
+            reply = {'id': rid, 'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            self.failed += 1
+        try:
+            writer.write(json.dumps(reply).encode() + b'\n')
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._slots.release()
+            client.release()
+
+
+# ---- client ----
+
+class ExtractorClient:
+    """
+    One bot process's connection to the extraction server.
+
+    Requests are pipelined over a single Unix socket and matched to their
+    replies by id. Connection problems surface as ``OSError`` (so callers
+    can fall back to resolving in-process); a failed extraction raises
+    ``ExtractorError``.
+    """
+
+    def __init__(self, path: str = EXTRACTOR_SOCKET):
+        self.path  = path
+        self._ids  = itertools.count(1)
+        self._lock = asyncio.Lock()
+        self._conn: Optional[Tuple[asyncio.StreamWriter, Dict[int, asyncio.Future]]] = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    async def _connect(self) -> Tuple[asyncio.StreamWriter, Dict[int, asyncio.Future]]:
+        async with self._lock:
+            if self._conn is None or self._conn[0].is_closing():
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=LINE_LIMIT)
+                pending: Dict[int, asyncio.Future] = {}
+                self._conn = (writer, pending)
+                self._reader_task = asyncio.create_task(self._read(reader, pending), name='extractor-client')
+                logger.info(f"Connected to extractor at {self.path}")
+            return self._conn
+
+    async def _read(self, reader: asyncio.StreamReader, pending: Dict[int, asyncio.Future]):
+        try:
+            while line := await reader.readline():
+                msg = json.loads(line)
+                fut = pending.pop(msg['id'], None)
+                if fut is None or fut.done():
+                    continue   # the caller gave up on it
+                if msg['ok']:
+                    fut.set_result(msg['result'])
+                else:
+                    fut.set_exception(ExtractorError(msg['error']))
+        except (ConnectionError, ValueError):
+            logger.exception("Extractor connection broke")
+        finally:
+            if self._conn is not None and self._conn[1] is pending:
+                self._conn[0].close()
+                self._conn = None
+            for fut in pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionResetError('extractor connection lost'))
+            pending.clear()
+
+    async def call(self, op: str, arg: str) -> Any:
+        writer, pending = await self._connect()
+        rid = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        pending[rid] = fut
+        try:
+            writer.write(json.dumps({'id': rid, 'op': op, 'arg': arg}).encode() + b'\n')
+            # waits here while the server isn't reading: that's the backpressure
+            await writer.drain()
+            return await fut
+        finally:
+            pending.pop(rid, None)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn[0].close()
+            self._conn = None
+
+
+async def main():
+    server = ExtractorServer()
+    await server.serve()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,248 @@
+import heapq
+import logging
+import math
+import os
+import re
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set
+
+from cache import open_db
+
+logger = logging.getLogger(__name__)
+
+# ----------------- Configuration -----------------
+
+HISTORY_DB      = os.getenv('HIMARI_HISTORY_DB', './himari_history.db')
+HISTORY_MAXSIZE = int(os.getenv('HIMARI_HISTORY_MAXSIZE', '20000'))
+HALF_LIFE       = 14 * 24 * 3600   # a play counts half as much after two weeks
+SCAN_THRESHOLD  = 512              # above this many hits, walk the ranking instead of scoring them all
+
+# -------------------------------------------------
+
+_NON_WORD = re.compile(r'[\W_]+')
+PREFIX_BONUS = 1.0             # log2(2): the title starts with the query
+WORD_BONUS   = math.log2(1.5)  # some word starts with it
+
+
+def normalize(text: str) -> str:
+    return _NON_WORD.sub(' ', text.casefold()).strip()
+
+
+def _grams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _prefixes(text: str) -> Set[str]:
+    # one- and two-letter word starts, for queries too short for trigrams
+    return {w[:n] for w in text.split() for n in (1, 2) if len(w) >= n}
+
+
+class _Entry:
+    __slots__ = ('meta', 'key', 'plays', 'last_played', 'weight')
+
+    def __init__(self, meta: dict, plays: int, last_played: float):
+        self.meta        = meta
+        self.key         = normalize(f"{meta['title']} {meta['artist']}")
+        self.plays       = plays
+        self.last_played = last_played
+        # log2 of plays * 0.5 ** (age / HALF_LIFE), minus the log2(0.5 ** (now / HALF_LIFE))
+        # every entry shares: the order never changes as time passes
+        self.weight      = math.log2(plays) + last_played / HALF_LIFE
+
+    def rank_key(self):
+        return (-self.weight, self.meta['video_id'])
+
+
+class PlayHistoryIndex:
+    """
+    In-memory trigram index over every track the bot has played, across
+    all guilds, for ``/play`` autocomplete.
+
+    Lookups intersect the posting sets of the query's trigrams (or of its
+    word prefixes, for one- and two-letter queries) and rank the hits by
+    plays decayed by recency, so they take microseconds and never touch
+    the network. Decay hits every entry alike, so entries are also kept
+    in one standing ranking; broad queries walk it instead of scoring
+    thousands of hits. Entries carry the same metadata the resolve cache
+    keeps for a search, which is what lets a picked suggestion skip the
+    search. Plays persist to ``HISTORY_DB``, which the bot processes of
+    launcher.py share: counts are incremented in the database rather than
+    overwritten, and ``sync`` picks up the other processes' plays.
+    """
+
+    def __init__(self, path: Optional[str] = HISTORY_DB, maxsize: int = HISTORY_MAXSIZE):
+        self.maxsize  = maxsize
+        self.entries: Dict[str, _Entry] = {}
+        self._ranking: List[tuple] = []
+        self._grams: Dict[str, Set[str]] = {}
+        self._prefixes: Dict[str, Set[str]] = {}
+        self._synced = 0.0   # newest last_played read from the database
+        self.db = open_db(path)
+        if self.db is not None:
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS plays (video_id TEXT PRIMARY KEY, title TEXT NOT NULL, '
+                'artist TEXT NOT NULL, album TEXT NOT NULL, duration REAL NOT NULL, '
+                'plays INTEGER NOT NULL, last_played REAL NOT NULL)'
+            )
+            self.db.execute('CREATE INDEX IF NOT EXISTS plays_last_played ON plays (last_played)')
+            self._load()
+
+    def _load(self):
+        rows = self.db.execute(
+            'SELECT video_id, title, artist, album, duration, plays, last_played FROM plays '
+            'ORDER BY last_played DESC LIMIT ?', (self.maxsize,)
+        ).fetchall()
+        for video_id, title, artist, album, duration, plays, last_played in rows:
+            meta = {'video_id': video_id, 'title': title, 'artist': artist, 'album': album, 'duration': duration}
+            self._add(_Entry(meta, plays, last_played))
+            self._synced = max(self._synced, last_played)
+        logger.info(f"Loaded {len(rows)} tracks into the play history index")
+
+    # ---- index maintenance ----
+
+    def _postings(self, entry: _Entry):
+        for g in _grams(entry.key):
+            yield self._grams, g
+        for p in _prefixes(entry.key):
+            yield self._prefixes, p
+
+    def _add(self, entry: _Entry):
+        video_id = entry.meta['video_id']
+        self.entries[video_id] = entry
+        insort(self._ranking, entry.rank_key())
+        for index, term in self._postings(entry):
+            index.setdefault(term, set()).add(video_id)
+
+    def _remove(self, video_id: str):
+        entry = self.entries.pop(video_id, None)
+        if entry is None:
+            return
+        i = bisect_left(self._ranking, entry.rank_key())
+        del self._ranking[i]
+        for index, term in self._postings(entry):
+            ids = index.get(term)
+            if ids is not None:
+                ids.discard(video_id)
+                if not ids:
+                    del index[term]
+
+    def record(self, meta: dict, now: Optional[float] = None):
+        """
+        Count a play of the track described by ``meta`` (video_id, title,
+        artist, album, duration).
+        """
+        now = time.time() if now is None else now
+        video_id = meta['video_id']
+        old = self.entries.get(video_id)
+        plays = old.plays + 1 if old else 1
+        if self.db is not None:
+            # other processes count plays of this track in the same row: add to their total
+            self.db.execute(
+                'INSERT INTO plays (video_id, title, artist, album, duration, plays, last_played) '
+                'VALUES (?, ?, ?, ?, ?, 1, ?) ON CONFLICT (video_id) DO UPDATE SET '
+                'title = excluded.title, artist = excluded.artist, album = excluded.album, '
+                'duration = excluded.duration, plays = plays + 1, '
+                'last_played = max(last_played, excluded.last_played)',
+                (video_id, meta['title'], meta['artist'], meta['album'] or '', meta['duration'] or 0, now)
+            )
+            plays = self.db.execute('SELECT plays FROM plays WHERE video_id = ?', (video_id,)).fetchone()[0]
+        self._remove(video_id)
+        self._add(_Entry(dict(meta), plays, now))
+        if len(self.entries) > self.maxsize * 1.1:
+            self._evict()
+
+    def sync(self):
+        """
+        Load plays recorded by other processes sharing the database since the last sync.
+        """
+        if self.db is None:
+            return
+        rows = self.db.execute(
+            'SELECT video_id, title, artist, album, duration, plays, last_played FROM plays '
+            'WHERE last_played > ? ORDER BY last_played', (self._synced,)
+        ).fetchall()
+        for video_id, title, artist, album, duration, plays, last_played in rows:
+            self._synced = max(self._synced, last_played)
+            old = self.entries.get(video_id)
+            if old is not None and old.plays == plays and old.last_played == last_played:
+                continue   # our own play
+            meta = {'video_id': video_id, 'title': title, 'artist': artist, 'album': album, 'duration': duration}
+            self._remove(video_id)
+            self._add(_Entry(meta, plays, last_played))
+        if len(self.entries) > self.maxsize * 1.1:
+            self._evict()
+
+    def _evict(self):
+        # in batches, dropping the bottom of the ranking
+        for _, video_id in self._ranking[self.maxsize:]:
+            self._remove(video_id)
+
+    # ---- lookups ----
+
+    def get(self, video_id: str) -> Optional[dict]:
+        entry = self.entries.get(video_id)
+        return entry.meta if entry else None
+
+    def plays(self, video_id: str) -> int:
+        entry = self.entries.get(video_id)
+        return entry.plays if entry else 0
+
+    def _candidates(self, query: str) -> Set[str]:
+        if len(query) < 3:
+            terms, index = _prefixes(query), self._prefixes
+        else:
+            terms, index = _grams(query), self._grams
+        sets = []
+        for term in terms:
+            ids = index.get(term)
+            if not ids:
+                return set()
+            sets.append(ids)
+        if not sets:
+            return set()
+        if len(sets) == 1:
+            return sets[0]   # read-only, no need to copy
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
+
+    def search(self, text: str, limit: int = 25) -> List[dict]:
+        """
+        Best matches for what's been typed so far, most relevant first.
+        """
+        query = normalize(text)
+        if not query:
+            return [self.entries[v].meta for _, v in self._ranking[:limit]]
+
+        def rank(e: _Entry) -> float:
+            if e.key.startswith(query):
+                return e.weight + PREFIX_BONUS
+            if f" {query}" in f" {e.key}":
+                return e.weight + WORD_BONUS
+            return e.weight
+
+        hits = self._candidates(query)
+        if len(hits) <= SCAN_THRESHOLD:
+            return [e.meta for e in heapq.nlargest(limit, (self.entries[v] for v in hits), key=rank)]
+
+        # walk the ranking; once nothing further down can beat the current
+        # top ``limit`` even with the biggest bonus, we're done
+        best: List[tuple] = []
+        for neg_weight, video_id in self._ranking:
+            if len(best) >= limit and -neg_weight + PREFIX_BONUS <= best[0][0]:
+                break
+            if video_id not in hits:
+                continue
+            item = (rank(self.entries[video_id]), video_id)
+            if len(best) < limit:
+                heapq.heappush(best, item)
+            elif item > best[0]:
+                heapq.heapreplace(best, item)
+        return [self.entries[v].meta for _, v in sorted(best, reverse=True)]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
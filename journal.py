@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from playqueue import PlayQueue
+
+logger = logging.getLogger(__name__)
+
+# ----------------- Configuration -----------------
+
+JOURNAL_PATH    = os.getenv('HIMARI_JOURNAL_PATH', './himari_journal.log')   # empty = off
+JOURNAL_COMPACT = int(os.getenv('HIMARI_JOURNAL_COMPACT', '2000'))   # records between snapshots
+HISTORY_SIZE    = 50
+
+# -------------------------------------------------
+
+
+class _GuildLog:
+    __slots__ = ('queue', 'current', 'history')
+
+    def __init__(self):
+        self.queue = PlayQueue()
+        self.current: Optional[dict] = None
+        self.history: Deque[dict] = deque(maxlen=HISTORY_SIZE)
+
+    def apply(self, op: str, tracks: Optional[List[dict]] = None, args: List[int] = ()):
+        if op == 'enqueue':
+            self.queue.extend(tracks)
+        elif op == 'pop':
+            self.apply('finish')
+            if self.queue:
+                self.current = self.queue.popleft()
+        elif op == 'finish':
+            if self.current is not None:
+                self.history.append(self.current)
+            self.current = None
+        elif op == 'clear':
+            self.queue.clear()
+        elif op == 'requeue':
+            if self.current is not None:
+                self.queue.appendleft(self.current)
+            self.current = None
+        elif op == 'remove':
+            self.queue.pop(*args)
+        elif op == 'move':
+            self.queue.move(*args)
+        elif op == 'shuffle':
+            self.queue.shuffle(*args)
+
+    def to_json(self) -> dict:
+        return {'queue': list(self.queue), 'current': self.current, 'history': list(self.history)}
+
+    @classmethod
+    def from_json(cls, data: dict) -> '_GuildLog':
+        log = cls()
+        log.queue.extend(data.get('queue') or ())
+        log.current = data.get('current')
+        log.history.extend(data.get('history') or ())
+        return log
+
+
+class QueueJournal:
+    """
+    Append-only log of every guild's queue mutations, so a restart (the
+    timed shutdown or a crash) picks the queues up where they were.
+
+    Each mutation (``enqueue``, ``pop``, ``finish``, ``clear``, ``remove``,
+    ``move``, ``shuffle``) appends one JSON line to ``path``; every
+    ``compact_every`` records the state is written to ``path.snap`` and
+    the log starts over. Records carry a sequence
+    number, so a crash between the two can't apply anything twice.
+    Tracks go through ``dumps``/``loads``, which should keep video IDs
+    rather than stream URLs: those expire, and a restored track is
+    resolved when it's about to play anyway.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = JOURNAL_PATH,
+        dumps: Callable[[Any], dict] = lambda t: t,
+        loads: Callable[[dict], Any] = lambda d: d,
+        compact_every: int = JOURNAL_COMPACT,
+    ):
+        self.path   = path or None
+        self.compact_every = compact_every
+        self.guilds: Dict[int, _GuildLog] = {}
+        self._dumps = dumps
+        self._loads = loads
+        self._seq   = 0
+        self._since_snapshot = 0
+        self._file  = None
+        if self.path:
+            self._load()
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    # ---- start-up ----
+
+    def _load(self):
+        snap = f"{self.path}.snap"
+        if os.path.exists(snap):
+            try:
+                with open(snap, encoding='utf-8') as f:
+                    data = json.load(f)
+                self._seq = data['seq']
+                self.guilds = {int(g): _GuildLog.from_json(v) for g, v in data['guilds'].items()}
+            except (OSError, ValueError, KeyError):
+                logger.exception(f"Ignoring unreadable journal snapshot {snap}")
+        replayed = 0
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        break   # torn last write
+                    if rec['s'] <= self._seq:
+                        continue   # already in the snapshot
+                    self._seq = rec['s']
+                    self._guild(rec['g']).apply(rec['op'], rec.get('t'), rec.get('a', ()))
+                    replayed += 1
+        self._since_snapshot = replayed
+        queued = sum(len(g.queue) + (g.current is not None) for g in self.guilds.values())
+        logger.info(f"Journal restored {queued} queued tracks in {len(self.guilds)} guilds ({replayed} records replayed)")
+
+    def _guild(self, guild_id: int) -> _GuildLog:
+        log = self.guilds.get(guild_id)
+        if log is None:
+            log = self.guilds[guild_id] = _GuildLog()
+        return log
+
+    def restore(self, guild_id: int) -> Tuple[List[Any], List[Any]]:
+        """
+        (queue, history) to seed a guild's player with. A track that was
+        playing when we went down goes back to the front of the queue.
+        """
+        log = self.guilds.get(guild_id)
+        if log is None:
+            return [], []
+        if log.current is not None:
+            self._append(guild_id, 'requeue')
+        return [self._loads(t) for t in log.queue], [self._loads(t) for t in log.history]
+
+    # ---- mutations ----
+
+    def _append(self, guild_id: int, op: str, tracks: Optional[List[dict]] = None, *args: int):
+        self._guild(guild_id).apply(op, tracks, args)
+        if self._file is None:
+            return
+        self._seq += 1
+        rec = {'s': self._seq, 'g': guild_id, 'op': op}
+        if tracks is not None:
+            rec['t'] = tracks
+        if args:
+            rec['a'] = args
+        self._file.write(json.dumps(rec, separators=(',', ':')) + '\n')
+        self._file.flush()
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.compact_every:
+            self.compact()
+
+    def enqueue(self, guild_id: int, tracks: List[Any]):
+        self._append(guild_id, 'enqueue', [self._dumps(t) for t in tracks])
+
+    def pop(self, guild_id: int):
+        self._append(guild_id, 'pop')
+
+    def finish(self, guild_id: int):
+        self._append(guild_id, 'finish')
+
+    def clear(self, guild_id: int):
+        self._append(guild_id, 'clear')
+
+    def remove(self, guild_id: int, index: int):
+        self._append(guild_id, 'remove', None, index)
+
+    def move(self, guild_id: int, src: int, dst: int):
+        self._append(guild_id, 'move', None, src, dst)
+
+    def shuffle(self, guild_id: int, seed: int):
+        self._append(guild_id, 'shuffle', None, seed)
+
+    # ---- compaction ----
+
+    def compact(self):
+        if self._file is None:
+            return
+        # drop guilds with nothing left worth restoring
+        self.guilds = {g: log for g, log in self.guilds.items() if log.queue or log.current or log.history}
+        snap = f"{self.path}.snap"
+        tmp  = f"{snap}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'seq': self._seq, 'guilds': {g: log.to_json() for g, log in self.guilds.items()}}, f,
+                      separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, snap)
+        # the snapshot has everything up to _seq, so the log can start over
+        self._file.close()
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._since_snapshot = 0
+
+    def close(self):
+        if self._file is None:
+            return
+        self.compact()
+        self._file.close()
+        self._file = None
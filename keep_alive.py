@@ -1,29 +1,81 @@
-from flask import Flask, send_file
-from threading import Thread
+import json
+import logging
 import os
+from typing import Callable, Optional
 
-# --- Flask keep-alive ---
-app = Flask('')
+from aiohttp import web
 
-@app.route('/')
-def home():
-	return f"""
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# each shard process of launcher.py gets its own port
+HTTP_HOST = os.getenv('HIMARI_HTTP_HOST', '0.0.0.0')
+HTTP_PORT = int(os.getenv('HIMARI_HTTP_PORT', '8080'))
+SHUTDOWN_GRACE = 5   # seconds in-flight requests get to finish on shutdown
+
+HOME = """
 	Himari-chan: I'm ready ^^
 	<br>
 	<br>
 	Build info: Himari version 4 (0.0.4) Production GitHub Codepaces version (Limited runtime!)
 	"""
 
-@app.route('/download/ffmpeg')
-def download_ffmpeg():
-	ffmpeg_path = os.path.join(os.getcwd(), 'ffmpeg')
-	if not os.path.exists(ffmpeg_path):
-		return "ffmpeg binary not found", 404
-	return send_file(ffmpeg_path, as_attachment=True)
 
-def run():
-	app.run(host='0.0.0.0', port=8080)
+class KeepAlive:
+	"""
+	The bot's HTTP surface (keep-alive pings, health probes, metrics and
+	the ffmpeg download), served by aiohttp on the bot's own event loop:
+	no extra thread, and ``stop()`` shuts it down with the bot.
+
+	``status`` returns the health snapshot served by /healthz and /readyz;
+	/readyz answers 503 until ``ready`` says the bot is connected.
+	"""
+
+	def __init__(self, status: Callable[[], dict], ready: Callable[[], bool], host: str = HTTP_HOST, port: int = HTTP_PORT):
+		self.host   = host
+		self.port   = port
+		self.status = status
+		self.ready  = ready
+		self._runner: Optional[web.AppRunner] = None
+		self.app = web.Application()
+		self.app.router.add_get('/', self.home)
+		self.app.router.add_get('/healthz', self.healthz)
+		self.app.router.add_get('/readyz', self.readyz)
+		self.app.router.add_get('/metrics', self.prometheus_metrics)
+		self.app.router.add_get('/download/ffmpeg', self.download_ffmpeg)
+
+	async def home(self, request: web.Request):
+		return web.Response(text=HOME, content_type='text/html')
+
+	def _json(self, status: int = 200) -> web.Response:
+		return web.Response(text=json.dumps(self.status()), status=status, content_type='application/json')
+
+	async def healthz(self, request: web.Request):
+		# answered from the event loop itself, so a response means it's alive
+		return self._json()
+
+	async def readyz(self, request: web.Request):
+		return self._json(200 if self.ready() else 503)
+
+	async def prometheus_metrics(self, request: web.Request):
+		return web.Response(text=metrics.render(), headers={'Content-Type': 'text/plain; version=0.0.4'})
+
+	async def download_ffmpeg(self, request: web.Request):
+		ffmpeg_path = os.path.join(os.getcwd(), 'ffmpeg')
+		if not os.path.exists(ffmpeg_path):
+			return web.Response(text="ffmpeg binary not found", status=404)
+		# sent with sendfile(): the kernel copies it, not Python
+		return web.FileResponse(ffmpeg_path, headers={'Content-Disposition': 'attachment; filename="ffmpeg"'})
+
+	async def start(self):
+		self._runner = web.AppRunner(self.app, access_log=None, shutdown_timeout=SHUTDOWN_GRACE)
+		await self._runner.setup()
+		await web.TCPSite(self._runner, self.host, self.port).start()
+		logger.info(f"HTTP server listening on {self.host}:{self.port}")
 
-def keep_alive():
-	t = Thread(target=run)
-	t.start()
\ No newline at end of file
+	async def stop(self):
+		# in-flight requests (a download, say) get SHUTDOWN_GRACE to finish
+		if self._runner is not None:
+			await self._runner.cleanup()
+			self._runner = None
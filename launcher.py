@@ -0,0 +1,107 @@
+"""
+Runs Himari on every core: one extraction server shared by all bot
+processes, plus HIMARI_PROCESSES bot processes that each own a slice of
+the HIMARI_SHARD_COUNT gateway shards.
+
+    HIMARI_PROCESSES=4 HIMARI_SHARD_COUNT=8 python launcher.py
+
+Set HIMARI_EXTRACTOR_PROCESSES=0 to keep extraction inside each bot
+process. If any child exits, the rest are stopped too, so the whole set
+restarts together like a single bot would.
+"""
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List
+
+from extractor import EXTRACTOR_SOCKET
+
+logger = logging.getLogger('launcher')
+
+# ----------------- Configuration -----------------
+
+PROCESSES       = int(os.getenv('HIMARI_PROCESSES', str(os.cpu_count() or 1)))
+SHARD_COUNT     = int(os.getenv('HIMARI_SHARD_COUNT', str(PROCESSES)))
+HTTP_PORT       = int(os.getenv('HIMARI_HTTP_PORT', '8080'))
+STATE_PATH      = os.getenv('HIMARI_STATE_PATH', './himari_state.json')
+JOURNAL_PATH    = os.getenv('HIMARI_JOURNAL_PATH', './himari_journal.log')
+USE_EXTRACTOR   = os.getenv('HIMARI_EXTRACTOR_PROCESSES') != '0'
+EXTRACTOR_READY = 30   # seconds to wait for the extraction socket
+
+# -------------------------------------------------
+
+
+def shard_slices(shard_count: int, processes: int) -> List[List[int]]:
+    """
+    Spread shards round-robin so every process gets a similar guild count.
+    """
+    processes = max(1, min(processes, shard_count))
+    return [list(range(i, shard_count, processes)) for i in range(processes)]
+
+
+def wait_for_socket(path: str, proc: subprocess.Popen, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(path):
+            return True
+        if proc.poll() is not None:
+            return False
+        time.sleep(0.1)
+    return False
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO)
+    here  = os.path.dirname(os.path.abspath(__file__))
+    env   = dict(os.environ)
+    procs: List[subprocess.Popen] = []
+
+    if USE_EXTRACTOR:
+        if os.path.exists(EXTRACTOR_SOCKET):
+            os.unlink(EXTRACTOR_SOCKET)   # left over from a killed run
+        extractor = subprocess.Popen([sys.executable, os.path.join(here, 'extractor.py')], env=env)
+        procs.append(extractor)
+        if wait_for_socket(EXTRACTOR_SOCKET, extractor, EXTRACTOR_READY):
+            env['HIMARI_EXTRACTOR_SOCKET'] = EXTRACTOR_SOCKET
+        else:
+            logger.warning("Extractor didn't come up, bot processes will resolve in-process")
+
+    for i, shard_ids in enumerate(shard_slices(SHARD_COUNT, PROCESSES)):
+        procs.append(subprocess.Popen([sys.executable, os.path.join(here, 'main.py')], env={
+            **env,
+            'HIMARI_SHARD_COUNT': str(SHARD_COUNT),
+            'HIMARI_SHARD_IDS': ','.join(map(str, shard_ids)),
+            'HIMARI_HTTP_PORT': str(HTTP_PORT + i),
+            'HIMARI_STATE_PATH': f"{STATE_PATH}.{i}",
+            'HIMARI_JOURNAL_PATH': f"{JOURNAL_PATH}.{i}" if JOURNAL_PATH else '',
+        }))
+        logger.info(f"Started bot process {i} with shards {shard_ids}")
+
+    def stop(*_):
+        for p in procs:
+            if p.poll() is None:
+                p.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    code = 0
+    while all(p.poll() is None for p in procs):
+        time.sleep(1)
+    for p in procs:
+        if p.poll() is not None:
+            code = code or p.returncode
+    stop()
+    for p in procs:
+        try:
+            p.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            p.kill()
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from cache import TTLCache, open_db
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# ----------------- Configuration -----------------
+
+LOUDNESS_DB        = os.getenv('HIMARI_LOUDNESS_DB', './himari_loudness.db')
+LOUDNESS_MAXSIZE   = int(os.getenv('HIMARI_LOUDNESS_MAXSIZE', '20000'))
+LOUDNESS_JOBS      = int(os.getenv('HIMARI_LOUDNESS_JOBS', '0'))         # concurrent analyses, 0 = normalization off
+LOUDNESS_TARGET    = float(os.getenv('HIMARI_LOUDNESS_TARGET', '-14'))   # integrated LUFS
+LOUDNESS_TOLERANCE = float(os.getenv('HIMARI_LOUDNESS_TOLERANCE', '2'))  # dB off target still passed through
+LOUDNESS_TTL       = 180 * 24 * 3600
+LOUDNESS_TIMEOUT   = 120
+PEAK_CEILING       = -1.0    # dBTP a boost may raise the true peak to
+MAX_BOOST          = 10.0
+MAX_CUT            = 20.0
+
+ANALYZE_OPTS = ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+
+# -------------------------------------------------
+
+
+def _loudnorm_stats(stderr: str) -> dict:
+    # loudnorm prints its measurement as a JSON object at the very end
+    start, end = stderr.rfind('{'), stderr.rfind('}')
+    if start < 0 or end < start:
+        raise ValueError('no loudnorm output')
+    return json.loads(stderr[start:end + 1])
+
+
+class LoudnessCache:
+    """
+    Integrated loudness and true peak per videoId, measured once with
+    ffmpeg's ``loudnorm`` filter in a background job and kept in
+    ``LOUDNESS_DB``.
+
+    Playback never runs the analysis: ``gain`` answers from the cache, and
+    a track that hasn't been measured yet plays as-is while ``analyze``
+    measures it for next time. Only the measurement is stored, so changing
+    the target doesn't need a re-analysis.
+
+    Off unless ``jobs`` (``HIMARI_LOUDNESS_JOBS``) is set, because it isn't
+    free: every measured track is downloaded once more in full, and a
+    track whose gain is applied can't use the Opus passthrough, so it's
+    re-encoded with libopus for every guild playing it.
+    """
+
+    def __init__(self, path: Optional[str] = LOUDNESS_DB, jobs: int = LOUDNESS_JOBS, ffmpeg: str = 'ffmpeg'):
+        self.db      = open_db(path)
+        self.entries = TTLCache('loudness', LOUDNESS_MAXSIZE, self.db)
+        self.ffmpeg  = ffmpeg
+        self.enabled = jobs > 0
+        self._jobs   = asyncio.Semaphore(jobs) if self.enabled else None
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def gain(self, video_id: str, target: float = LOUDNESS_TARGET) -> Optional[float]:
+        """
+        dB to apply to bring the track to ``target``; None if it hasn't been
+        measured, 0 if it is close enough to play untouched.
+        """
+        stats = self.entries.peek(video_id) if self.enabled else None
+        if stats is None:
+            return None
+        if stats['i'] is None:
+            return 0.0   # silence: nothing to normalize
+        gain = target - stats['i']
+        if gain > 0:
+            # a peak already over the ceiling leaves no headroom: no boost, but no cut either
+            gain = min(gain, MAX_BOOST, max(0.0, PEAK_CEILING - stats['tp']))
+        gain = max(gain, -MAX_CUT)
+        return round(gain, 1) if abs(gain) >= LOUDNESS_TOLERANCE else 0.0
+
+    def analyze(self, video_id: str, url: str):
+        """
+        Measure the track in the background, unless it's known or underway.
+        """
+        if not self.enabled or video_id in self._inflight or self.entries.peek(video_id) is not None:
+            return
+        task = self._inflight[video_id] = asyncio.create_task(self._measure(video_id, url), name=f'loudness {video_id}')
+        task.add_done_callback(lambda _: self._inflight.pop(video_id, None))
+
+    async def _measure(self, video_id: str, url: str):
+        async with self._jobs:
+            try:
+                async with timed('loudness_analysis'):
+                    stats = await self._run(url)
+            except Exception:
+                logger.warning(f"Loudness analysis failed for {video_id}", exc_info=True)
+                return
+        self.entries.set(video_id, stats, time.time() + LOUDNESS_TTL)
+
+    async def _run(self, url: str) -> dict:
+        proc = await asyncio.create_subprocess_exec(
+            self.ffmpeg, '-hide_banner', '-nostats', *ANALYZE_OPTS, '-i', url,
+            '-vn', '-af', f'loudnorm=I={LOUDNESS_TARGET}:TP={PEAK_CEILING}:print_format=json', '-f', 'null', '-',
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, stderr = await asyncio.wait_for(proc.communicate(), LOUDNESS_TIMEOUT)
+        except asyncio.TimeoutError:
+            proc.kill()
+            raise
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with {proc.returncode}")
+        stats = _loudnorm_stats(stderr.decode(errors='replace'))
+        # '-inf' integrated loudness means the track is silent
+        integrated = float(stats['input_i'])
+        return {
+            'i': integrated if integrated > float('-inf') else None,
+            'tp': float(stats['input_tp']),
+        }
+
+    def close(self):
+        for task in self._inflight.values():
+            task.cancel()
+        if self.db is not None:
+            self.db.close()
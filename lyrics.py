@@ -0,0 +1,404 @@
+import asyncio
+import difflib
+import json
+import logging
+import os
+import re
+import time
+from array import array
+from bisect import bisect_right
+from typing import Iterable, List, Optional, Tuple, Union
+
+import aiohttp
+
+from cache import TTLCache, open_db
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# ----------------- Configuration -----------------
+
+LRCLIB_URL      = os.getenv('HIMARI_LRCLIB_URL', 'https://lrclib.net')
+LRCLIB_AGENT    = 'jayxdcode.Himari/0.0.5'
+LYRICS_DB       = os.getenv('HIMARI_LYRICS_DB', './himari_lyrics.db')
+LYRICS_MAXSIZE  = int(os.getenv('HIMARI_LYRICS_MAXSIZE', '2048'))
+LYRICS_TTL      = 30 * 24 * 3600   # found lyrics and instrumentals
+LYRICS_MISS_TTL = 24 * 3600        # "not on LrcLib yet", worth re-checking daily
+DURATION_BUCKET = 5                # seconds; LrcLib itself matches within ±2 s
+MATCH_THRESHOLD = float(os.getenv('HIMARI_LYRICS_MATCH', '0.65'))   # lowest score taken as a match
+MATCH_TOP       = 3                # best candidates fetched (in parallel) when a search left out the lyrics
+
+# -------------------------------------------------
+
+
+class LrcLibClient:
+    """
+    Long-lived LrcLib client that reuses one pooled aiohttp session.
+    """
+
+    def __init__(self, base_url: str = LRCLIB_URL, limit: int = 8):
+        self.base_url = base_url.rstrip('/')
+        self.limit    = limit
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={'User-Agent': LRCLIB_AGENT},
+                connector=aiohttp.TCPConnector(limit=self.limit, ttl_dns_cache=300, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=15),
+            )
+        return self._session
+
+    @timed('lrclib_fetch')
+    async def _get_json(self, path: str, params: Optional[dict] = None):
+        """
+        The decoded body, or None for a 404. Anything else that isn't a 200
+        (rate limits, outages) raises, so it's never mistaken for a miss.
+        """
+        async with self._get_session().get(f"{self.base_url}{path}", params=params) as r:
+            if r.status == 404:
+                return None
+            r.raise_for_status()
+            return await r.json(content_type=None)
+
+    async def get(self, title: str, artist: str, album: str, duration: int) -> Optional[dict]:
+        return await self._get_json('/api/get', {
+            'track_name': title,
+            'artist_name': artist,
+            'album_name': album,
+            'duration': int(duration),
+        })
+
+    async def get_by_id(self, track_id: int) -> Optional[dict]:
+        return await self._get_json(f'/api/get/{track_id}')
+
+    async def search(self, query: str) -> list:
+        return await self._get_json('/api/search', {'q': query}) or []
+
+    async def search_track(self, title: str, artist: str) -> list:
+        return await self._get_json('/api/search', {'track_name': title, 'artist_name': artist}) or []
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+lrclib = LrcLibClient()
+
+# ---------------- Lyrics Fetching ----------------
+
+# "(Official Video)", "[Lyric Video]", "(HD)"... but not "(Live)" or "(Acoustic)", which are other recordings
+_NOISE = re.compile(
+    r'\s*[(\[][^)\]]*\b(official|video|audio|lyrics?|m/?v|visuali[sz]er|hd|hq|4k|explicit|clean)\b[^)\]]*[)\]]',
+    re.I,
+)
+# "- Official Video", "| Lyrics": the same tags unbracketed, as a part of the title of their own
+_NOISE_PART = re.compile(r'(?:(?:official|music|lyrics?|video|audio|visuali[sz]er|m/?v|hd|hq|4k)\b\s*)+', re.I)
+_SEPARATORS = re.compile(r'\s+[-–—|]\s+')
+# a credit runs to its closing bracket, or up to the next " - " part of the title
+_FEAT  = re.compile(rf'\s*[(\[]?\b(feat|ft|featuring)\b\.?\s(?:(?!{_SEPARATORS.pattern})[^)\]])*[)\]]?', re.I)
+_FOLD  = re.compile(r'[\W_]+')
+
+
+def _fold(text: str) -> str:
+    return _FOLD.sub(' ', text.casefold()).strip()
+
+
+def _similar(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, _fold(a), _fold(b)).ratio()
+
+
+def clean_title(title: str, artist: str = '') -> str:
+    """
+    The song name out of a video title: no "(Official Video)", "| Lyrics"
+    or feat. credits, and no "Artist - " part when the artist is known.
+    """
+    title = _FEAT.sub('', _NOISE.sub('', title)).strip()
+    parts = [p for p in _SEPARATORS.split(title) if p]
+    if len(parts) > 1 and artist:
+        # drop the parts that are just the artist's name
+        rest = [p for p in parts if _similar(p, artist) < 0.8 and _fold(artist) not in _fold(p)]
+        parts = rest or parts[-1:]
+    # then the tags, unless that's all there is (a song called "Video")
+    parts = [p for p in parts if not _NOISE_PART.fullmatch(p)] or parts
+    return ' - '.join(parts) or title
+
+
+def match_score(candidate: dict, title: str, artist: str, duration: float) -> float:
+    """
+    0..1 for how likely an LrcLib record is the track, weighing title,
+    artist and duration; synced lyrics get a small bonus.
+    """
+    name    = _similar(candidate.get('trackName') or '', title)
+    credits = _fold(candidate.get('artistName') or '')
+    who     = 1.0 if _fold(artist) and _fold(artist) in credits else _similar(credits, artist)
+    delta   = abs((candidate.get('duration') or 0) - duration) if duration else 5
+    length  = max(0.0, 1 - delta / 10)
+    synced  = 0.05 if candidate.get('syncedLyrics') else 0.0
+    return 0.55 * name + 0.25 * who + 0.2 * length + synced
+
+
+def _has_lyrics(record: dict) -> bool:
+    return bool(record.get('syncedLyrics') or record.get('plainLyrics') or record.get('instrumental'))
+
+
+async def fetch_record(
+    title: str,
+    artist: str,
+    album: Optional[str],
+    duration: int,
+    *,
+    client: LrcLibClient = lrclib,
+) -> Optional[dict]:
+    """
+    Look the track up on LrcLib and return its raw record, or None when
+    nothing scores at least ``MATCH_THRESHOLD``.
+    """
+    title = clean_title(title, artist)
+    # with an album, LrcLib's exact lookup runs alongside the search
+    exact = client.get(title, artist, album, duration) if album else asyncio.sleep(0)
+    record, candidates = await asyncio.gather(exact, client.search_track(title, artist))
+    if record and _has_lyrics(record):
+        return record
+
+    scored: List[Tuple[float, dict]] = sorted(
+        ((match_score(c, title, artist, duration), c) for c in candidates),
+        key=lambda sc: sc[0], reverse=True,
+    )
+    top = [c for score, c in scored[:MATCH_TOP] if score >= MATCH_THRESHOLD]
+    if not top:
+        return None
+    # search results normally carry the lyrics; fetch the ones that don't
+    missing = [c for c in top if not _has_lyrics(c)]
+    if missing:
+        full = await asyncio.gather(*(client.get_by_id(c['id']) for c in missing))
+        by_id = {c['id']: r for c, r in zip(missing, full) if r}
+        top = [by_id.get(c['id'], c) for c in top]
+    return next((c for c in top if c.get('syncedLyrics')), None) or next((c for c in top if _has_lyrics(c)), None)
+
+
+async def fetch_lrc(
+    title: str,
+    artist: str,
+    album: Optional[str],
+    duration: int,
+    *,
+    mode: str = "synced",       # "synced" | "plain" | "both"
+    translate: bool = False,
+    romanize: bool = False,
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Returns (plain_lyrics, synced_lyrics) according to mode.
+    """
+    loop = asyncio.get_running_loop()
+
+    # Post-process hook: offline backends from transliterate.py, off the event loop
+    async def _post(txt: str) -> str:
+        from transliterate import convert_lrc   # it imports this module
+        out = txt
+        if translate:
+            out = await loop.run_in_executor(None, convert_lrc, out, 'translate')
+        if romanize:
+            out = await loop.run_in_executor(None, convert_lrc, out, 'romaji')
+        return out
+
+    res = await fetch_record(title, artist, album, duration) or {}
+
+    # Extract
+    raw_plain  = res.get("plainLyrics")
+    raw_synced = res.get("syncedLyrics")
+
+    # Apply mode + post-processing
+    plain  = await _post(raw_plain)  if raw_plain  and mode in ("plain","both")  else None
+    synced = await _post(raw_synced) if raw_synced and mode in ("synced","both") else None
+
+    # If they only wanted synced but none found, fall back to plain
+    if mode == "synced" and not synced:
+        return plain, None
+
+    return plain, synced
+
+
+# ---------------- Lyrics Timeline ----------------
+
+_TIME_TAG = re.compile(r'\[(\d+):(\d+(?:[.:]\d+)?)\]')
+_META_TAG = re.compile(r'^\[([a-z]+):([^\]]*)\]\s*$', re.I)
+_WORD_TAG = re.compile(r'<\d+:\d+(?:[.:]\d+)?>\s*')
+
+
+def _seconds(m: str, s: str) -> float:
+    # "12.34" and the occasional "12:34" (centiseconds after a colon)
+    if ':' in s:
+        s, cs = s.split(':', 1)
+        return int(m) * 60 + int(s) + int(cs) / 10 ** len(cs)
+    return int(m) * 60 + float(s)
+
+
+class LyricsTimeline:
+    """
+    Compiled, immutable lyric timeline.
+
+    All line texts live in one string; ``times``, ``starts`` and ``ends``
+    are parallel arrays (one slot per timestamp, sorted by time) pointing
+    into it, so a track costs a handful of allocations however long it is
+    and ``index_at`` is a bisect rather than a scan. Lines that carry
+    several timestamps share one copy of their text.
+    """
+
+    __slots__ = ('times', 'starts', 'ends', 'text')
+
+    def __init__(self, times: array, starts: array, ends: array, text: str):
+        self.times  = times
+        self.starts = starts
+        self.ends   = ends
+        self.text   = text
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[Tuple[float, str]]) -> 'LyricsTimeline':
+        entries, chunks, pos, seen = [], [], 0, {}
+        for ts, line in lines:
+            span = seen.get(line)
+            if span is None:
+                span = seen[line] = (pos, pos + len(line))
+                chunks.append(line)
+                pos += len(line) + 1
+            entries.append((ts, span[0], span[1]))
+        entries.sort()
+        return cls(
+            array('d', (e[0] for e in entries)),
+            array('I', (e[1] for e in entries)),
+            array('I', (e[2] for e in entries)),
+            '\n'.join(chunks),
+        )
+
+    @classmethod
+    def from_lrc(cls, raw: str) -> 'LyricsTimeline':
+        """
+        Compile LRC text, including enhanced (word-timed) lines and ``[offset:]``.
+        """
+        lines, offset = [], 0.0
+        for line in raw.splitlines():
+            line = line.strip()
+            if not line.startswith('['):
+                continue
+            tags = []
+            pos  = 0
+            for m in _TIME_TAG.finditer(line):
+                if m.start() != pos:
+                    break
+                tags.append(_seconds(m.group(1), m.group(2)))
+                pos = m.end()
+            if not tags:
+                meta = _META_TAG.match(line)
+                if meta and meta.group(1).lower() == 'offset':
+                    try:
+                        offset = int(meta.group(2).strip()) / 1000
+                    except ValueError:
+                        pass
+                continue
+            text = _WORD_TAG.sub('', line[pos:]).strip()
+            lines.extend((ts, text) for ts in tags)
+        # a positive offset makes lyrics show up earlier
+        if offset:
+            lines = [(max(0.0, ts - offset), text) for ts, text in lines]
+        return cls.from_lines(lines)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def line(self, i: int) -> str:
+        return self.text[self.starts[i]:self.ends[i]]
+
+    def index_at(self, elapsed: float) -> int:
+        """
+        Index of the line being sung at ``elapsed`` seconds, or -1 before the first.
+        """
+        return bisect_right(self.times, elapsed) - 1
+
+    def window(self, elapsed: float, blank: str = '♪') -> Tuple[str, str, str]:
+        """
+        (previous, current, next) lines at ``elapsed``; works after seeks too.
+        """
+        i = self.index_at(elapsed)
+        n = len(self.times)
+        prev_line = self.line(i - 1) if i > 0 else blank
+        curr_line = self.line(i) if 0 <= i < n else blank
+        next_line = self.line(i + 1) if i + 1 < n else blank
+        return prev_line, curr_line, next_line
+
+    def to_json(self) -> str:
+        return json.dumps([list(self.times), list(self.starts), list(self.ends), self.text])
+
+    @classmethod
+    def from_json(cls, data: str) -> 'LyricsTimeline':
+        times, starts, ends, text = json.loads(data)
+        return cls(array('d', times), array('I', starts), array('I', ends), text)
+
+
+def parse_lrc(raw: Union[str, list]) -> LyricsTimeline:
+    """
+    Turn either a plain LRC string or synced list into a LyricsTimeline.
+    """
+    if isinstance(raw, list):
+        return LyricsTimeline.from_lines(
+            (float(e.get("timestamp", 0)), e.get("word") or e.get("words", ""))
+            for e in raw
+        )
+    return LyricsTimeline.from_lrc(raw)
+
+# ---------------- Lyrics Cache ----------------
+
+class LyricsCache:
+    """
+    Compiled lyric timelines keyed on the videoId, or on (title, artist,
+    album, duration bucket) for lookups that don't have one.
+
+    Instrumentals and misses are cached as empty timelines too, so a replay
+    never goes back to LrcLib; LrcLib errors raise and aren't cached, so
+    the next play tries again. Entries persist to ``LYRICS_DB``.
+    """
+
+    def __init__(self, path: Optional[str] = LYRICS_DB, client: LrcLibClient = lrclib):
+        self.client  = client
+        self.db      = open_db(path)
+        self.entries = TTLCache(
+            'timelines', LYRICS_MAXSIZE, self.db,
+            dumps=LyricsTimeline.to_json, loads=LyricsTimeline.from_json,
+        )
+        self._inflight = {}
+
+    @staticmethod
+    def key(title: str, artist: str, album: Optional[str], duration: float) -> str:
+        parts = (title, artist, album or '')
+        return '|'.join(' '.join(p.lower().split()) for p in parts) + f"|{int(duration) // DURATION_BUCKET}"
+
+    async def load(
+        self, title: str, artist: str, album: Optional[str], duration: float, video_id: Optional[str] = None,
+    ) -> LyricsTimeline:
+        # keyed on the videoId when there is one, so a track is matched once
+        key = f"v:{video_id}" if video_id else self.key(title, artist, album, duration)
+        hit = self.entries.get(key)
+        if hit is not None:
+            return hit
+        # concurrent callers for the same track share one request
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.create_task(self._fetch(key, title, artist, album, duration))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, title, artist, album, duration) -> LyricsTimeline:
+        record = await fetch_record(title, artist, album, int(duration), client=self.client)
+        if record is None:
+            timeline = parse_lrc('')
+            self.entries.set(key, timeline, time.time() + LYRICS_MISS_TTL)
+            return timeline
+        raw = record.get("syncedLyrics") or record.get("plainLyrics") or ''
+        timeline = parse_lrc(raw)
+        self.entries.set(key, timeline, time.time() + LYRICS_TTL)
+        return timeline
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
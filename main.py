@@ -1,34 +1,61 @@
+import time
+BOOT_TIME = time.perf_counter()  # before the heavy imports, for the startup-time measurement
+
 import os
 import discord
 from discord.ext import commands
 from discord.ext import tasks
 import datetime
 from discord import app_commands
-import yt_dlp
 import asyncio
 import random
-import time
-import aiohttp
-from collections import deque
+import json
+import math
+import signal
+import hashlib
+from contextlib import aclosing
+from urllib.parse import urlparse, parse_qs
 import logging
-from ytmusicapi import YTMusic
-from keep_alive import keep_alive
+from keep_alive import KeepAlive
+from resolver import StreamResolver
+from cache import ResolveCache
+from lyrics import LyricsCache, LyricsTimeline, lrclib
+from transliterate import BACKENDS, SUBTITLE_DEFAULT, Subtitles, backend as subtitle_backend
+from renderer import NowPlayingRenderer
+from player import ConnectError, GuildPlayer, StartError
+from metrics import FAILED_PLAYS, QUEUE_DEPTH, STARTUP_SECONDS, VOICE_CLIENTS
+from stalls import LoopWatchdog
+from state import StateStore
+from journal import QueueJournal
+from history import PlayHistoryIndex
+from broadcast import Stations
+from loudness import LoudnessCache
+from audiocache import AudioCache
+from radio import RADIO_LOW_WATER, RadioBuffer
+from tracks import DEFAULT_BITRATE, PICK_PREFIX, Track, TrackSource, parse_duration, track_from_record, track_record
 #from  import load_dotenv
-from dataclasses import dataclass
-from lrclib import LrcLibAPI
-from typing import Optional, Tuple, Union, List 
+from typing import List, Optional
 
 # ----------------- Configuration -----------------
 
-# Keep-alive (Flask) server setup  [uncomment 13 and 22 if local]
-keep_alive()
-
 # Load environment variables [uncomment 25~27 if local]
 #dotenv_path = '../.env'
 #if os.path.exists(dotenv_path):
 #    load_dotenv(dotenv_path=dotenv_path)
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
 
+# How many queued tracks to re-resolve, probe and fetch lyrics for ahead of time
+PREFETCH_DEPTH = int(os.getenv('HIMARI_PREFETCH_DEPTH', '2'))
+
+# Startup: guilds initialised in parallel, and how long boot -> ready may take
+GUILD_INIT_CONCURRENCY = int(os.getenv('HIMARI_GUILD_INIT_CONCURRENCY', '8'))
+STARTUP_TARGET         = float(os.getenv('HIMARI_STARTUP_TARGET', '5'))
+
+# Sharding: with HIMARI_SHARD_COUNT set this process runs as an AutoShardedBot,
+# owning HIMARI_SHARD_IDS (comma separated, default all). launcher.py sets both.
+SHARD_COUNT = int(os.getenv('HIMARI_SHARD_COUNT', '0'))
+SHARD_IDS   = [int(i) for i in os.getenv('HIMARI_SHARD_IDS', '').split(',') if i.strip()] or None
+
 # Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger()
@@ -39,29 +66,34 @@ logger = logging.getLogger()
 # -------------------------------------------------
 
 # Initialize  APIs
-ytmusic = YTMusic()
-_api = LrcLibAPI(user_agent="jayxdcode.Himari/0.0.5")
+resolver = StreamResolver()
+cache    = ResolveCache()
+lyrics_cache = LyricsCache()
+subtitles = Subtitles(lyrics_cache.db)
+renderer = NowPlayingRenderer()
+watchdog = LoopWatchdog()
+state    = StateStore()
+track_index = PlayHistoryIndex()
+stations = Stations()
+loudness = LoudnessCache()
+audio_cache = AudioCache()
 
 # ————— Uptime globals —————
 startup_time = datetime.datetime.utcnow()
 total_runtime = datetime.timedelta(hours=3, minutes=55)
-announcement_sent = False
 general_channel = None
 
 # Per-guild data stores
-song_queues   = {}  # guild_id -> deque of (url, title, artist, album, thumb, dur, interaction, secret)
-play_history  = {}  # guild_id -> deque of (url, title, artist, album, thumb, dur, interaction, secret)
-auto_play     = {}  # guild_id -> bool
-
-@dataclass
-class Track:
-    stream_url: str
-    title: str
-    artist: str
-    album: str
-    thumbnail: str
-    duration: float
-    secret: bool
+players       = {}  # guild_id -> GuildPlayer (owns queue, history, voice client)
+prefetchers   = {}  # guild_id -> asyncio.Task warming the head of the queue
+prefetch_again = set()  # guild_ids whose queue changed while their prefetch was running
+radios        = {}  # guild_id -> RadioBuffer, for guilds with /autoplay on
+guild_bitrate = {}  # guild_id -> transcode target in kbps
+guild_subtitles = {}  # guild_id -> lyrics backend shown under each line ('' = none)
+guild_ends    = {}  # guild_id -> times /end was used, so playlist loads started before it stop
+
+journal = QueueJournal(dumps=track_record, loads=track_from_record)
+tracks  = TrackSource(resolver, cache, history=track_index, audio_cache=audio_cache, loudness=loudness, bitrates=guild_bitrate)
 
 # Bot intents and setup
 intents = discord.Intents.default()
@@ -70,7 +102,10 @@ intents.guilds          = True
 intents.members         = True
 intents.voice_states    = True
 
-bot = commands.Bot(command_prefix='/', intents=intents)
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(command_prefix='/', intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+else:
+    bot = commands.Bot(command_prefix='/', intents=intents)
 
 # ------------------ Responses ------------------
 
@@ -118,6 +153,11 @@ RESPONSES = {
         "**{title}** has joined the party!",
         "**{title}** has reached the queue! Stay tuned!",
     ],
+    "enqueue_playlist": [
+        "Queued up **{count}** tracks from that playlist~ Party time!",
+        "**{count}** songs just joined the queue! Hope you're comfy~",
+        "Wheee~ **{count}** more tracks lined up!",
+    ],
     "secret_enqueue": [
         "Hehe~ **{title}** is a secret queue. Shh~",
         "Top secret track **{title}** has been tucked away~",
@@ -144,180 +184,155 @@ def format_duration(sec: float) -> str:
 
 # ---------------- Lyrics Fetching ----------------
 
-async def fetch_lrc(
-    title: str,
-    artist: str,
-    album: Optional[str],
-    duration: int,
-    *,
-    mode: str = "synced",       # "synced" | "plain" | "both"
-    translate: bool = False,
-    romanize: bool = False,
-) -> Tuple[Optional[str], Optional[str]]:
+#  >>> unified lrc call <<<
+
+async def fetch_and_parse_lrc(track: Track, mode="synced") -> LyricsTimeline:
+    # served from the lyrics cache; misses go through the pooled LrcLib client,
+    # which cleans up the title and ranks the candidates
+    return await lyrics_cache.load(track.title, track.artist, track.album, track.duration, track.video_id)
+
+# ---------------- Health ----------------
+
+def health_status() -> dict:
+    latency = bot.latency
+    return {
+        'ready': bot_ready(),
+        'uptime_s': round((datetime.datetime.utcnow() - startup_time).total_seconds()),
+        'gateway_latency_ms': round(latency * 1000, 1) if math.isfinite(latency) else None,
+        'loop_lag_ms': round(watchdog.lag * 1000, 1),
+        'shards': sorted(bot.shards) if SHARD_COUNT else None,
+        'guilds': len(bot.guilds),
+        'voice_clients': len(bot.voice_clients),
+        'playing': sum(p.active for p in players.values()),
+        'queues': {str(gid): len(p.queue) for gid, p in players.items() if p.queue},
+    }
+
+def bot_ready() -> bool:
+    return bot.is_ready() and not bot.is_closed() and math.isfinite(bot.latency)
+
+http = KeepAlive(health_status, bot_ready)
+
+# ---------------- Playlists ----------------
+
+PLAYLIST_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com')
+
+def is_playlist_url(query: str) -> bool:
+    u = urlparse(query.strip())
+    if u.hostname not in PLAYLIST_HOSTS:
+        return False
+    if u.path.startswith(('/playlist', '/browse/')):
+        return True
+    # a watch?v=...&list=RD... link is a single song from an endless mix
+    lists = parse_qs(u.query).get('list')
+    return bool(lists) and not lists[0].startswith('RD')
+
+def playlist_track(entry: dict, secret: bool) -> Track:
     """
-    Returns (plain_lyrics, synced_lyrics) according to mode.
+    Lightweight placeholder; the stream URL is resolved just before it plays.
     """
-    loop = asyncio.get_event_loop()
-
-    # Helper to call the four-arg API synchronously
-    def _call_api(t, a, d, alb):
-        return _api.get_lyrics(
-            track_name=t,
-            artist_name=a,
-            duration=d,
-            album_name=alb
-        )
+    artist = entry.get('channel') or entry.get('uploader') or 'Unknown'
+    return Track(
+        video_id=entry['id'],
+        title=entry.get('title') or entry['id'],
+        artist=artist.removesuffix(' - Topic'),
+        album='',
+        duration=entry.get('duration') or 0,
+        secret=secret,
+    )
 
-    # Post-process hook
-    def _post(txt: str) -> str:
-        out = txt
-        if translate:
-            out = your_translate_function(out)
-        if romanize:
-            out = your_romanize_function(out)
-        return out
+# ---------------- Prefetching ----------------
 
-    # 1) If we have an album, go straight to fetch_lyrics(...)
-    if album:
-        res = await loop.run_in_executor(None, _call_api,
-                                         title, artist, duration, album)
+async def warm_track(track: Track, guild_id: int):
+    await tracks.warm(track, guild_id)
+    if track.lyrics is None:
+        track.lyrics = asyncio.create_task(fetch_and_parse_lrc(track))
+        track.lyrics.add_done_callback(lambda task: lyrics_prefetched(track, task))
 
-    else:
-        # 2) No album: search by title+artist
-        async with aiohttp.ClientSession() as session:
-            params = {"q": f"{title} {artist}"}
-            async with session.get("https://lrclib.net/api/search", params=params) as r:
-                if r.status != 200:
-                    return None, None
-                candidates = await r.json(content_type=None)
-
-        # pick one within ±3 s
-        best = next(
-            (c for c in candidates
-             if abs(c.get("duration", duration) - duration) <= 3),
-            None
-        ) or (candidates[0] if candidates else None)
-
-        if not best:
-            return None, None
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                "https://lrclib.net/api/get",
-                params={"track_id": best["id"]}
-            ) as r2:
-                if r2.status != 200:
-                    return None, None
-                j = await r2.json(content_type=None)
-
-        # wrap into a dummy result
-        class R:
-            plain_lyrics  = j.get("plainLyrics")
-            synced_lyrics = j.get("syncedLyrics")
-        res = R()
-
-    # 3) Extract
-    raw_plain  = getattr(res, "plain_lyrics", None)
-    raw_synced = getattr(res, "synced_lyrics", None)
-
-    # 4) Apply mode + post-processing
-    plain  = _post(raw_plain)  if raw_plain  and mode in ("plain","both")  else None
-    synced = _post(raw_synced) if raw_synced and mode in ("synced","both") else None
-
-    # 5) If they only wanted synced but none found, fall back to plain
-    if mode == "synced" and not synced:
-        return plain, None
-
-    return plain, synced
-
-
-def parse_lrc(raw: Union[str, list]) -> List[Tuple[float, str]]:
-    """
-    Turn either a plain LRC string or synced list into [(timestamp, word), ...].
-    """
-    parsed = []
-    if isinstance(raw, list):
-        for e in raw:
-            ts = float(e.get("timestamp", 0))
-            wr = e.get("word") or e.get("words", "")
-            parsed.append((ts, wr))
-    else:
-        for line in raw.splitlines():
-            if not line.startswith('['):
-                continue
-            parts = line.split(']')
-            for tag in parts[:-1]:
-                t = tag.strip('[]')
-                try:
-                    m, s = map(float, t.split(':'))
-                    parsed.append((m*60 + s, parts[-1].strip()))
-                except:
-                    pass
-    return sorted(parsed, key=lambda x: x[0])
-    
-#  >>> unified lrc call <<<
+def lyrics_prefetched(track: Track, task: asyncio.Task):
+    # a track can be skipped or removed before anything awaits this, so the error is retrieved here
+    if not task.cancelled() and task.exception() is None:
+        return
+    if not task.cancelled():
+        logger.warning(f"Lyrics prefetch failed for {track.title!r}", exc_info=task.exception())
+    if track.lyrics is task:
+        track.lyrics = None   # send_now_playing fetches them again
+
+async def prefetch_queue(gid: int):
+    # one more pass for every burst of queue changes that came in during the last one
+    while True:
+        prefetch_again.discard(gid)
+        player = players.get(gid)
+        if not player:
+            return
+        for track in player.queue.page(0, PREFETCH_DEPTH):
+            try:
+                await warm_track(track, gid)
+            except Exception:
+                logger.exception(f"Prefetch failed for {track.title!r} in guild {gid}")
+        if gid not in prefetch_again:
+            return
+
+def schedule_prefetch(gid: int):
+    task = prefetchers.get(gid)
+    if task and not task.done():
+        # cancelling would throw away an extraction that's already running; go again after it
+        prefetch_again.add(gid)
+        return
+    prefetchers[gid] = asyncio.create_task(prefetch_queue(gid), name=f'prefetch guild={gid}')
 
-async def fetch_and_parse_lrc(track: Track, mode="synced") -> List[Tuple[float, str]]:
-    #fetch plain and synced
-    splitted_title = track.title.split(' - ')
-    print()
-    print('#####')
-    print(splitted_title)
-    print('#####')
-    print()
-    if len(splitted_title) == 2:
-        safe_title = splitted_title[1]
-    elif len(splitted_title) == 1:
-        safe_title = track.title
-    else:
-        raise ValueError(f'Processing `{track.title}` resulted into {len(splitted_title)} split parts. Perhaps the title has more than 1 ` - `?')
-    
-    plain, synced = await fetch_lrc(safe_title, track.artist, track.album, track.duration, mode=mode)
-    raw = synced or plain or ''
-    return parse_lrc(raw)
+# ---------------- Radio ----------------
+
+def radio_track(item: dict) -> Track:
+    return Track(
+        video_id=item['videoId'],
+        title=item.get('title') or item['videoId'],
+        artist=item['artists'][0]['name'] if item.get('artists') else 'Unknown',
+        album=item['album']['name'] if item.get('album') else '',
+        duration=parse_duration(item.get('length')),
+    )
 
-# ---------------- Track Fetching ----------------
+async def radio_related(video_id: str, gid: int) -> List[Track]:
+    items = await resolver.radio(video_id, guild_id=gid)
+    return [radio_track(item) for item in items if item.get('videoId')]
 
-async def fetch_track_info(query: str) -> Track:
-    loop = asyncio.get_event_loop()
-    def search():
-        results = ytmusic.search(query, filter='songs', limit=1)
-        if not results:
-            return None
-        item = results[0]
-        duration = item.get('duration') or '0:00'
-        secs = sum(x * int(t) for x, t in zip([60,1], duration.split(':')))
-        return Track(
-            stream_url=f"https://www.youtube.com/watch?v={item['videoId']}",
-            title=item['title'],
-            artist=item['artists'][0]['name'] if item.get('artists') else 'Unknown',
-            album=item['album']['name'] if item.get('album') else '',
-            thumbnail=item.get('thumbnail'),
-            duration=secs,
-            secret=False
+def radio_seeds(player: GuildPlayer) -> List[str]:
+    # secret picks don't steer the radio, or its choices would give them away
+    return [t.video_id for t in player.history if not t.secret]
+
+async def radio_ready(gid: int):
+    """
+    Move warmed radio tracks into the queue while it's running low; an
+    idle player that ran dry while the radio was filling starts again.
+    """
+    player, radio = players.get(gid), radios.get(gid)
+    if player is None or radio is None or player.voice_channel is None:
+        return
+    while len(player.queue) < RADIO_LOW_WATER and (track := radio.take()):
+        try:
+            await player.enqueue([track])
+        except StartError:
+            logger.warning(f"Radio could not restart guild {gid}", exc_info=True)
+            return
+    radio.refill(radio_seeds(player))
+
+def start_radio(player: GuildPlayer) -> RadioBuffer:
+    gid = player.guild.id
+    radio = radios.get(gid)
+    if radio is None:
+        radio = radios[gid] = RadioBuffer(
+            related=lambda video_id: radio_related(video_id, gid),
+            warm=lambda track: warm_track(track, gid),
+            on_ready=lambda: radio_ready(gid),
         )
-    track = await loop.run_in_executor(None, search)
-    if not track:
-        raise ValueError("Track not found")
-    # get direct audio
-    opts = {
-            'format': 'bestaudio/best',
-            'cookiefile': './cf.txt',
-            'noplaylist': True,
-            'quiet': True,
-            'default_search': 'ytsearch',
-            'http_headers': {
-               'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:126.0) Gecko/20100101 Firefox/126.0',
-               'Accept-Language': 'en-US,en;q=0.9',
-               'Referer': 'https://www.youtube.com/',
-               'Connection': 'keep-alive',
-            },
-        }
-    with yt_dlp.YoutubeDL(opts) as ydl:
-        info = ydl.extract_info(track.stream_url, download=False)
-    track.stream_url = info['url']
-    track.thumbnail= info['thumbnail']
-    return track
+        for track in (*player.history, *player.queue):
+            radio.note(track.video_id)
+    return radio
+
+def stop_radio(gid: int) -> bool:
+    radio = radios.pop(gid, None)
+    if radio is not None:
+        radio.close()
+    return radio is not None
 
 # --- Uptime notifs logic ---
 @tasks.loop(minutes=30)
@@ -342,69 +357,193 @@ async def update_time_left():
         await general_channel.send(f"Himari’s time left: **{h}h {m}m**")
 
 
+# --- Metrics sampling ---
+# (event-loop lag is measured continuously by the watchdog)
+@tasks.loop(seconds=1)
+async def sample_metrics():
+    VOICE_CLIENTS.set(len(bot.voice_clients))
+    QUEUE_DEPTH.replace({gid: len(p.queue) for gid, p in players.items()}, label='guild')
+
+# --- Play history from the other launcher.py processes ---
+@tasks.loop(minutes=1)
+async def sync_history():
+    track_index.sync()
+
 async def shutdown():
     if general_channel:
         await general_channel.send("My time's up... See you again next boot~")
+    await stop_bot()
+
+async def stop_bot():
+    # stop the players first, so disconnecting doesn't run through (and journal) their queues
+    for player in players.values():
+        player.close()
+    for gid in list(radios):
+        stop_radio(gid)
+    stations.close()
     await bot.close()
+
+async def teardown():
+    """
+    Everything after the gateway is closed. Runs from run_bot() rather than
+    after bot.close() in shutdown(): once the gateway closes, bot.start()
+    returns and any task still awaiting is cancelled.
+    """
+    await http.stop()
+    journal.close()
+    watchdog.stop()
+    resolver.close()
+    renderer.close()
+    logger.info(f"Resolve cache stats: {cache.stats()}")
+    cache.close()
+    await lrclib.close()
+    subtitles.close()
+    lyrics_cache.close()
+    track_index.close()
+    loudness.close()
+    audio_cache.close()
     
 # ------------- Playback Controls -------------
 
-@dataclass
-class ControlsView(discord.ui.View):
-    vc: discord.VoiceClient
-    guild_id: int
-    start_time: float = None
-    paused_time: float = 0.0
+SEEK_STEP = 10   # seconds the ⏪/⏩ buttons jump
+
+SEEK_FAILED = "Couldn't jump there, so it keeps playing from where it was~"
+NOTHING_PLAYING = "Nothing's playing right now~"
 
-    def __post_init__(self):
+async def seek_to(player: GuildPlayer, position: float) -> bool:
+    # past the end is the same as skipping; raises if the track can't be
+    # reopened at ``position``, in which case the old source keeps playing
+    track = player.current
+    if track is not None and track.duration and position >= track.duration:
+        return await player.skip()
+    return await player.seek(position)
+
+class ControlsView(discord.ui.View):
+    def __init__(self, player: GuildPlayer):
         super().__init__(timeout=None)
-        self.start_time = time.time()
-        self.paused_time = 0.0
+        self.player = player
+
+    async def step(self, interaction: discord.Interaction, delta: float):
+        await interaction.response.defer()
+        try:
+            await seek_to(self.player, self.player.position + delta)
+        except Exception:
+            # the player has logged it
+            await interaction.followup.send(SEEK_FAILED, ephemeral=True)
+
+    @discord.ui.button(label=f'⏪ {SEEK_STEP}s', style=discord.ButtonStyle.secondary)
+    async def back(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.step(interaction, -SEEK_STEP)
 
     @discord.ui.button(label='⏯ Pause/Resume', style=discord.ButtonStyle.primary)
     async def pause_resume(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.vc.is_playing():
-            self.vc.pause()
-            self.paused_time = time.time() - self.start_time
-        elif self.vc.is_paused():
-            self.vc.resume()
-            self.start_time = time.time() - self.paused_time
         await interaction.response.defer()
+        await self.player.toggle()
+
+    @discord.ui.button(label=f'⏩ {SEEK_STEP}s', style=discord.ButtonStyle.secondary)
+    async def forward(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.step(interaction, SEEK_STEP)
 
     @discord.ui.button(label='⏭ Next', style=discord.ButtonStyle.danger)
     async def nxt(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.vc.stop()
         await interaction.response.defer()
-
-async def send_now_playing(interaction, track: Track):
+        await self.player.skip()
+
+def get_player(guild: discord.Guild) -> GuildPlayer:
+    player = players.get(guild.id)
+    if player is None:
+        player = players[guild.id] = GuildPlayer(
+            guild,
+            prepare=prepare_track,
+            on_start=on_track_start,
+            on_error=on_track_error,
+            journal=journal,
+            restore=journal.restore(guild.id),
+        )
+    return player
+
+async def announce(player: GuildPlayer, content=None, **kwargs) -> discord.Message:
+    # interaction webhooks only live for 15 minutes; long queues fall back to the channel
+    itx = player.interaction
+    if not itx.is_expired():
+        return await itx.followup.send(content, wait=True, **kwargs)
+    return await itx.channel.send(content, **kwargs)
+
+async def prepare_track(player: GuildPlayer, track: Track, start: float = 0.0) -> discord.AudioSource:
+    source = await tracks.make_source(track, player.guild.id, start)
+    # a broadcasting guild publishes each frame it plays to its listeners
+    station = stations.hosted_by(player.guild.id)
+    return station.tee(source) if station else source
+
+async def on_track_start(player: GuildPlayer, track: Track):
+    schedule_prefetch(player.guild.id)
+    radio = radios.get(player.guild.id)
+    if radio:
+        radio.note(track.video_id)
+        asyncio.create_task(radio_ready(player.guild.id))
+    station = stations.hosted_by(player.guild.id)
+    if station:
+        station.now_playing = 'a secret track' if track.secret else f"{track.artist} - {track.title}"
+    # secret picks stay out of the (bot-wide) autocomplete
+    if track.video_id and not track.secret:
+        track_index.record({
+            'video_id': track.video_id,
+            'title': track.title,
+            'artist': track.artist,
+            'album': track.album,
+            'duration': track.duration,
+        })
+    await announce(player, get_response('play', title=track.title))
+    await send_now_playing(player, track)
+
+async def on_track_error(player: GuildPlayer, track: Track):
+    FAILED_PLAYS.inc(stage='start')
+    await announce(player, f"Couldn't play **{track.title}**, skipping it~")
+
+def log_subtitle_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Lyrics subtitles failed", exc_info=task.exception())
+
+async def send_now_playing(player: GuildPlayer, track: Track):
     embed = discord.Embed(title='Now Playing', description=f"**{track.artist}** - **{track.title}**", color=0xff99cc)
     # embed.set_thumbnail(url="https://uxwing.com/wp-content/themes/uxwing/download/brands-and-social-media/youtube-music-icon.png")
     
-    if track.thumbnail:
-        embed.set_image(url=track.thumbnail)
+    embed.set_image(url=tracks.thumbnail(track))
     embed.add_field(name='Progress', value=f'`00:00 / {format_duration(track.duration)}`', inline=False)
     embed.add_field(name='Lyrics', value='Loading lyrics...', inline=False)
-    view = ControlsView(interaction.guild.voice_client, interaction.guild.id)
-    msg = await interaction.followup.send(embed=embed, view=view)
-
-    lrc = await fetch_and_parse_lrc(track) or [('0', 'No lyrics available. I think the track\' instrumental. LoL')]
-    idx = 0
-    start_time = time.time()
-    while interaction.guild.voice_client and (interaction.guild.voice_client.is_playing() or interaction.guild.voice_client.is_paused()):
-        elapsed = interaction.guild.voice_client.is_paused() and view.paused_time or time.time() - start_time
-        embed.set_field_at(0, name='Progress', value=f'`{format_duration(elapsed)} / {format_duration(track.duration)}`')
-        if lrc:
-            while idx + 1 < len(lrc) and elapsed - 0.25 >= lrc[idx+1][0]:
-                idx += 1
-            prev_line = lrc[idx-1][1] if idx > 0 else '♪'
-            curr_line = lrc[idx][1] if lrc else '♪'
-            next_line = lrc[idx+1][1] if idx+1 < len(lrc) else '♪'
-            embed.set_field_at(1, name='Lyrics', value=f"Powered by **LrcLib**\n {prev_line}\n> **{curr_line}**\n {next_line}")
-        try:
-            await msg.edit(embed=embed)
-        except discord.errors.HTTPException:
-            pass
-        await asyncio.sleep(0.2)
+    msg = player.np_message = await announce(player, embed=embed, view=ControlsView(player))
+
+    try:
+        lrc = await (track.lyrics or fetch_and_parse_lrc(track))
+    except Exception:
+        logger.exception(f"Lyrics failed for {track.title!r}")
+        lrc = None
+    # romaji/translation runs once per track in the background and shows up when it's ready
+    backend = guild_subtitles.get(player.guild.id, SUBTITLE_DEFAULT)
+    sub = asyncio.create_task(subtitles.load(track.video_id, lrc, backend)) if lrc and backend else None
+    if sub:
+        sub.add_done_callback(log_subtitle_failure)
+    lrc = lrc or LyricsTimeline.from_lines([(0.0, 'No lyrics available. I think the track\' instrumental. LoL')])
+
+    def render():
+        if player.current is not track or not player.active:
+            return None
+        # frames actually sent, so pauses and lag don't make this drift
+        elapsed = player.position
+        prev_line, curr_line, next_line = lrc.window(elapsed)
+        under = ''
+        if sub and sub.done() and not sub.cancelled() and not sub.exception() and sub.result():
+            # same timestamps as the lyrics, so the same lookup lines them up
+            sub_line = sub.result().window(elapsed)[1]
+            if sub_line != curr_line:
+                under = f"\n> *{sub_line}*"
+        return (
+            f'`{format_duration(elapsed)} / {format_duration(track.duration)}`',
+            f"Powered by **LrcLib**\n {prev_line}\n> **{curr_line}**{under}\n {next_line}",
+        )
+
+    # the shared renderer only edits when this text changes, within rate limits
+    await renderer.track(msg, embed, render)
 
 @bot.tree.command(name='play', description='Play or enqueue a song')
 @app_commands.describe(query='Search term or YouTube URL', secret='Queue privately')
@@ -418,68 +557,128 @@ async def play_cmd(interaction: discord.Interaction, query: str, secret: bool =
     # 2) Acknowledge interaction (thinking)
     await interaction.response.defer(thinking=True)
 
+    player = get_player(interaction.guild)
+    if is_playlist_url(query):
+        return await enqueue_playlist(player, interaction, query, secret)
+
     # 3) Fetch track metadata (followups from here)
     try:
-        track = await fetch_track_info(query)
+        track = await tracks.fetch(query, interaction.guild.id)
         track.secret = secret
     except Exception:
+        FAILED_PLAYS.inc(stage='resolve')
         return await interaction.followup.send(
             'Could not find track.', ephemeral=True
         )
 
-    # 4) Enqueue logic
-    dq = song_queues.setdefault(interaction.guild.id, deque())
-    was_empty = not dq and not interaction.guild.voice_client
-    dq.append(track)
-
-    if was_empty:
-        auto_play[interaction.guild.id] = True
-        asyncio.create_task(play_next(interaction.guild.id, interaction))
+    # 4) Enqueue logic; when this starts playback, the player answers the interaction
+    try:
+        if await player.enqueue([track], interaction=interaction, voice_channel=interaction.user.voice.channel):
+            return
+    except StartError as e:
+        return await interaction.followup.send(start_failed(e))
+    if secret:
+        await interaction.followup.send(get_response('notify_secret_enqueue'))
+        await interaction.followup.send(
+            get_response('secret_enqueue', title=track.title),
+            ephemeral=True
+        )
     else:
-        if secret:
-            await interaction.followup.send(get_response('notify_secret_enqueue'))
-            await interaction.followup.send(
-                get_response('secret_enqueue', title=track.title),
-                ephemeral=True
+        await interaction.followup.send(get_response('enqueue', title=track.title))
+    schedule_prefetch(interaction.guild.id)
+
+@play_cmd.autocomplete('query')
+async def play_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    # served from the local play-history index, never the network
+    if is_playlist_url(current) or current.startswith(('http://', 'https://')):
+        return []
+    return [
+        app_commands.Choice(name=f"{m['title']} — {m['artist']}"[:100], value=f"{PICK_PREFIX}{m['video_id']}")
+        for m in track_index.search(current)
+    ]
+
+def start_failed(error: StartError) -> str:
+    if isinstance(error, ConnectError):
+        return "I couldn't join your voice channel~ Can I connect and speak there?"
+    return "Couldn't get the music started, sorry~ Try again in a bit?"
+
+async def enqueue_playlist(player: GuildPlayer, interaction: discord.Interaction, url: str, secret: bool):
+    count = 0
+    ends = guild_ends.get(player.guild.id, 0)
+    try:
+        # placeholders go in batch by batch, playback starts with the first one;
+        # leaving the block early closes the listing, which stops yt-dlp's paging
+        async with aclosing(resolver.playlist(url, guild_id=player.guild.id)) as batches:
+            async for batch in batches:
+                if guild_ends.get(player.guild.id, 0) != ends:
+                    return await interaction.followup.send('Stopped loading that playlist~')
+                await player.enqueue(
+                    (playlist_track(e, secret) for e in batch),
+                    interaction=interaction,
+                    voice_channel=interaction.user.voice.channel,
+                )
+                count += len(batch)
+    except StartError as e:
+        return await interaction.followup.send(start_failed(e))
+    except Exception:
+        logger.exception(f"Playlist enqueue failed for {url!r}")
+        if not count:
+            return await interaction.followup.send(
+                'Could not load that playlist.', ephemeral=True
             )
-        else:
-            await interaction.followup.send(get_response('enqueue', title=track.title))
-
-async def play_next(gid: int, ctx_interaction: discord.Interaction):
-    dq = song_queues.get(gid)
-    if not dq or not auto_play.get(gid):
-        return
-    track = dq.popleft()
-    vc = ctx_interaction.guild.voice_client or await ctx_interaction.user.voice.channel.connect()
-    play_history.setdefault(gid, deque(maxlen=50)).append(track)
-
-    source = await discord.FFmpegOpusAudio.from_probe(
-        track.stream_url,
-        #executable='./ffmpeg',
-        before_options='-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-        options='-vn -sn -dn -c:a libopus -b:a 320k -vbr on -bufsize 512k'
-    )
-    await ctx_interaction.followup.send(get_response('play', title=track.title))
-    send_task = asyncio.create_task(send_now_playing(ctx_interaction, track))
-    vc.play(source, after=lambda e: asyncio.run_coroutine_threadsafe(play_next(gid, ctx_interaction), bot.loop))
-    await send_task
+    if not count:
+        return await interaction.followup.send('That playlist is empty!', ephemeral=True)
+    await interaction.followup.send(get_response('enqueue_playlist', count=count))
+    schedule_prefetch(player.guild.id)
 
 @bot.tree.command(name='pause', description='Pause playback')
 async def pause(interaction: discord.Interaction):
-    vc = interaction.guild.voice_client
-    if not vc or not vc.is_playing():
-        return await interaction.response.send_message(get_response('pause'), ephemeral=True)
-    vc.pause()
+    player = players.get(interaction.guild.id)
+    if player:
+        await player.pause()
     await interaction.response.send_message(get_response('pause'), ephemeral=True)
 
 @bot.tree.command(name='resume', description='Resume playback')
 async def resume(interaction: discord.Interaction):
-    vc = interaction.guild.voice_client
-    if not vc or not vc.is_paused():
-        return await interaction.response.send_message(get_response('resume'), ephemeral=True)
-    vc.resume()
+    player = players.get(interaction.guild.id)
+    if player:
+        await player.resume()
     await interaction.response.send_message(get_response('resume'), ephemeral=True)
 
+@bot.tree.command(name='seek', description='Jump to a point in the current song')
+@app_commands.describe(position='Where to jump to, as mm:ss or seconds')
+async def seek(interaction: discord.Interaction, position: str):
+    player = players.get(interaction.guild.id)
+    try:
+        seconds = max(0, parse_duration(position.strip()))
+    except ValueError:
+        return await interaction.response.send_message('Try something like `1:23`~', ephemeral=True)
+    if not player or player.current is None:
+        return await interaction.response.send_message(NOTHING_PLAYING, ephemeral=True)
+    # the first followup fills in this public placeholder, so the answers below are public too
+    await interaction.response.defer()
+    try:
+        playing = await seek_to(player, seconds)
+    except Exception:
+        return await interaction.followup.send(SEEK_FAILED)
+    if not playing:
+        return await interaction.followup.send(NOTHING_PLAYING)
+    await interaction.followup.send(f"Jumped to `{format_duration(seconds)}`~")
+
+@bot.tree.command(name='replay', description='Play the current song again from the start')
+async def replay(interaction: discord.Interaction):
+    player = players.get(interaction.guild.id)
+    if not player or player.current is None:
+        return await interaction.response.send_message(NOTHING_PLAYING, ephemeral=True)
+    await interaction.response.defer()
+    try:
+        playing = await player.seek(0)
+    except Exception:
+        return await interaction.followup.send(SEEK_FAILED)
+    if not playing:
+        return await interaction.followup.send(NOTHING_PLAYING)
+    await interaction.followup.send('From the top~!')
+
 #@bot.tree.command(name='skip', description='Skip the current song')
 #async def skip(interaction: discord.Interaction):
 #    vc = interaction.guild.voice_client
@@ -507,31 +706,186 @@ async def resume(interaction: discord.Interaction):
 #            get_response("enqueue", title=query)
 #        )
 
+QUEUE_PAGE = 10
+
+def queue_embed(player: GuildPlayer, page: int) -> discord.Embed:
+    # only the visible page is read, however long the queue is
+    total = len(player.queue)
+    pages = max(1, -(-total // QUEUE_PAGE))
+    start = page * QUEUE_PAGE
+    lines = []
+    for i, track in enumerate(player.queue.page(start, QUEUE_PAGE), start + 1):
+        if track.secret:
+            lines.append(get_response('queue_secret', pos=i))
+        else:
+            lines.append(f"{i}. {track.title[:80]} — {track.artist[:40]} `{format_duration(track.duration)}`")
+    embed = discord.Embed(title='Up Next!', description='\n'.join(lines) or 'Queue is empty.', color=0x00ff00)
+    embed.set_footer(text=f"Page {page + 1}/{pages} · {total} tracks")
+    return embed
+
+class QueueView(discord.ui.View):
+    def __init__(self, player: GuildPlayer):
+        super().__init__(timeout=180)
+        self.player = player
+        self.page   = 0
+
+    async def show(self, interaction: discord.Interaction, delta: int):
+        pages = max(1, -(-len(self.player.queue) // QUEUE_PAGE))
+        self.page = (self.page + delta) % pages
+        await interaction.response.edit_message(embed=queue_embed(self.player, self.page), view=self)
+
+    @discord.ui.button(label='◀', style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, -1)
+
+    @discord.ui.button(label='▶', style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, 1)
+
 @bot.tree.command(name='queue', description='Show the queue')
 async def queue_list(interaction: discord.Interaction):
-    gid = interaction.guild.id
-    dq  = song_queues.get(gid, deque())
-    if not dq:
+    player = players.get(interaction.guild.id)
+    if not player or not player.queue:
         return await interaction.response.send_message('Queue is empty.', ephemeral=True)
-
-    # Safely index the title from each tuple:
-    desc = '\n'.join(f"{i+1}. {track[1]}" for i, track in enumerate(dq))
-    embed = discord.Embed(title='Up Next!', description=desc, color=0x00ff00)
-    await interaction.response.send_message(embed=embed)
+    view = QueueView(player) if len(player.queue) > QUEUE_PAGE else discord.utils.MISSING
+    await interaction.response.send_message(embed=queue_embed(player, 0), view=view)
+
+@bot.tree.command(name='remove', description='Remove a track from the queue')
+@app_commands.describe(position='Position in /queue')
+async def remove(interaction: discord.Interaction, position: app_commands.Range[int, 1]):
+    player = players.get(interaction.guild.id)
+    track = await player.remove(position - 1) if player else None
+    if track is None:
+        return await interaction.response.send_message("There's nothing at that spot~", ephemeral=True)
+    title = 'a secret track' if track.secret else f"**{track.title}**"
+    await interaction.response.send_message(f"Poof~ {title} is out of the queue!")
+    if position <= PREFETCH_DEPTH:
+        schedule_prefetch(interaction.guild.id)
+
+@bot.tree.command(name='move', description='Move a track to another spot in the queue')
+@app_commands.describe(position='Position in /queue', to='Where it should go')
+async def move(interaction: discord.Interaction, position: app_commands.Range[int, 1], to: app_commands.Range[int, 1]):
+    player = players.get(interaction.guild.id)
+    track = await player.move(position - 1, to - 1) if player else None
+    if track is None:
+        return await interaction.response.send_message("There's nothing at that spot~", ephemeral=True)
+    title = 'A secret track' if track.secret else f"**{track.title}**"
+    await interaction.response.send_message(f"{title} is now at **#{min(to, len(player.queue))}**~")
+    if min(position, to) <= PREFETCH_DEPTH:
+        schedule_prefetch(interaction.guild.id)
+
+@bot.tree.command(name='shuffle', description='Shuffle the queue')
+async def shuffle(interaction: discord.Interaction):
+    player = players.get(interaction.guild.id)
+    count = await player.shuffle() if player else 0
+    if count < 2:
+        return await interaction.response.send_message('Not much to shuffle here~', ephemeral=True)
+    await interaction.response.send_message(f"Shuffled **{count}** tracks! Surprise me~")
+    schedule_prefetch(interaction.guild.id)
 
 @bot.tree.command(name='clear', description='Clear the queue')
 async def clear(interaction: discord.Interaction):
-    song_queues.get(interaction.guild.id, deque()).clear()
+    player = players.get(interaction.guild.id)
+    if player:
+        await player.clear()
     await interaction.response.send_message(get_response('end'), ephemeral=True)
 
 @bot.tree.command(name='end', description='Stop playback and leave')
 async def end(interaction: discord.Interaction):
-    vc = interaction.guild.voice_client
-    if vc:
-        await vc.disconnect()
-    song_queues.get(interaction.guild.id, deque()).clear()
+    player = players.get(interaction.guild.id)
+    guild_ends[interaction.guild.id] = guild_ends.get(interaction.guild.id, 0) + 1
+    stations.stop(interaction.guild.id)
+    stop_radio(interaction.guild.id)
+    if player:
+        await player.stop()
+    elif interaction.guild.voice_client:
+        await interaction.guild.voice_client.disconnect()
     await interaction.response.send_message(get_response('end'), ephemeral=True)
     
+@bot.tree.command(name='autoplay', description='Keep playing related songs when the queue runs out')
+async def autoplay(interaction: discord.Interaction):
+    gid = interaction.guild.id
+    if stop_radio(gid):
+        return await interaction.response.send_message("Autoplay's off~ I'll stop when the queue does.")
+    player = get_player(interaction.guild)
+    if not radio_seeds(player):
+        return await interaction.response.send_message(
+            'Play something first so I know what you like~', ephemeral=True
+        )
+    start_radio(player)
+    await interaction.response.send_message("Autoplay's on~ I'll keep the songs coming!")
+    await radio_ready(gid)
+
+party = app_commands.Group(name='party', description='Listening parties across servers')
+
+@party.command(name='start', description='Broadcast what plays here so other servers can listen along')
+async def party_start(interaction: discord.Interaction):
+    station = stations.start(interaction.guild.id)
+    await interaction.response.send_message(
+        f"Party time~ Other servers can tune in with `/party join code:{station.code}`! "
+        "It kicks in from the next track."
+    )
+
+@party.command(name='join', description="Listen along to another server's party")
+@app_commands.describe(code='The code from /party start')
+async def party_join(interaction: discord.Interaction, code: str):
+    if not interaction.user.voice or not interaction.user.voice.channel:
+        return await interaction.response.send_message('Join a voice channel first!', ephemeral=True)
+    station = stations.find(code)
+    if station is None:
+        return await interaction.response.send_message("I can't find a party with that code~", ephemeral=True)
+    if station.host_id == interaction.guild.id:
+        return await interaction.response.send_message("That's this server's own party, silly~", ephemeral=True)
+    await interaction.response.defer(thinking=True)
+    player = get_player(interaction.guild)
+    await player.relay(station.listen(), interaction=interaction, voice_channel=interaction.user.voice.channel)
+    host = bot.get_guild(station.host_id)
+    playing = f" Now playing: **{station.now_playing}**" if station.now_playing else ''
+    await interaction.followup.send(f"Tuned in to **{host.name if host else 'the party'}**~{playing}")
+
+@party.command(name='leave', description='Stop listening along (your queue picks up with /play)')
+async def party_leave(interaction: discord.Interaction):
+    player = players.get(interaction.guild.id)
+    if player and player.active and player.current is None:
+        await player.skip()
+    await interaction.response.send_message('Left the party~ Come back anytime!', ephemeral=True)
+
+@party.command(name='stop', description="End this server's broadcast")
+async def party_stop(interaction: discord.Interaction):
+    station = stations.stop(interaction.guild.id)
+    if station is None:
+        return await interaction.response.send_message("There's no party going on here~", ephemeral=True)
+    await interaction.response.send_message(f"Party's over~ {len(station.listeners)} server(s) were listening!")
+
+bot.tree.add_command(party)
+
+@bot.tree.command(name='bitrate', description='Set the bitrate used when a track has to be transcoded')
+@app_commands.describe(kbps='Target bitrate in kbps (0 to go back to the default)')
+async def bitrate(interaction: discord.Interaction, kbps: app_commands.Range[int, 0, 512]):
+    if kbps:
+        guild_bitrate[interaction.guild.id] = kbps
+        msg = f"Oki~ tracks will be at most **{kbps} kbps** from the next song on!"
+    else:
+        guild_bitrate.pop(interaction.guild.id, None)
+        msg = f"Back to the default **{DEFAULT_BITRATE} kbps**~"
+    await interaction.response.send_message(msg, ephemeral=True)
+
+@bot.tree.command(name='lyrics', description='Show romaji or a translation under the lyrics')
+@app_commands.describe(mode='What to show under each line')
+@app_commands.choices(mode=[app_commands.Choice(name='off', value='')] + [
+    app_commands.Choice(name=name, value=name) for name in BACKENDS
+])
+async def lyrics_mode(interaction: discord.Interaction, mode: str):
+    if not mode:
+        guild_subtitles[interaction.guild.id] = mode
+        return await interaction.response.send_message('Just the lyrics from now on~', ephemeral=True)
+    # the first check imports the backend's library, so it runs off the loop
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    if await asyncio.get_running_loop().run_in_executor(None, subtitle_backend, mode) is None:
+        return await interaction.followup.send(f"**{mode}** isn't installed on this bot, sorry~", ephemeral=True)
+    guild_subtitles[interaction.guild.id] = mode
+    await interaction.followup.send(f"I'll show **{mode}** under the lyrics from the next song on~", ephemeral=True)
+
 @bot.tree.command(name='status', description='Check remaining server runtime (ʜɪᴍᴀʀɪ)')
 async def status(interaction: discord.Interaction):
     elapsed   = datetime.datetime.utcnow() - startup_time
@@ -542,64 +896,151 @@ async def status(interaction: discord.Interaction):
         h, rem = divmod(remaining.seconds, 3600)
         m = rem // 60
         await interaction.response.send_message(f"I’ve got **{h}h {m}m** left~")
+@bot.tree.command(name='stalls', description='Show what has been blocking the bot (owner only)')
+async def stalls(interaction: discord.Interaction):
+    if not await bot.is_owner(interaction.user):
+        return await interaction.response.send_message('Only my owner can peek at this~', ephemeral=True)
+    report = watchdog.report()
+    await interaction.response.send_message(f"```\n{report[:1900]}\n```", ephemeral=True)
+
+async def tag_interaction(interaction: discord.Interaction) -> bool:
+    # names the command's task, so a stall report says who blocked the loop
+    name = interaction.command.qualified_name if interaction.command else '?'
+    watchdog.tag(f"/{name} guild={interaction.guild_id}")
+    return True
+
+bot.tree.interaction_check = tag_interaction
+
 # ----------------- Events -----------------
 @bot.event
-async def on_ready():
+async def setup_hook():
+    await http.start()
+    watchdog.start()
+    sample_metrics.start()
+    sync_history.start()
+
+def pick_general_channel(guild: discord.Guild) -> Optional[discord.TextChannel]:
+	# pick a “general” channel
+	for ch in guild.text_channels:
+		if "general" in ch.name.lower():
+			return ch
+	return guild.text_channels[0] if guild.text_channels else None
+
+def announcement_embed() -> discord.Embed:
+	embed = discord.Embed(
+		title="ʜɪᴍᴀʀɪ is back — for now!",
+		description=(
+			"Hiyaa~\n\n"
+			"I’m awake for the next **3 hours, 55 minutes** and ready to help! …\n"
+			"Run `/remaining` anytime to see how much time I’ve got left.\n\n"
+			"Let’s make the most of it, okay~?\n\n\n"
+			"`Build info (for debugging): jayxdcode/ʜɪᴍᴀʀɪ version 0.0.5 (Docker Image release, keys=BETA-unstable-5, arch='Linux AMD64', imageversion=latest)`"
+		),
+		color=discord.Color.green()
+	)
+	embed.set_footer(text="© jayxcode")
+	return embed
+
+async def init_guild(guild: discord.Guild) -> Optional[discord.TextChannel]:
+	saved = state.guild(guild.id)
+	channel = guild.get_channel(saved.get('channel_id') or 0)
+	if not isinstance(channel, discord.TextChannel):
+		channel = pick_general_channel(guild)
+	if not channel:
+		return None
+
+	# remembered from an earlier boot: no need to dig through history
+	if saved.get('channel_id') == channel.id and saved.get('announcement_id'):
+		return channel
+
+	# check for prior announcement
+	announcement = None
+	try:
+		async for msg in channel.history(limit=100):
+			if msg.author == bot.user and msg.embeds:
+				if (msg.embeds[0].title or '').startswith("ʜɪᴍᴀʀɪ is back"):
+					announcement = msg
+					break
+	except discord.Forbidden:
+		logger.warning(f"Missing permissions to read history in #{channel.name} of {guild.name}")
+		return channel
+
+	# send initial announcement
+	if announcement is None:
+		try:
+			announcement = await channel.send(embed=announcement_embed())
+		except discord.HTTPException:
+			logger.warning(f"Missing permissions to send message in #{channel.name} of {guild.name}")
+			return channel
+
+	state.update_guild(guild.id, channel_id=channel.id, announcement_id=announcement.id)
+	return channel
+
+async def sync_commands():
+	# commands are global: with several shard processes, only shard 0's syncs them
+	if SHARD_IDS and 0 not in SHARD_IDS:
+		return
+	# global sync is slow and rate limited; skip it when the commands haven't changed
+	payload = json.dumps([c.to_dict() for c in bot.tree.get_commands()], sort_keys=True)
+	digest = hashlib.sha256(payload.encode()).hexdigest()
+	if state.get('commands_digest') == digest:
+		return
 	await bot.tree.sync()
-	logger.info(f"Logged in as {bot.user} (ID: {bot.user.id})")
+	state.set('commands_digest', digest)
 
-	global announcement_sent, general_channel
-	announcement_sent = False  # reset this for every session or guild if needed
+@bot.event
+async def on_ready():
+	logger.info(f"Logged in as {bot.user} (ID: {bot.user.id}, shards: {SHARD_IDS or 'all'} of {SHARD_COUNT or 1})")
+	if update_time_left.is_running():
+		return  # a reconnect, everything below already ran this boot
 
-	for guild in bot.guilds:
-		general_channel = None
+	global general_channel
+	await sync_commands()
 
-		# pick a “general” channel
-		for ch in guild.text_channels:
-			if "general" in ch.name.lower():
-				general_channel = ch
-				break
-		if not general_channel and guild.text_channels:
-			general_channel = guild.text_channels[0]
+	sem = asyncio.Semaphore(GUILD_INIT_CONCURRENCY)
 
-		# check for prior announcement
-		if general_channel:
+	async def init_one(guild):
+		async with sem:
 			try:
-				async for msg in general_channel.history(limit=100):
-					if msg.author == bot.user and msg.embeds:
-						if msg.embeds[0].title.startswith("ʜɪᴍᴀʀɪ is back"):
-							announcement_sent = True
-							break
-			except discord.Forbidden:
-				logger.warning(f"Missing permissions to read history in #{general_channel.name} of {guild.name}")
-				continue
-
-			# send initial announcement
-			if not announcement_sent:
-				embed = discord.Embed(
-					title="ʜɪᴍᴀʀɪ is back — for now!",
-					description=(
-						"Hiyaa~\n\n"
-						"I’m awake for the next **3 hours, 55 minutes** and ready to help! …\n"
-						"Run `/remaining` anytime to see how much time I’ve got left.\n\n"
-						"Let’s make the most of it, okay~?\n\n\n"
-						"`Build info (for debugging): jayxdcode/ʜɪᴍᴀʀɪ version 0.0.5 (Docker Image release, keys=BETA-unstable-5, arch='Linux AMD64', imageversion=latest)`"
-					),
-					color=discord.Color.green()
-				)
-				embed.set_footer(text="© jayxcode")
-
-				try:
-					await general_channel.send(embed=embed)
-					announcement_sent = True
-				except discord.Forbidden:
-					logger.warning(f"Missing permissions to send message in #{general_channel.name} of {guild.name}")
-					continue
+				return await init_guild(guild)
+			except discord.HTTPException:
+				logger.exception(f"Could not initialise {guild.name}")
+				return None
+
+	channels = await asyncio.gather(*(init_one(g) for g in bot.guilds))
+	general_channel = next((ch for ch in reversed(channels) if ch), None)
+	state.save()
+
+	# queues from before the restart come back as placeholders; nothing is resolved until they play
+	for gid in list(journal.guilds):
+		guild = bot.get_guild(gid)
+		if guild is not None:
+			get_player(guild)
 
 	update_time_left.start()
+	# builds the YoutubeDL pool (and imports yt-dlp) off the loop, now that we're connected
+	asyncio.create_task(resolver.warm())
+
+	took = time.perf_counter() - BOOT_TIME
+	STARTUP_SECONDS.set(took)
+	log = logger.warning if took > STARTUP_TARGET else logger.info
+	log(f"Ready in {took:.2f}s across {len(bot.guilds)} guilds (target {STARTUP_TARGET:.0f}s)")
 
 # ----------------- Run Bot -----------------
 
+async def run_bot():
+    loop = asyncio.get_running_loop()
+    # launcher.py stops its processes with SIGTERM; both signals get the full shutdown
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, lambda: asyncio.create_task(stop_bot()))
+        except NotImplementedError:
+            pass   # Windows: Ctrl+C still cancels run_bot, and teardown runs below
+    try:
+        async with bot:
+            await bot.start(DISCORD_TOKEN)
+    finally:
+        await teardown()
 
-bot.run(DISCORD_TOKEN)
+asyncio.run(run_bot())
 
@@ -0,0 +1,200 @@
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Prometheus text exposition, without the client library: the bot only needs
+# a handful of metrics, served by the keep-alive server.
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    inner = ','.join(f'{k}="{v}"' for k, v in pairs)
+    return '{' + inner + '}'
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        with self._lock:
+            lines = self._samples()
+        return '\n'.join([f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}', *lines])
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        return [f'{self.name}{_fmt(k)} {v}' for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_key(labels)] = value
+
+    def replace(self, values: Dict[str, float], label: str):
+        """
+        Swap in a whole labelled series at once (e.g. one value per guild).
+        """
+        fresh = {((label, str(k)),): v for k, v in values.items()}
+        with self._lock:
+            self._values = fresh
+
+    def _samples(self):
+        return [f'{self.name}{_fmt(k)} {v}' for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = buckets
+        self._series: Dict[LabelKey, list] = {}   # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _samples(self):
+        lines = []
+        for key, series in self._series.items():
+            acc = 0
+            for bound, n in zip(self.buckets, series):
+                acc += n
+                lines.append(f'{self.name}_bucket{_fmt(key, [("le", str(bound))])} {acc}')
+            lines.append(f'{self.name}_bucket{_fmt(key, [("le", "+Inf")])} {series[-1]}')
+            lines.append(f'{self.name}_sum{_fmt(key)} {series[-2]}')
+            lines.append(f'{self.name}_count{_fmt(key)} {series[-1]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.setdefault(metric.name, metric)
+        return self._metrics[metric.name]
+
+    def render(self) -> str:
+        return '\n'.join(m.render() for m in list(self._metrics.values())) + '\n'
+
+
+REGISTRY = Registry()
+
+# ---------------- Himari metrics ----------------
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'himari_stage_seconds', 'Latency of hot-path stages (search, extract, probe, lyrics, edits)'))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'himari_cache_requests_total', 'Cache lookups by cache and result (hit/miss)'))
+RATE_LIMITED = REGISTRY.register(Counter(
+    'himari_discord_429_total', 'Discord 429 responses seen by the bot'))
+FAILED_PLAYS = REGISTRY.register(Counter(
+    'himari_failed_plays_total', 'Tracks that could not be resolved or started'))
+VOICE_CLIENTS = REGISTRY.register(Gauge(
+    'himari_voice_clients', 'Connected voice clients'))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'himari_queue_depth', 'Queued tracks per guild'))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    'himari_startup_seconds', 'Seconds from process start until on_ready finished'))
+LOOP_LAG = REGISTRY.register(Gauge(
+    'himari_event_loop_lag_seconds', 'How late the event loop woke up for its last heartbeat'))
+
+
+class timed:
+    """
+    Time a stage into ``himari_stage_seconds{stage=...}``.
+
+    Works as ``with``/``async with`` block or as a decorator on plain and
+    async functions::
+
+        @timed('ytmusic_search')
+        def _search(...): ...
+
+        async with timed('ffmpeg_probe'):
+            ...
+    """
+
+    def __init__(self, stage: str, histogram: Histogram = STAGE_SECONDS):
+        self.stage = stage
+        self.histogram = histogram
+        self._start: Optional[float] = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self._start, stage=self.stage)
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc):
+        self.__exit__(*exc)
+
+    def __call__(self, fn):
+        stage, histogram = self.stage, self.histogram
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timed(stage, histogram):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage, histogram):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,409 @@
+import asyncio
+import enum
+import logging
+import random
+from collections import deque
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Deque, Iterable, Optional, Tuple
+
+import discord
+
+from playqueue import PlayQueue
+
+if TYPE_CHECKING:
+    from journal import QueueJournal
+
+logger = logging.getLogger(__name__)
+
+FRAME_SECONDS = 0.02   # discord.py hands the voice client one 20 ms Opus frame per read()
+START_ATTEMPTS = 3     # tracks in a row that may fail to start before the player stops trying
+
+
+class StartError(Exception):
+    """
+    The player was idle and couldn't start anything; what's left stays queued.
+    """
+
+
+class ConnectError(StartError):
+    """
+    The voice connection failed, so no track was taken off the queue.
+    """
+
+
+class PlayerState(enum.Enum):
+    IDLE     = 'idle'
+    STARTING = 'starting'
+    PLAYING  = 'playing'
+    PAUSED   = 'paused'
+
+
+class PositionSource(discord.AudioSource):
+    """
+    Wraps an audio source and counts the frames actually sent to Discord,
+    so the playback position is exact under pauses and load.
+    """
+
+    def __init__(self, source: discord.AudioSource, offset: float = 0.0):
+        self.source = source
+        self.offset = offset
+        self.frames = 0
+
+    @property
+    def position(self) -> float:
+        return self.offset + self.frames * FRAME_SECONDS
+
+    def read(self) -> bytes:
+        data = self.source.read()
+        if data:
+            self.frames += 1
+        return data
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self):
+        self.source.cleanup()
+
+
+# (player, track, start) -> a source that begins ``start`` seconds into the track
+Prepare = Callable[['GuildPlayer', Any, float], Awaitable[discord.AudioSource]]
+Hook    = Callable[['GuildPlayer', Any], Awaitable[None]]
+
+
+class GuildPlayer:
+    """
+    Owns one guild's queue, history, voice client, current source and
+    now-playing message.
+
+    Every state transition runs as a message on the player's mailbox and
+    is handled by a single task, so commands, buttons and the ffmpeg
+    thread's end-of-track callback can never interleave. Track-end
+    callbacks carry the generation they were started with; ones from a
+    source we replaced or stopped ourselves are ignored, which is what
+    rules out double-plays.
+
+    With a ``journal``, every queue mutation is logged as it happens so
+    the queue survives restarts; ``restore`` seeds the queue and history
+    from it.
+    """
+
+    def __init__(
+        self,
+        guild: discord.Guild,
+        *,
+        prepare: Prepare,
+        on_start: Hook,
+        on_error: Hook,
+        history: int = 50,
+        journal: Optional['QueueJournal'] = None,
+        restore: Tuple[Iterable[Any], Iterable[Any]] = ((), ()),
+    ):
+        self.guild     = guild
+        self.queue     = PlayQueue(restore[0])
+        self.history: Deque[Any] = deque(restore[1], maxlen=history)
+        self.auto_play = False
+        self.state     = PlayerState.IDLE
+        self.vc: Optional[discord.VoiceClient] = None
+        self.voice_channel: Optional[discord.abc.Connectable] = None
+        self.interaction: Optional[discord.Interaction] = None
+        self.current   = None
+        self.source: Optional[PositionSource] = None
+        self.np_message: Optional[discord.Message] = None
+        self._prepare  = prepare
+        self._on_start = on_start
+        self._on_error = on_error
+        self._journal  = journal
+        self._generation = 0
+        self._tasks    = set()
+        self._loop     = asyncio.get_running_loop()
+        self._mailbox: asyncio.Queue = asyncio.Queue()
+        self._task     = asyncio.create_task(self._run(), name=f'player guild={guild.id}')
+
+    # ---- public API (safe to call from any coroutine) ----
+
+    @property
+    def position(self) -> float:
+        return self.source.position if self.source else 0.0
+
+    @property
+    def active(self) -> bool:
+        return self.state in (PlayerState.PLAYING, PlayerState.PAUSED)
+
+    async def call(self, op: str, *args) -> Any:
+        fut = self._loop.create_future()
+        self._mailbox.put_nowait((op, args, fut))
+        return await fut
+
+    def post(self, op: str, *args):
+        self._mailbox.put_nowait((op, args, None))
+
+    async def enqueue(
+        self,
+        tracks: Iterable[Any],
+        *,
+        interaction: Optional[discord.Interaction] = None,
+        voice_channel: Optional[discord.abc.Connectable] = None,
+    ) -> bool:
+        """
+        Append tracks; returns True if this started playback, False if
+        they're queued behind what's playing.
+
+        When the player was idle, ``interaction`` and ``voice_channel``
+        become the ones it announces to and connects to, and ``StartError``
+        (``ConnectError`` if the voice connection failed) means nothing
+        could be started.
+        """
+        return await self.call('enqueue', list(tracks), interaction, voice_channel)
+
+    async def relay(
+        self,
+        source: discord.AudioSource,
+        *,
+        interaction: Optional[discord.Interaction] = None,
+        voice_channel: Optional[discord.abc.Connectable] = None,
+    ):
+        """
+        Play an open-ended outside source (a broadcast) instead of the
+        queue, until it ends or is skipped. The queue is kept for later.
+        """
+        return await self.call('relay', source, interaction, voice_channel)
+
+    async def skip(self) -> bool:
+        return await self.call('skip')
+
+    async def pause(self) -> bool:
+        return await self.call('pause')
+
+    async def resume(self) -> bool:
+        return await self.call('resume')
+
+    async def toggle(self) -> bool:
+        return await self.call('toggle')
+
+    async def seek(self, position: float) -> bool:
+        """
+        Restart the current track ``position`` seconds in; False if nothing is playing.
+        """
+        return await self.call('seek', position)
+
+    async def clear(self):
+        return await self.call('clear')
+
+    async def remove(self, index: int) -> Optional[Any]:
+        """
+        Drop the queued track at ``index`` (0-based); returns it, or None.
+        """
+        return await self.call('remove', index)
+
+    async def move(self, src: int, dst: int) -> Optional[Any]:
+        return await self.call('move', src, dst)
+
+    async def shuffle(self) -> int:
+        return await self.call('shuffle')
+
+    async def stop(self):
+        return await self.call('stop')
+
+    def close(self):
+        self._task.cancel()
+        for task in self._tasks:
+            task.cancel()
+
+    # ---- actor ----
+
+    async def _run(self):
+        while True:
+            op, args, fut = await self._mailbox.get()
+            try:
+                result = await getattr(self, f'_do_{op}')(*args)
+            except Exception as e:
+                logger.exception(f"Player {self.guild.id}: '{op}' failed")
+                if fut is not None and not fut.done():
+                    fut.set_exception(e)
+                continue
+            if fut is not None and not fut.done():
+                fut.set_result(result)
+
+    def _log(self, op: str, *args):
+        if self._journal is not None:
+            getattr(self._journal, op)(self.guild.id, *args)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _after(self, generation: int) -> Callable[[Optional[Exception]], None]:
+        # runs on discord.py's audio thread
+        def after(error: Optional[Exception]):
+            self._loop.call_soon_threadsafe(self.post, 'track_end', generation, error)
+        return after
+
+    async def _connect(self) -> discord.VoiceClient:
+        vc = self.vc or self.guild.voice_client
+        if vc is None or not vc.is_connected():
+            vc = await self.voice_channel.connect()
+        self.vc = vc
+        return vc
+
+    def _idle(self):
+        self._log('finish')
+        self.state   = PlayerState.IDLE
+        self.current = None
+        self.source  = None
+
+    async def _advance(self):
+        failures = 0
+        while self.queue and self.auto_play:
+            self.state = PlayerState.STARTING
+            try:
+                vc = await self._connect()
+            except Exception as e:
+                # no track could play without it: keep them all for the next try
+                self._idle()
+                raise ConnectError(f"Could not connect to {self.voice_channel}") from e
+            track = self.queue.popleft()
+            self._log('pop')
+            try:
+                source = await self._prepare(self, track, 0.0)
+            except Exception:
+                logger.exception(f"Player {self.guild.id}: could not start {track!r}")
+                self._spawn(self._on_error(self, track))
+                failures += 1
+                if failures >= START_ATTEMPTS:
+                    # a dead resolver would fail them all; keep the rest queued
+                    logger.warning(f"Player {self.guild.id}: {failures} tracks in a row failed, stopping")
+                    break
+                continue
+            self._generation += 1
+            self.source  = PositionSource(source)
+            self.current = track
+            vc.play(self.source, after=self._after(self._generation))
+            self.state = PlayerState.PLAYING
+            self.history.append(track)
+            self._spawn(self._on_start(self, track))
+            return
+        self._idle()
+
+    async def _do_enqueue(self, tracks: list, interaction, voice_channel) -> bool:
+        self.queue.extend(tracks)
+        self._log('enqueue', tracks)
+        if self.state is not PlayerState.IDLE:
+            return False
+        self.interaction   = interaction or self.interaction
+        self.voice_channel = voice_channel or self.voice_channel
+        self.auto_play = True
+        await self._advance()
+        if self.state is not PlayerState.PLAYING:
+            raise StartError("No track could be started")
+        return True
+
+    async def _do_relay(self, source: discord.AudioSource, interaction, voice_channel):
+        self._generation += 1   # whatever is playing now ends without advancing
+        vc = self.vc or self.guild.voice_client
+        if vc is not None and (vc.is_playing() or vc.is_paused()):
+            vc.stop()
+        self._log('finish')
+        self.interaction   = interaction or self.interaction
+        self.voice_channel = voice_channel or self.voice_channel
+        self.auto_play = False
+        self.state     = PlayerState.STARTING
+        try:
+            vc = await self._connect()
+        except Exception:
+            self.state = PlayerState.IDLE
+            source.cleanup()
+            raise
+        self._generation += 1
+        self.source  = PositionSource(source)
+        self.current = None
+        vc.play(self.source, after=self._after(self._generation))
+        self.state = PlayerState.PLAYING
+
+    async def _do_track_end(self, generation: int, error: Optional[Exception]):
+        if generation != self._generation:
+            return
+        if error:
+            logger.warning(f"Player {self.guild.id}: playback error: {error}")
+        await self._advance()
+
+    async def _do_skip(self) -> bool:
+        if not self.active:
+            return False
+        # the after= callback for this generation advances the queue
+        self.vc.stop()
+        return True
+
+    async def _do_pause(self) -> bool:
+        if self.state is not PlayerState.PLAYING:
+            return False
+        self.vc.pause()
+        self.state = PlayerState.PAUSED
+        return True
+
+    async def _do_resume(self) -> bool:
+        if self.state is not PlayerState.PAUSED:
+            return False
+        self.vc.resume()
+        self.state = PlayerState.PLAYING
+        return True
+
+    async def _do_toggle(self) -> bool:
+        if self.state is PlayerState.PLAYING:
+            return await self._do_pause()
+        return await self._do_resume()
+
+    async def _do_seek(self, position: float) -> bool:
+        track = self.current
+        if not self.active or track is None:
+            return False
+        position = max(0.0, position)
+        # the old source keeps playing until the new one is ready
+        source = await self._prepare(self, track, position)
+        self._generation += 1   # so stopping the old one doesn't advance
+        self.vc.stop()
+        self.source = PositionSource(source, offset=position)
+        self.vc.play(self.source, after=self._after(self._generation))
+        self.state = PlayerState.PLAYING
+        return True
+
+    async def _do_clear(self):
+        self.queue.clear()
+        self._log('clear')
+
+    async def _do_remove(self, index: int) -> Optional[Any]:
+        if not 0 <= index < len(self.queue):
+            return None
+        track = self.queue.pop(index)
+        self._log('remove', index)
+        return track
+
+    async def _do_move(self, src: int, dst: int) -> Optional[Any]:
+        n = len(self.queue)
+        if not 0 <= src < n:
+            return None
+        dst = min(max(dst, 0), n - 1)
+        track = self.queue.move(src, dst)
+        self._log('move', src, dst)
+        return track
+
+    async def _do_shuffle(self) -> int:
+        seed = random.getrandbits(32)
+        self.queue.shuffle(seed)
+        self._log('shuffle', seed)
+        return len(self.queue)
+
+    async def _do_stop(self):
+        self.queue.clear()
+        self._log('clear')
+        self._log('finish')
+        self.auto_play = False
+        self._generation += 1   # whatever is playing now ends without advancing
+        vc = self.vc or self.guild.voice_client
+        if vc is not None:
+            vc.stop()
+            await vc.disconnect()
+        self.vc      = None
+        self.state   = PlayerState.IDLE
+        self.current = None
+        self.source  = None
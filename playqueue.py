@@ -0,0 +1,168 @@
+import random
+from itertools import chain, islice
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+BLOCK = 128   # items per block; blocks split at twice this
+
+
+class PlayQueue:
+    """
+    Sequence of tracks with cheap positional edits, for queues of
+    thousands of entries.
+
+    Items live in blocks of up to ``2 * BLOCK``; a Fenwick tree over the
+    block sizes maps a position to its block in O(log n), so ``insert``,
+    ``pop(i)`` and ``move`` only shift items within one block, and a page
+    is a locate plus a slice. The block list is rebuilt when a block
+    splits or empties, which is rare and O(n / BLOCK).
+
+    Supports the deque operations the player relies on (``extend``,
+    ``popleft``, ``clear``, iteration, ``len``).
+    """
+
+    __slots__ = ('_blocks', '_tree', '_len')
+
+    def __init__(self, items: Iterable[Any] = ()):
+        self._blocks: List[List[Any]] = []
+        self._tree: List[int] = [0]
+        self._len = 0
+        self.extend(items)
+
+    # ---- Fenwick tree over block sizes ----
+
+    def _build(self):
+        n = len(self._blocks)
+        tree = [0] * (n + 1)
+        for i, block in enumerate(self._blocks, 1):
+            tree[i] += len(block)
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def _bump(self, b: int, delta: int):
+        i, tree = b + 1, self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _locate(self, index: int) -> Tuple[int, int]:
+        # descend the tree: the last block whose prefix sum is <= index
+        pos, rem, tree = 0, index, self._tree
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(tree) and tree[nxt] <= rem:
+                pos = nxt
+                rem -= tree[nxt]
+            step >>= 1
+        return pos, rem
+
+    def _index(self, index: int) -> int:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('queue index out of range')
+        return index
+
+    # ---- reads ----
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Any]:
+        return chain.from_iterable(self._blocks)
+
+    def __getitem__(self, index: int) -> Any:
+        b, off = self._locate(self._index(index))
+        return self._blocks[b][off]
+
+    def page(self, start: int, count: int) -> List[Any]:
+        """
+        ``count`` items from ``start`` on, without walking the ones before.
+        """
+        if start >= self._len or count <= 0:
+            return []
+        b, off = self._locate(max(0, start))
+        items = chain(self._blocks[b][off:], chain.from_iterable(self._blocks[b + 1:]))
+        return list(islice(items, count))
+
+    def __repr__(self) -> str:
+        return f"PlayQueue({len(self)} items)"
+
+    # ---- writes ----
+
+    def append(self, item: Any):
+        if not self._blocks or len(self._blocks[-1]) >= BLOCK:
+            self._blocks.append([item])
+            self._len += 1
+            self._build()
+            return
+        self._blocks[-1].append(item)
+        self._len += 1
+        self._bump(len(self._blocks) - 1, 1)
+
+    def extend(self, items: Iterable[Any]):
+        items = list(items)
+        if not items:
+            return
+        if self._blocks and len(self._blocks[-1]) < BLOCK:
+            room = BLOCK - len(self._blocks[-1])
+            self._blocks[-1].extend(items[:room])
+            items = items[room:]
+        self._blocks.extend(items[i:i + BLOCK] for i in range(0, len(items), BLOCK))
+        self._len = sum(len(b) for b in self._blocks)
+        self._build()
+
+    def insert(self, index: int, item: Any):
+        if index < 0:
+            index = max(0, index + self._len)
+        if index >= self._len:
+            return self.append(item)
+        b, off = self._locate(index)
+        block = self._blocks[b]
+        block.insert(off, item)
+        self._len += 1
+        if len(block) > 2 * BLOCK:
+            self._blocks[b:b + 1] = [block[:BLOCK], block[BLOCK:]]
+            self._build()
+        else:
+            self._bump(b, 1)
+
+    def appendleft(self, item: Any):
+        self.insert(0, item)
+
+    def pop(self, index: int = -1) -> Any:
+        b, off = self._locate(self._index(index))
+        block = self._blocks[b]
+        item = block.pop(off)
+        self._len -= 1
+        if block:
+            self._bump(b, -1)
+        else:
+            del self._blocks[b]
+            self._build()
+        return item
+
+    def popleft(self) -> Any:
+        return self.pop(0)
+
+    def move(self, src: int, dst: int) -> Any:
+        """
+        Move the item at ``src`` so it ends up at ``dst``.
+        """
+        item = self.pop(src)
+        self.insert(dst, item)
+        return item
+
+    def shuffle(self, seed: Optional[int] = None):
+        # seeded, so the journal can replay the exact same order
+        items = list(self)
+        random.Random(seed).shuffle(items)
+        self.clear()
+        self.extend(items)
+
+    def clear(self):
+        self._blocks = []
+        self._tree = [0]
+        self._len = 0
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# ----------------- Configuration -----------------
+
+RADIO_BUFFER    = int(os.getenv('HIMARI_RADIO_BUFFER', '3'))   # warmed tracks kept ready
+RADIO_LOW_WATER = 1      # top the queue up when fewer than this many tracks are left
+RADIO_SEEDS     = 3      # recent plays to seed from, newest first
+RADIO_MEMORY    = 200    # recently played/queued tracks never picked again
+
+# -------------------------------------------------
+
+Related = Callable[[str], Awaitable[List[Any]]]
+Warm    = Callable[[Any], Awaitable[None]]
+Ready   = Callable[[], Awaitable[None]]
+
+
+class RadioBuffer:
+    """
+    One guild's autoplay: related tracks from YT Music's radio for what
+    was played last, with a few of them resolved, probed and lyric'd
+    ahead of time so the queue can be topped up without a cold start.
+
+    Tracks are filled one at a time in the background whenever the
+    buffer runs below ``size``, which spreads the resolve work over the
+    song instead of bunching it at the end. ``on_ready`` runs after each
+    track is ready, so the caller can move it into the queue if needed.
+    """
+
+    def __init__(self, *, related: Related, warm: Warm, on_ready: Ready, size: int = RADIO_BUFFER):
+        self.size   = size
+        self.ready: Deque[Any] = deque()
+        self._related  = related
+        self._warm     = warm
+        self._on_ready = on_ready
+        self._seen: Deque[str] = deque(maxlen=RADIO_MEMORY)
+        self._seen_set: Set[str] = set()
+        self._pool: Dict[str, List[Any]] = {}   # seed videoId -> related tracks not used yet
+        self._task: Optional[asyncio.Task] = None
+
+    def note(self, video_id: str):
+        """
+        Mark a track as played or queued, so the radio won't pick it.
+        """
+        if not video_id or video_id in self._seen_set:
+            return
+        if len(self._seen) == self._seen.maxlen:
+            self._seen_set.discard(self._seen[0])
+        self._seen.append(video_id)
+        self._seen_set.add(video_id)
+
+    def take(self) -> Optional[Any]:
+        return self.ready.popleft() if self.ready else None
+
+    def refill(self, seeds: List[str]):
+        """
+        Top the buffer up from ``seeds`` (videoIds, newest last) in the background.
+        """
+        if self._task is not None and not self._task.done():
+            return
+        if len(self.ready) >= self.size or not seeds:
+            return
+        self._task = asyncio.create_task(self._fill(seeds[-RADIO_SEEDS:][::-1]), name='radio-fill')
+
+    async def _next(self, seeds: List[str]) -> Optional[Any]:
+        for seed in seeds:
+            pool = self._pool.get(seed)
+            if pool is None:
+                try:
+                    pool = self._pool[seed] = list(await self._related(seed))
+                except Exception:
+                    logger.exception(f"Radio lookup failed for {seed}")
+                    continue
+            while pool:
+                track = pool.pop(0)
+                if track.video_id not in self._seen_set:
+                    return track
+        return None
+
+    async def _fill(self, seeds: List[str]):
+        while len(self.ready) < self.size:
+            track = await self._next(seeds)
+            if track is None:
+                return
+            self.note(track.video_id)
+            try:
+                await self._warm(track)
+            except Exception:
+                logger.exception(f"Radio could not prepare {track.video_id}")
+                continue
+            self.ready.append(track)
+            await self._on_ready()
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
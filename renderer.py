@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+import discord
+
+from metrics import RATE_LIMITED, timed
+
+logger = logging.getLogger(__name__)
+
+# ----------------- Configuration -----------------
+
+RENDER_TICK      = 0.25   # how often every message is re-rendered (no REST involved)
+MESSAGE_INTERVAL = float(os.getenv('HIMARI_NP_INTERVAL', '2.0'))   # min seconds between edits of one message
+CHANNEL_INTERVAL = 1.0    # min seconds between edits in one channel, grows under pressure
+MAX_INTERVAL     = 8.0
+SLOW_EDIT        = 1.0    # an edit this slow means discord.py sat on the bucket
+
+# -------------------------------------------------
+
+Render = Callable[[], Optional[Tuple[str, ...]]]
+
+
+@dataclass
+class _Entry:
+    msg: discord.Message
+    embed: discord.Embed
+    render: Render
+    done: asyncio.Future
+    sent: Tuple[str, ...] = ()
+    last_edit: float = 0.0
+    editing: bool = False
+
+
+@dataclass
+class _Channel:
+    interval: float = CHANNEL_INTERVAL
+    next_edit: float = 0.0
+    messages: int = 0
+
+
+class NowPlayingRenderer:
+    """
+    One task that keeps every live "Now Playing" embed up to date.
+
+    Each tick re-renders all tracked messages locally; a message is only
+    edited when its rendered field values changed, at most once per
+    ``MESSAGE_INTERVAL`` and within a per-channel budget that backs off
+    when Discord starts rate limiting us. Edits are never queued: a
+    message that has to wait simply gets whatever is current once it is
+    allowed to edit, so intermediate lyric lines are skipped rather than
+    the display falling behind.
+    """
+
+    def __init__(self):
+        self._entries: Dict[int, _Entry] = {}
+        self._channels: Dict[int, _Channel] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.edits   = 0
+        self.skipped = 0
+        self.limited = 0
+
+    def track(self, msg: discord.Message, embed: discord.Embed, render: Render) -> asyncio.Future:
+        """
+        Start rendering ``render()`` into ``embed`` fields 0..n of ``msg``.
+
+        ``render`` returns the field values, or None once playback is over.
+        The returned future resolves when the message is retired.
+        """
+        old = self._entries.pop(msg.id, None)
+        if old is None:
+            self._channels.setdefault(msg.channel.id, _Channel()).messages += 1
+        elif not old.done.done():
+            old.done.set_result(None)
+        entry = _Entry(msg, embed, render, asyncio.get_running_loop().create_future())
+        self._entries[msg.id] = entry
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name='np-renderer')
+        return entry.done
+
+    def untrack(self, msg_id: int):
+        entry = self._entries.pop(msg_id, None)
+        if entry is None:
+            return
+        if not entry.done.done():
+            entry.done.set_result(None)
+        ch = self._channels.get(entry.msg.channel.id)
+        if ch is not None:
+            ch.messages -= 1
+            if ch.messages <= 0:
+                del self._channels[entry.msg.channel.id]
+
+    async def _run(self):
+        while self._entries:
+            now = time.monotonic()
+            # stalest first, so messages sharing a channel take turns
+            for msg_id, entry in sorted(self._entries.items(), key=lambda kv: kv[1].last_edit):
+                try:
+                    state = entry.render()
+                except Exception:
+                    logger.exception(f"Now-playing render failed for message {msg_id}")
+                    state = None
+                if state is None:
+                    self.untrack(msg_id)
+                    continue
+                if state == entry.sent or entry.editing:
+                    continue
+                ch = self._channels[entry.msg.channel.id]
+                if now - entry.last_edit < MESSAGE_INTERVAL or now < ch.next_edit:
+                    self.skipped += 1
+                    continue
+                ch.next_edit = now + ch.interval
+                for i, value in enumerate(state):
+                    if i >= len(entry.sent) or entry.sent[i] != value:
+                        entry.embed.set_field_at(i, name=entry.embed.fields[i].name, value=value, inline=False)
+                entry.sent = state
+                entry.last_edit = now
+                entry.editing = True
+                asyncio.create_task(self._edit(entry, ch))
+            await asyncio.sleep(RENDER_TICK)
+
+    async def _edit(self, entry: _Entry, ch: _Channel):
+        started = time.monotonic()
+        try:
+            with timed('discord_edit'):
+                await entry.msg.edit(embed=entry.embed)
+            self.edits += 1
+        except discord.NotFound:
+            # message got deleted, nothing left to render into
+            self.untrack(entry.msg.id)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                self.limited += 1
+                RATE_LIMITED.inc()
+                retry = float(e.response.headers.get('Retry-After', ch.interval))
+                ch.next_edit = time.monotonic() + retry
+                ch.interval = min(MAX_INTERVAL, ch.interval * 2)
+            # the next changed render goes out again
+            entry.sent = ()
+        finally:
+            entry.editing = False
+        took = time.monotonic() - started
+        if took > SLOW_EDIT:
+            ch.interval = min(MAX_INTERVAL, ch.interval * 2)
+        elif ch.interval > CHANNEL_INTERVAL:
+            ch.interval = max(CHANNEL_INTERVAL, ch.interval * 0.9)
+
+    def stats(self) -> Dict[str, int]:
+        return {'messages': len(self._entries), 'edits': self.edits, 'skipped': self.skipped, 'limited': self.limited}
+
+    def close(self):
+        for msg_id in list(self._entries):
+            self.untrack(msg_id)
+        if self._task is not None:
+            self._task.cancel()
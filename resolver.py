@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, List, Optional
+
+from extractor import ExtractorClient
+from metrics import timed
+
+# yt_dlp and ytmusicapi take a while to import; they're loaded on a worker
+# thread the first time they're needed instead of before the bot connects
+if TYPE_CHECKING:
+    import yt_dlp
+    from ytmusicapi import YTMusic
+
+logger = logging.getLogger(__name__)
+
+# ----------------- Configuration -----------------
+
+RESOLVER_WORKERS   = int(os.getenv('HIMARI_RESOLVER_WORKERS', '4'))
+RESOLVER_PENDING   = int(os.getenv('HIMARI_RESOLVER_PENDING', str(RESOLVER_WORKERS * 2)))
+RESOLVER_PER_GUILD = int(os.getenv('HIMARI_RESOLVER_PER_GUILD', '2'))
+PLAYLIST_MAX       = int(os.getenv('HIMARI_PLAYLIST_MAX', '500'))
+PLAYLIST_BATCH     = 25
+RADIO_LIMIT        = 25
+EXTRACTOR_SOCKET   = os.getenv('HIMARI_EXTRACTOR_SOCKET')   # unset = resolve in this process
+
+YDL_OPTS = {
+    'format': 'bestaudio/best',
+    'cookiefile': './cf.txt',
+    'noplaylist': True,
+    'quiet': True,
+    'default_search': 'ytsearch',
+    'http_headers': {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:126.0) Gecko/20100101 Firefox/126.0',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Referer': 'https://www.youtube.com/',
+        'Connection': 'keep-alive',
+    },
+}
+
+# flat, lazily paged playlist listing: ids and titles only, no stream URLs
+FLAT_OPTS = {
+    **YDL_OPTS,
+    'noplaylist': False,
+    'extract_flat': 'in_playlist',
+    'lazy_playlist': True,
+}
+
+# -------------------------------------------------
+
+
+class StreamResolver:
+    """
+    Runs YTMusic searches and yt-dlp extractions on a bounded thread pool.
+
+    Every worker thread keeps its own warm ``YoutubeDL`` (they are not
+    thread-safe, but are safe to reuse sequentially), so the event loop
+    never blocks on an extraction and no call pays for building one.
+    Work is admitted through a bot-wide and a per-guild semaphore, so a
+    burst of ``/play``s from one guild can't starve the others.
+
+    With ``socket`` set, searches and extractions go to the shared
+    extraction server instead (see extractor.py), falling back to the
+    local pool while it's unreachable. Flat playlist listings stay local:
+    they need no signature deciphering, and paging them in-process is
+    what lets playback start on the first batch.
+    """
+
+    def __init__(
+        self,
+        workers: int = RESOLVER_WORKERS,
+        pending: int = RESOLVER_PENDING,
+        per_guild: int = RESOLVER_PER_GUILD,
+        socket: Optional[str] = EXTRACTOR_SOCKET,
+    ):
+        self.workers   = workers
+        self.per_guild = per_guild
+        self._pool     = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='resolver')
+        self._local    = threading.local()
+        self._global   = asyncio.Semaphore(pending)
+        self._guilds: Dict[int, asyncio.Semaphore] = {}
+        self._ytmusic: Optional['YTMusic'] = None
+        self._ytmusic_lock = threading.Lock()
+        self._remote   = ExtractorClient(socket) if socket else None
+
+    # ---- worker-thread helpers ----
+
+    def _ydl(self) -> 'yt_dlp.YoutubeDL':
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            import yt_dlp
+            ydl = self._local.ydl = yt_dlp.YoutubeDL(YDL_OPTS)
+        return ydl
+
+    def _flat_ydl(self) -> 'yt_dlp.YoutubeDL':
+        ydl = getattr(self._local, 'flat', None)
+        if ydl is None:
+            import yt_dlp
+            ydl = self._local.flat = yt_dlp.YoutubeDL(FLAT_OPTS)
+        return ydl
+
+    def _yt(self) -> 'YTMusic':
+        with self._ytmusic_lock:
+            if self._ytmusic is None:
+                from ytmusicapi import YTMusic
+                self._ytmusic = YTMusic()
+            return self._ytmusic
+
+    @timed('ytmusic_search')
+    def _search(self, query: str) -> Optional[dict]:
+        results = self._yt().search(query, filter='songs', limit=1)
+        return results[0] if results else None
+
+    @timed('ytmusic_radio')
+    def _radio(self, video_id: str) -> List[dict]:
+        playlist = self._yt().get_watch_playlist(videoId=video_id, radio=True, limit=RADIO_LIMIT)
+        return playlist.get('tracks') or []
+
+    @timed('ytdlp_extract')
+    def _extract(self, url: str) -> dict:
+        return self._ydl().extract_info(url, download=False)
+
+    @timed('ytdlp_playlist')
+    def _walk_playlist(self, url: str, emit: Callable[[List[dict]], None], stop: threading.Event):
+        ydl = self._flat_ydl()
+        info = ydl.extract_info(url, download=False, process=False)
+        # album pages redirect to their OLAK5uy_ playlist
+        for _ in range(3):
+            if info.get('_type') not in ('url', 'url_transparent'):
+                break
+            info = ydl.extract_info(info['url'], download=False, process=False)
+        batch = []
+        # with process=False the entries are a generator that pages on demand
+        for i, entry in enumerate(info.get('entries') or ()):
+            # checked before every entry, so a stopped walk fetches no further pages
+            if i >= PLAYLIST_MAX or stop.is_set():
+                return
+            if not entry or not entry.get('id'):
+                continue
+            batch.append(entry)
+            if len(batch) >= PLAYLIST_BATCH:
+                emit(batch)
+                batch = []
+        if batch:
+            emit(batch)
+
+    # ---- async API ----
+
+    def _guild_sem(self, guild_id: int) -> asyncio.Semaphore:
+        sem = self._guilds.get(guild_id)
+        if sem is None:
+            sem = self._guilds[guild_id] = asyncio.Semaphore(self.per_guild)
+        return sem
+
+    @asynccontextmanager
+    async def _admit(self, guild_id: Optional[int]):
+        if guild_id is None:
+            async with self._global:
+                yield
+            return
+        async with self._guild_sem(guild_id), self._global:
+            yield
+
+    async def run(self, fn: Callable[..., Any], *args, guild_id: Optional[int] = None) -> Any:
+        """
+        Run ``fn(*args)`` on the pool, honouring the concurrency limits.
+        """
+        async with self._admit(guild_id):
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    async def _dispatch(self, op: str, fn: Callable[[str], Any], arg: str, guild_id: Optional[int]) -> Any:
+        if self._remote is not None:
+            try:
+                async with self._admit(guild_id), timed(f'remote_{op}'):
+                    return await self._remote.call(op, arg)
+            except OSError as e:
+                logger.warning(f"Extractor unavailable ({e}), running {op} locally")
+        return await self.run(fn, arg, guild_id=guild_id)
+
+    async def search(self, query: str, *, guild_id: Optional[int] = None) -> Optional[dict]:
+        return await self._dispatch('search', self._search, query, guild_id)
+
+    async def extract(self, url: str, *, guild_id: Optional[int] = None) -> dict:
+        return await self._dispatch('extract', self._extract, url, guild_id)
+
+    async def radio(self, video_id: str, *, guild_id: Optional[int] = None) -> List[dict]:
+        """
+        YT Music's radio for a track: related songs, starting with the track itself.
+        """
+        return await self._dispatch('radio', self._radio, video_id, guild_id)
+
+    async def playlist(self, url: str, *, guild_id: Optional[int] = None) -> AsyncIterator[List[dict]]:
+        """
+        Yield flat playlist entries in batches as yt-dlp pages through them.
+        Close the generator (``contextlib.aclosing``) when stopping early,
+        so the walk on the worker thread stops too.
+        """
+        loop  = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop  = threading.Event()
+
+        def emit(batch):
+            if not stop.is_set():
+                loop.call_soon_threadsafe(queue.put_nowait, batch)
+
+        task = asyncio.ensure_future(self.run(self._walk_playlist, url, emit, stop, guild_id=guild_id))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while (batch := await queue.get()) is not None:
+                yield batch
+            await task
+        finally:
+            # cancelling only stops the wait; the thread sees this before its next entry
+            stop.set()
+            task.cancel()
+
+    async def warm(self):
+        """
+        Build a YoutubeDL in every worker up front so the first plays are fast.
+        """
+        if self._remote is not None:
+            return   # the extraction server warms its own processes
+        loop = asyncio.get_running_loop()
+        # the barrier makes each job land on its own thread
+        barrier = threading.Barrier(self.workers)
+
+        def _warm_one():
+            self._ydl()
+            self._yt()
+            barrier.wait(timeout=30)
+
+        await asyncio.gather(*(
+            loop.run_in_executor(self._pool, _warm_one) for _ in range(self.workers)
+        ), return_exceptions=True)
+        logger.info(f"Resolver warmed with {self.workers} workers")
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._remote is not None:
+            self._remote.close()
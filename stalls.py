@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from metrics import LOOP_LAG
+
+logger = logging.getLogger(__name__)
+
+# ----------------- Configuration -----------------
+
+STALL_THRESHOLD = float(os.getenv('HIMARI_STALL_THRESHOLD', '0.25'))  # seconds without a heartbeat
+BEAT_INTERVAL   = 0.05
+STACK_LIMIT     = 12
+
+# -------------------------------------------------
+
+
+@dataclass
+class Offender:
+    label: str
+    stack: List[str]
+    count: int = 0
+    total: float = 0.0
+    worst: float = 0.0
+    last_seen: float = field(default_factory=time.time)
+
+
+class LoopWatchdog:
+    """
+    Measures event-loop lag and catches the code that causes it.
+
+    A coroutine on the loop bumps a heartbeat every ``BEAT_INTERVAL``; a
+    helper thread checks it, and once the heartbeat is older than
+    ``STALL_THRESHOLD`` it grabs the loop thread's current stack and the
+    name of the running task. Commands tag their task with ``tag()`` so
+    a stall names the guild and command that caused it. When the loop
+    comes back the stall is logged and folded into per-location totals.
+    """
+
+    def __init__(self, threshold: float = STALL_THRESHOLD):
+        self.threshold = threshold
+        self.offenders: Dict[str, Offender] = {}
+        self.stalls = 0
+        self.lag    = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._beat = time.monotonic()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def tag(label: str):
+        """
+        Name the current task so stalls inside it can be attributed.
+        """
+        task = asyncio.current_task()
+        if task is not None:
+            task.set_name(label)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._loop.create_task(self._heartbeat(), name='watchdog-heartbeat')
+        threading.Thread(target=self._watch, name='loop-watchdog', daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    async def _heartbeat(self):
+        while not self._stopped.is_set():
+            before = time.monotonic()
+            await asyncio.sleep(BEAT_INTERVAL)
+            now = time.monotonic()
+            self.lag = max(0.0, now - before - BEAT_INTERVAL)
+            LOOP_LAG.set(self.lag)
+            self._beat = now
+
+    def _capture(self):
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = traceback.format_stack(frame, limit=STACK_LIMIT) if frame else []
+        task = asyncio.current_task(self._loop)
+        label = task.get_name() if task is not None else '<callback>'
+        return label, stack
+
+    def _watch(self):
+        while not self._stopped.wait(BEAT_INTERVAL):
+            beat = self._beat
+            if time.monotonic() - beat < self.threshold:
+                continue
+            label, stack = self._capture()
+            # wait for the loop to come back to measure the whole stall
+            while self._beat == beat and not self._stopped.wait(BEAT_INTERVAL):
+                pass
+            self._record(label, stack, time.monotonic() - beat)
+
+    def _record(self, label: str, stack: List[str], duration: float):
+        # the innermost frames identify the blocking call site
+        key = ''.join(stack[-2:]) or label
+        with self._lock:
+            self.stalls += 1
+            off = self.offenders.get(key)
+            if off is None:
+                off = self.offenders[key] = Offender(label, stack)
+            off.count += 1
+            off.total += duration
+            off.worst = max(off.worst, duration)
+            off.label = label
+            off.last_seen = time.time()
+        logger.warning(
+            f"Event loop blocked for {duration:.2f}s in task {label!r}:\n" + ''.join(stack[-6:])
+        )
+
+    def report(self, top: int = 5) -> str:
+        with self._lock:
+            worst = sorted(self.offenders.values(), key=lambda o: o.total, reverse=True)[:top]
+            stalls = self.stalls
+        if not worst:
+            return 'No event loop stalls recorded.'
+        lines = [f'{stalls} stalls over {self.threshold:.2f}s, worst offenders:']
+        for i, off in enumerate(worst, 1):
+            where = off.stack[-1].strip().splitlines()[0] if off.stack else '?'
+            lines.append(
+                f'{i}. {off.count}x, total {off.total:.2f}s, worst {off.worst:.2f}s — {off.label}\n   {where}'
+            )
+        return '\n'.join(lines)
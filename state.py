@@ -0,0 +1,56 @@
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+STATE_PATH = os.getenv('HIMARI_STATE_PATH', './himari_state.json')
+
+
+class StateStore:
+    """
+    Tiny JSON store for things worth remembering across the timed restarts,
+    like which channel and message each guild's announcement lives in.
+
+    Everything is kept in memory; ``save()`` rewrites the file atomically
+    and is a no-op when nothing changed.
+    """
+
+    def __init__(self, path: Optional[str] = STATE_PATH):
+        self.path  = path
+        self.data: Dict[str, Any] = {}
+        self.dirty = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError):
+                logger.warning(f"Ignoring unreadable state file {path}")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def set(self, key: str, value: Any):
+        if self.data.get(key) != value:
+            self.data[key] = value
+            self.dirty = True
+
+    def guild(self, guild_id: int) -> Dict[str, Any]:
+        return self.data.setdefault('guilds', {}).setdefault(str(guild_id), {})
+
+    def update_guild(self, guild_id: int, **values):
+        entry = self.guild(guild_id)
+        for k, v in values.items():
+            if entry.get(k) != v:
+                entry[k] = v
+                self.dirty = True
+
+    def save(self):
+        if not self.dirty or not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, separators=(',', ':'))
+        os.replace(tmp, self.path)
+        self.dirty = False
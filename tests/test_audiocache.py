@@ -0,0 +1,78 @@
+import asyncio
+import os
+import sys
+import time
+
+from audiocache import MB, AudioCache
+
+
+def fake_ffmpeg(tmp_path, size: int) -> str:
+    # writes ``size`` bytes to the output file, the last argument
+    script = tmp_path / 'ffmpeg'
+    script.write_text(f"#!{sys.executable}\nimport sys\nopen(sys.argv[-1], 'wb').write(b'x' * {size})\n")
+    script.chmod(0o755)
+    return str(script)
+
+
+def cache(tmp_path, size: int = MB, **kw) -> AudioCache:
+    kw = {'budget_mb': 10, 'min_plays': 1, 'quota_mb': 5, **kw}
+    return AudioCache(str(tmp_path / 'audio'), ffmpeg=fake_ffmpeg(tmp_path, size), **kw)
+
+
+def consider(audio: AudioCache, video_id: str, duration: float = 60):
+    # 128 kbps for a minute is just under 1 MB
+    audio.consider(video_id, 'http://x', plays=3, codec='opus', abr=128, duration=duration)
+
+
+def test_fetches_count_against_the_quota_while_running(tmp_path):
+    async def main():
+        audio = cache(tmp_path)
+        for i in range(8):
+            consider(audio, f'v{i}')
+        assert len(audio._inflight) == 5
+        await asyncio.gather(*audio._inflight.values())
+        assert sorted(audio.entries) == [f'v{i}' for i in range(5)]
+        audio.close()
+    asyncio.run(main())
+
+
+def test_processes_share_the_index_and_quota(tmp_path):
+    async def main():
+        one, two = cache(tmp_path), cache(tmp_path)
+        consider(one, 'a')
+        await asyncio.gather(*one._inflight.values())
+        assert two.has('a') and two.open('a')[0].endswith('a.webm')
+        consider(two, 'a')
+        assert not two._inflight
+        for i in range(6):
+            consider(two, f'v{i}')
+        assert len(two._inflight) == 4
+        await asyncio.gather(*two._inflight.values())
+        one.close()
+        two.close()
+    asyncio.run(main())
+
+
+def test_budget_evicts_least_recently_played(tmp_path):
+    async def main():
+        audio = cache(tmp_path, size=3 * MB, budget_mb=7, quota_mb=100)
+        for video_id in ('a', 'b', 'c'):
+            consider(audio, video_id)
+            await asyncio.gather(*audio._inflight.values())
+            if video_id == 'b':
+                audio.open('a')
+        assert sorted(audio.entries) == ['a', 'c']
+        audio.close()
+    asyncio.run(main())
+
+
+def test_only_stale_partial_files_are_removed(tmp_path):
+    directory = tmp_path / 'audio'
+    directory.mkdir()
+    stale, live = directory / 'a.webm.1.part', directory / 'b.webm.2.part'
+    stale.write_bytes(b'x')
+    live.write_bytes(b'x')
+    old = time.time() - 3600
+    os.utime(stale, (old, old))
+    cache(tmp_path).close()
+    assert not stale.exists() and live.exists()
@@ -0,0 +1,20 @@
+import pytest
+
+from lyrics import clean_title
+
+
+@pytest.mark.parametrize('title, artist, expected', [
+    ('Artist - Song (Official Video)', 'Artist', 'Song'),
+    ('Song (feat. Other)', 'Artist', 'Song'),
+    ('Song [ft. A & B] - Live', 'Artist', 'Song - Live'),
+    ('Song feat. Other', 'Artist', 'Song'),
+    ('Artist - Song ft. Other - Remix', 'Artist', 'Song - Remix'),
+    ('Artist - Song featuring Other | Lyrics', 'Artist', 'Song'),
+    ('Artist - Song - Official Music Video', 'Artist', 'Song'),
+    ('Song | Lyric Video', '', 'Song'),
+    ('Artist - Clean', 'Artist', 'Clean'),
+    ('Artist - Video', 'Artist', 'Video'),
+    ('Song', '', 'Song'),
+])
+def test_clean_title(title, artist, expected):
+    assert clean_title(title, artist) == expected
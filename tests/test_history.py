@@ -0,0 +1,33 @@
+from history import PlayHistoryIndex
+
+
+def meta(video_id: str, title: str, artist: str = 'Artist') -> dict:
+    return {'video_id': video_id, 'title': title, 'artist': artist, 'album': '', 'duration': 200}
+
+
+def test_search_ranks_plays_and_prefixes(tmp_path):
+    index = PlayHistoryIndex(str(tmp_path / 'h.db'))
+    index.record(meta('a', 'Blue Bird'), now=1000)
+    index.record(meta('b', 'Bluebird Lament'), now=1000)
+    index.record(meta('b', 'Bluebird Lament'), now=1001)
+    index.record(meta('c', 'Red'), now=1000)
+    assert [m['video_id'] for m in index.search('blue')] == ['b', 'a']
+    assert [m['video_id'] for m in index.search('bird')] == ['b', 'a']
+    assert index.search('green') == []
+    index.close()
+
+
+def test_processes_sharing_the_db_add_up(tmp_path):
+    path = str(tmp_path / 'h.db')
+    one, two = PlayHistoryIndex(path), PlayHistoryIndex(path)
+    one.record(meta('a', 'Song'), now=1000)
+    two.record(meta('a', 'Song'), now=1001)
+    one.record(meta('a', 'Song'), now=1002)
+    assert one.plays('a') == 3
+    two.record(meta('b', 'Other'), now=1003)
+    one.sync()
+    assert one.plays('a') == 3 and one.plays('b') == 1
+    assert [m['video_id'] for m in one.search('other')] == ['b']
+    one.close()
+    two.close()
+    assert PlayHistoryIndex(path).plays('a') == 3
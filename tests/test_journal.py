@@ -0,0 +1,104 @@
+import os
+
+from journal import QueueJournal
+
+G = 1
+
+
+def crash(journal: QueueJournal):
+    # going down without the compaction close() does
+    journal._file.close()
+
+
+def reopen(path) -> tuple:
+    journal = QueueJournal(str(path))
+    queue, history = journal.restore(G)
+    journal.close()
+    return queue, history
+
+
+def test_replays_every_mutation(tmp_path):
+    path = tmp_path / 'journal.log'
+    journal = QueueJournal(str(path))
+    journal.enqueue(G, list('abcdef'))
+    journal.pop(G)            # a playing
+    journal.finish(G)
+    journal.pop(G)            # b playing
+    journal.move(G, 0, 2)     # d e c f
+    journal.remove(G, 3)      # d e c
+    journal.enqueue(2, ['x'])
+    expected = list(journal.guilds[G].queue)
+    crash(journal)
+    queue, history = reopen(path)
+    # b was playing: it goes back to the front
+    assert queue == ['b'] + expected == list('bdec')
+    assert history == ['a']
+
+
+def test_shuffle_replays_the_same_order(tmp_path):
+    path = tmp_path / 'journal.log'
+    journal = QueueJournal(str(path))
+    journal.enqueue(G, list(range(100)))
+    journal.shuffle(G, 7)
+    expected = list(journal.guilds[G].queue)
+    crash(journal)
+    assert reopen(path)[0] == expected != list(range(100))
+
+
+def test_compaction_keeps_the_state(tmp_path):
+    path = tmp_path / 'journal.log'
+    journal = QueueJournal(str(path), compact_every=5)
+    for i in range(12):
+        journal.enqueue(G, [i])
+    journal.remove(G, 0)
+    assert os.path.exists(f"{path}.snap")
+    assert len(path.read_text().splitlines()) < 5
+    crash(journal)
+    assert reopen(path)[0] == list(range(1, 12))
+
+
+def test_records_already_in_the_snapshot_are_skipped(tmp_path):
+    path = tmp_path / 'journal.log'
+    journal = QueueJournal(str(path))
+    journal.enqueue(G, ['a', 'b'])
+    journal.remove(G, 0)
+    log = path.read_text()
+    journal.compact()
+    journal.enqueue(G, ['c'])
+    crash(journal)
+    # a crash after the snapshot but before the log was truncated
+    path.write_text(log + path.read_text())
+    assert reopen(path)[0] == ['b', 'c']
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = tmp_path / 'journal.log'
+    journal = QueueJournal(str(path))
+    journal.enqueue(G, ['a', 'b'])
+    crash(journal)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"s":2,"g":1,"op":"cle')
+    assert reopen(path)[0] == ['a', 'b']
+
+
+def test_requeue_is_journaled(tmp_path):
+    path = tmp_path / 'journal.log'
+    journal = QueueJournal(str(path))
+    journal.enqueue(G, ['a', 'b'])
+    journal.pop(G)
+    crash(journal)
+    journal = QueueJournal(str(path))
+    assert journal.restore(G) == (['a', 'b'], [])
+    crash(journal)
+    # a second restart doesn't put the track in front twice
+    assert reopen(path) == (['a', 'b'], [])
+
+
+def test_tracks_go_through_dumps_and_loads(tmp_path):
+    path = tmp_path / 'journal.log'
+    journal = QueueJournal(str(path), dumps=lambda t: {'id': t}, loads=lambda d: d['id'].upper())
+    journal.enqueue(G, ['a'])
+    journal.close()
+    journal = QueueJournal(str(path), dumps=lambda t: {'id': t}, loads=lambda d: d['id'].upper())
+    assert journal.restore(G) == (['A'], [])
+    journal.close()
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from loudness import LOUDNESS_TOLERANCE, MAX_BOOST, MAX_CUT, LoudnessCache
+
+
+@pytest.fixture
+def cache():
+    c = LoudnessCache(path=None, jobs=1)
+    yield c
+    c.close()
+
+
+def measure(cache, video_id, i, tp):
+    cache.entries.set(video_id, {'i': i, 'tp': tp}, time.time() + 60)
+
+
+def test_unmeasured_is_none(cache):
+    assert cache.gain('nope') is None
+
+
+def test_off_by_default_ignores_old_measurements():
+    off = LoudnessCache(path=None)
+    measure(off, 'v', -7.8, 0.4)
+    assert off.gain('v') is None
+    off.close()
+
+
+def test_loud_track_is_cut(cache):
+    measure(cache, 'v', -7.8, 0.4)
+    assert cache.gain('v', target=-14) == -6.2
+
+
+def test_quiet_track_is_boosted_up_to_the_peak_ceiling(cache):
+    measure(cache, 'v', -20.0, -4.0)
+    assert cache.gain('v', target=-14) == 3.0
+
+
+@pytest.mark.parametrize('i, tp', [(-20.0, 1.5), (-14.5 - LOUDNESS_TOLERANCE, 2.0), (-30.0, -1.0)])
+def test_quiet_track_with_no_headroom_is_never_cut(cache, i, tp):
+    measure(cache, 'v', i, tp)
+    assert cache.gain('v', target=-14) == 0.0
+
+
+def test_close_to_target_passes_through(cache):
+    measure(cache, 'v', -14 + LOUDNESS_TOLERANCE / 2, -3.0)
+    assert cache.gain('v', target=-14) == 0.0
+
+
+def test_gain_is_clamped(cache):
+    measure(cache, 'quiet', -60.0, -40.0)
+    measure(cache, 'loud', 20.0, 3.0)
+    assert cache.gain('quiet', target=-14) == MAX_BOOST
+    assert cache.gain('loud', target=-14) == -MAX_CUT
+
+
+def test_silence_gets_no_gain(cache):
+    measure(cache, 'v', None, float('-inf'))
+    assert cache.gain('v') == 0.0
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from aiohttp import ClientResponseError, web
+
+from lyrics import LrcLibClient, LyricsCache
+
+
+async def serve(status: int, body):
+    async def handler(request):
+        return web.json_response(body, status=status)
+    app = web.Application()
+    app.router.add_get('/api/search', handler)
+    app.router.add_get('/api/get', handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+def lookup(status: int, body):
+    async def run():
+        runner, url = await serve(status, body)
+        client = LrcLibClient(url)
+        cache = LyricsCache(path=None, client=client)
+        try:
+            return await cache.load('Song', 'Artist', '', 200, 'vid'), cache
+        finally:
+            await client.close()
+            await runner.cleanup()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_errors_raise_and_are_not_cached(status):
+    async def run():
+        runner, url = await serve(status, {'message': 'nope'})
+        client = LrcLibClient(url)
+        cache = LyricsCache(path=None, client=client)
+        try:
+            with pytest.raises(ClientResponseError):
+                await cache.load('Song', 'Artist', '', 200, 'vid')
+            assert cache.entries.peek('v:vid') is None
+        finally:
+            await client.close()
+            await runner.cleanup()
+    asyncio.run(run())
+
+
+def test_empty_search_is_a_cached_miss():
+    timeline, cache = lookup(200, [])
+    assert len(timeline) == 0
+    assert cache.entries.peek('v:vid') is not None
+
+
+def test_found_lyrics_are_cached():
+    record = {'id': 1, 'trackName': 'Song', 'artistName': 'Artist', 'duration': 200,
+              'syncedLyrics': '[00:01.00]hello\n[00:02.00]world'}
+    timeline, cache = lookup(200, [record])
+    assert [timeline.line(i) for i in range(len(timeline))] == ['hello', 'world']
+    assert cache.entries.peek('v:vid') is timeline
@@ -0,0 +1,55 @@
+import pytest
+
+from lyrics import LyricsTimeline, parse_lrc
+
+
+def lines(timeline: LyricsTimeline) -> list:
+    return [(round(timeline.times[i], 3), timeline.line(i)) for i in range(len(timeline))]
+
+
+def test_sorted_with_shared_timestamps():
+    timeline = LyricsTimeline.from_lrc(
+        "[ar:Someone]\n"
+        "[00:10.00]second\n"
+        "[00:01.50][00:20.25]chorus\n"
+        "not a lyric line\n"
+        "[01:02.5]last\n"
+    )
+    assert lines(timeline) == [(1.5, 'chorus'), (10.0, 'second'), (20.25, 'chorus'), (62.5, 'last')]
+    # the repeated line is stored once
+    assert timeline.text.count('chorus') == 1
+
+
+def test_colon_centiseconds():
+    timeline = LyricsTimeline.from_lrc("[00:05:50]a\n[01:00:05]b\n[00:07:123]c")
+    assert lines(timeline) == [(5.5, 'a'), (7.123, 'c'), (60.05, 'b')]
+
+
+def test_word_tags_are_stripped():
+    timeline = LyricsTimeline.from_lrc("[00:01.00]<00:01.00> Hello <00:01.50> there <00:02:10>world")
+    assert lines(timeline) == [(1.0, 'Hello there world')]
+
+
+@pytest.mark.parametrize('offset, expected', [
+    ('500', [(0.5, 'a'), (2.5, 'b')]),     # positive: earlier
+    ('-500', [(1.5, 'a'), (3.5, 'b')]),    # negative: later
+    ('2000', [(0.0, 'a'), (1.0, 'b')]),    # never before the start
+    ('soon', [(1.0, 'a'), (3.0, 'b')]),    # ignored
+])
+def test_offset(offset, expected):
+    timeline = LyricsTimeline.from_lrc(f"[offset:{offset}]\n[00:01.00]a\n[00:03.00]b")
+    assert lines(timeline) == expected
+
+
+def test_window():
+    timeline = LyricsTimeline.from_lrc("[00:01.00]a\n[00:02.00]b\n[00:03.00]c")
+    assert timeline.window(0.5) == ('♪', '♪', 'a')
+    assert timeline.window(1.0) == ('♪', 'a', 'b')
+    assert timeline.window(2.5) == ('a', 'b', 'c')
+    assert timeline.window(99) == ('b', 'c', '♪')
+
+
+def test_json_round_trip_and_synced_lists():
+    timeline = parse_lrc([{'timestamp': 2, 'words': 'b'}, {'timestamp': 1, 'word': 'a'}])
+    assert lines(timeline) == [(1.0, 'a'), (2.0, 'b')]
+    assert lines(LyricsTimeline.from_json(timeline.to_json())) == lines(timeline)
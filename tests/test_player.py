@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from bench.fakes import FakeGuild, FakeSource, FakeVoiceChannel
+from player import START_ATTEMPTS, ConnectError, GuildPlayer, PlayerState, StartError
+
+
+def run_player(body, prepare=None):
+    async def main():
+        started = asyncio.Event()
+
+        async def default_prepare(player, track, start=0.0):
+            return FakeSource(frames=10_000)
+
+        async def on_start(player, track):
+            started.set()
+
+        async def on_error(player, track):
+            pass
+
+        player = GuildPlayer(FakeGuild(1), prepare=prepare or default_prepare, on_start=on_start, on_error=on_error)
+        try:
+            await player.enqueue(['song'], voice_channel=FakeVoiceChannel(speed=1, latency=0))
+            await asyncio.wait_for(started.wait(), 5)
+            await body(player)
+        finally:
+            await player.stop()
+            player.close()
+            await asyncio.sleep(0.1)   # let the fake voice threads see the stop before the loop closes
+    asyncio.run(main())
+
+
+def test_seek_restarts_at_position():
+    async def body(player):
+        assert await player.seek(30)
+        assert player.state is PlayerState.PLAYING
+        assert 30 <= player.position < 31
+    run_player(body)
+
+
+def test_failed_seek_keeps_the_old_source_playing():
+    async def prepare(player, track, start=0.0):
+        if start:
+            raise RuntimeError('stream expired')
+        return FakeSource(frames=10_000)
+
+    async def body(player):
+        source = player.source
+        with pytest.raises(RuntimeError):
+            await player.seek(30)
+        assert player.source is source and player.current == 'song'
+        assert player.state is PlayerState.PLAYING
+        assert await player.skip()
+    run_player(body, prepare)
+
+
+class DeniedChannel(FakeVoiceChannel):
+    async def connect(self):
+        raise RuntimeError('missing permissions')
+
+
+def start_with(prepare, channel) -> tuple:
+    errors = []
+
+    async def main():
+        async def on_start(player, track):
+            pass
+
+        async def on_error(player, track):
+            errors.append(track)
+
+        player = GuildPlayer(FakeGuild(1), prepare=prepare, on_start=on_start, on_error=on_error)
+        try:
+            with pytest.raises(StartError) as e:
+                await player.enqueue(range(200), voice_channel=channel)
+            return e.value, player.state, len(player.queue)
+        finally:
+            player.close()
+    return (*asyncio.run(main()), errors)
+
+
+def test_failed_connect_keeps_the_queue():
+    async def prepare(player, track, start=0.0):
+        return FakeSource()
+
+    error, state, queued, errors = start_with(prepare, DeniedChannel())
+    assert isinstance(error, ConnectError)
+    assert state is PlayerState.IDLE and queued == 200 and errors == []
+
+
+def test_failing_prepares_stop_after_a_few():
+    async def prepare(player, track, start=0.0):
+        raise RuntimeError('resolver down')
+
+    error, state, queued, errors = start_with(prepare, FakeVoiceChannel(latency=0))
+    assert not isinstance(error, ConnectError)
+    assert state is PlayerState.IDLE
+    assert queued == 200 - START_ATTEMPTS and errors == list(range(START_ATTEMPTS))
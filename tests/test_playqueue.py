@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+import playqueue
+from playqueue import PlayQueue
+
+
+@pytest.fixture(params=[4, 128], ids=['small-blocks', 'default-blocks'])
+def block(request, monkeypatch):
+    # small blocks make splits and emptied blocks happen within a few hundred items
+    monkeypatch.setattr(playqueue, 'BLOCK', request.param)
+    return request.param
+
+
+def check(queue: PlayQueue, model: list):
+    assert len(queue) == len(model)
+    assert list(queue) == model
+    for i in range(0, len(model), 7):
+        assert queue[i] == model[i]
+    if model:
+        assert queue[-1] == model[-1]
+
+
+def test_matches_a_list_under_random_edits(block):
+    rng = random.Random(1)
+    queue, model = PlayQueue(range(50)), list(range(50))
+    counter = 50
+    for _ in range(3000):
+        op = rng.choice(['append', 'extend', 'insert', 'appendleft', 'pop', 'popleft', 'move', 'page'])
+        if op == 'append':
+            queue.append(counter)
+            model.append(counter)
+            counter += 1
+        elif op == 'extend':
+            items = list(range(counter, counter + rng.randrange(20)))
+            queue.extend(items)
+            model.extend(items)
+            counter += len(items)
+        elif op in ('insert', 'appendleft'):
+            index = rng.randrange(-len(model) - 2, len(model) + 2) if op == 'insert' else 0
+            queue.insert(index, counter)
+            model.insert(index, counter)
+            counter += 1
+        elif not model:
+            continue
+        elif op == 'pop':
+            index = rng.randrange(-len(model), len(model))
+            assert queue.pop(index) == model.pop(index)
+        elif op == 'popleft':
+            assert queue.popleft() == model.pop(0)
+        elif op == 'move':
+            src, dst = rng.randrange(len(model)), rng.randrange(len(model))
+            item = model.pop(src)
+            model.insert(dst, item)
+            assert queue.move(src, dst) == item
+        elif op == 'page':
+            start, count = rng.randrange(len(model) + 5), rng.randrange(30)
+            assert queue.page(start, count) == model[start:start + count]
+        if rng.random() < 0.05:
+            check(queue, model)
+    check(queue, model)
+
+
+def test_index_errors(block):
+    queue = PlayQueue(range(3))
+    with pytest.raises(IndexError):
+        queue[3]
+    with pytest.raises(IndexError):
+        queue.pop(-4)
+    queue.clear()
+    with pytest.raises(IndexError):
+        queue.popleft()
+    assert queue.page(0, 10) == []
+
+
+def test_seeded_shuffle_is_reproducible(block):
+    a, b = PlayQueue(range(300)), PlayQueue(range(300))
+    a.shuffle(42)
+    b.shuffle(42)
+    assert list(a) == list(b) != list(range(300))
+    assert sorted(a) == list(range(300))
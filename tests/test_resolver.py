@@ -0,0 +1,42 @@
+import asyncio
+import threading
+import time
+from contextlib import aclosing
+
+from resolver import PLAYLIST_BATCH, StreamResolver
+
+
+class FakeFlatYDL:
+    def __init__(self):
+        self.fetched = 0
+        self.done = threading.Event()
+
+    def extract_info(self, url, download=False, process=False):
+        def entries():
+            try:
+                for i in range(500):
+                    time.sleep(0.001)   # paging
+                    self.fetched += 1
+                    yield {'id': f'v{i}'}
+            finally:
+                self.done.set()
+        return {'_type': 'playlist', 'entries': entries()}
+
+
+def test_closing_a_playlist_stops_the_walk():
+    ydl = FakeFlatYDL()
+
+    async def main():
+        resolver = StreamResolver(socket=None)
+        resolver._flat_ydl = lambda: ydl
+        try:
+            async with aclosing(resolver.playlist('https://music.youtube.com/playlist?list=x')) as batches:
+                async for batch in batches:
+                    assert len(batch) == PLAYLIST_BATCH
+                    break
+            await asyncio.get_running_loop().run_in_executor(None, ydl.done.wait, 5)
+        finally:
+            resolver.close()
+
+    asyncio.run(main())
+    assert ydl.done.is_set() and ydl.fetched < 100
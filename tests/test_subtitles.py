@@ -0,0 +1,40 @@
+import asyncio
+
+import transliterate
+from lyrics import LyricsTimeline
+from transliterate import Subtitles
+
+
+def test_translations_are_cached_per_target_language(monkeypatch):
+    calls = []
+
+    def fake_translate():
+        target = transliterate.TRANSLATE_TO
+
+        def convert(lines):
+            calls.append(target)
+            return [f"{target}:{line}" for line in lines]
+        return convert
+
+    monkeypatch.setitem(transliterate.BACKENDS, 'translate', fake_translate)
+    monkeypatch.setattr(transliterate, '_loaded', {})
+    timeline = LyricsTimeline.from_lines([(1.0, 'こんにちは')])
+
+    async def load(subtitles):
+        result = await subtitles.load('vid', timeline, 'translate')
+        return result.line(0)
+
+    async def main():
+        subtitles = Subtitles()
+        try:
+            assert await load(subtitles) == 'en:こんにちは'
+            monkeypatch.setattr(transliterate, 'TRANSLATE_TO', 'de')
+            monkeypatch.setattr(transliterate, '_loaded', {})
+            assert await load(subtitles) == 'de:こんにちは'
+            assert await load(subtitles) == 'de:こんにちは'
+        finally:
+            subtitles.close()
+
+    monkeypatch.setattr(transliterate, 'TRANSLATE_TO', 'en')
+    asyncio.run(main())
+    assert calls == ['en', 'de']
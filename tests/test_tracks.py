@@ -0,0 +1,35 @@
+import asyncio
+
+from bench.fakes import StubResolver
+from cache import ResolveCache
+from history import PlayHistoryIndex
+from tracks import PICK_PREFIX, TrackSource
+
+
+class CountingResolver(StubResolver):
+    def __init__(self):
+        super().__init__(search_latency=0, extract_latency=0)
+        self.searches = []
+
+    def _search(self, query):
+        self.searches.append(query)
+        return super()._search(query)
+
+
+def fetch(queries, history):
+    async def main():
+        resolver = CountingResolver()
+        tracks = TrackSource(resolver, ResolveCache(path=None), history=history)
+        try:
+            return [await tracks.fetch(q) for q in queries], resolver.searches
+        finally:
+            resolver.close()
+    return asyncio.run(main())
+
+
+def test_picks_skip_the_search_and_fall_back_to_it():
+    history = PlayHistoryIndex(path=None)
+    history.record({'video_id': 'known', 'title': 'Known', 'artist': 'A', 'album': '', 'duration': 100})
+    found, searches = fetch([f"{PICK_PREFIX}known", f"{PICK_PREFIX}evicted", 'id:typed'], history)
+    assert found[0].video_id == 'known' and found[0].title == 'Known'
+    assert searches == ['evicted', 'id:typed']
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import discord
+
+from audiocache import AudioCache
+from cache import ResolveCache
+from history import PlayHistoryIndex
+from loudness import LoudnessCache
+from metrics import timed
+from resolver import StreamResolver
+
+logger = logging.getLogger(__name__)
+
+# ----------------- Configuration -----------------
+
+# Target kbps when a source has to be transcoded (override per guild with /bitrate)
+DEFAULT_BITRATE = int(os.getenv('HIMARI_BITRATE', '128'))
+
+FFMPEG_BEFORE_OPTS = '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5'
+FFMPEG_OPTS        = '-vn -sn -dn'
+
+# /play autocomplete answers with this prefix + videoId instead of the title;
+# unlikely enough in a typed query that anything else is searched as usual
+PICK_PREFIX = 'himari-pick:'
+
+# -------------------------------------------------
+
+
+# IDs and display text only: the stream URL, its codec and the thumbnail live in
+# the resolve cache under video_id, so queues of thousands of tracks stay small
+@dataclass(slots=True)
+class Track:
+    video_id: str
+    title: str
+    artist: str
+    album: str
+    duration: float
+    secret: bool = False
+    lyrics: Optional[asyncio.Task] = None       # background lyrics fetch
+
+
+TRACK_RECORD = ('video_id', 'title', 'artist', 'album', 'duration', 'secret')
+
+
+def track_record(track: Track) -> dict:
+    # what the queue journal keeps
+    return {k: getattr(track, k) for k in TRACK_RECORD}
+
+
+def track_from_record(record: dict) -> Track:
+    # resolved just before it plays, like playlist entries
+    return Track(**{k: record[k] for k in TRACK_RECORD if k in record})
+
+
+def parse_duration(text: Optional[str]) -> int:
+    # YT Music's 'm:ss' / 'h:mm:ss'
+    seconds = 0
+    for part in (text or '0').split(':'):
+        seconds = seconds * 60 + int(part or 0)
+    return seconds
+
+
+def stream_probe(stream: dict) -> Optional[Tuple[str, int]]:
+    """
+    (codec, bitrate) straight from yt-dlp's format metadata, when it has them.
+    """
+    if not stream.get('codec') or stream['codec'] == 'none':
+        return None
+    return stream['codec'], int(stream.get('abr') or 0)
+
+
+class TrackSource:
+    """
+    Queries to Tracks and Tracks to audio: the search and the stream
+    extraction run on the resolver pool behind both levels of the resolve
+    cache, and ``make_source`` builds the ffmpeg source that plays a track
+    from the audio cache or its stream URL.
+
+    Lives outside main.py, which starts the bot when imported, so the
+    benchmarks can drive the code the bot runs. The play history, audio
+    cache and loudness cache default to disabled ones.
+    """
+
+    def __init__(
+        self,
+        resolver: StreamResolver,
+        cache: ResolveCache,
+        *,
+        history: Optional[PlayHistoryIndex] = None,
+        audio_cache: Optional[AudioCache] = None,
+        loudness: Optional[LoudnessCache] = None,
+        bitrates: Optional[Dict[int, int]] = None,
+    ):
+        self.resolver    = resolver
+        self.cache       = cache
+        self.history     = history or PlayHistoryIndex(path=None)
+        self.audio_cache = audio_cache or AudioCache(dir=None)
+        self.loudness    = loudness or LoudnessCache(path=None, jobs=0)
+        self.bitrates    = bitrates if bitrates is not None else {}   # guild_id -> transcode target in kbps
+        self._resolving: Dict[str, asyncio.Task] = {}   # video_id -> extraction shared by every caller
+
+    # ---- metadata ----
+
+    async def fetch(self, query: str, guild_id: Optional[int] = None) -> Track:
+        # level 0: an autocomplete pick already names the track, no search needed
+        meta = None
+        if query.startswith(PICK_PREFIX):
+            # if it was evicted since it was suggested, its videoId is searched for instead
+            query = query[len(PICK_PREFIX):]
+            meta = self.history.get(query)
+        # level 1: query -> metadata (search runs on the resolver pool)
+        if meta is None:
+            meta = self.cache.get_query(query)
+        if meta is None:
+            item = await self.resolver.search(query, guild_id=guild_id)
+            if not item:
+                raise ValueError("Track not found")
+            meta = {
+                'video_id': item['videoId'],
+                'title': item['title'],
+                'artist': item['artists'][0]['name'] if item.get('artists') else 'Unknown',
+                'album': item['album']['name'] if item.get('album') else '',
+                'duration': parse_duration(item.get('duration')),
+            }
+            self.cache.set_query(query, meta)
+
+        # level 2: videoId -> direct audio, valid until shortly before expire=
+        await self.resolve_stream(meta['video_id'], guild_id)
+        return Track(
+            video_id=meta['video_id'],
+            title=meta['title'],
+            artist=meta['artist'],
+            album=meta['album'],
+            duration=meta['duration'],
+        )
+
+    def thumbnail(self, track: Track) -> str:
+        stream = self.cache.streams.peek(track.video_id)
+        if stream and stream.get('thumbnail'):
+            return stream['thumbnail']
+        return f"https://i.ytimg.com/vi/{track.video_id}/hqdefault.jpg"
+
+    # ---- streams ----
+
+    async def resolve_stream(self, video_id: str, guild_id: Optional[int] = None) -> dict:
+        stream = self.cache.get_stream(video_id)
+        if stream is not None:
+            return stream
+        # the prefetcher and a starting track often want the same one: extract it once
+        task = self._resolving.get(video_id)
+        if task is None:
+            task = self._resolving[video_id] = asyncio.create_task(self._extract(video_id, guild_id))
+            task.add_done_callback(lambda _: self._resolving.pop(video_id, None))
+        # shielded, so a caller giving up doesn't throw away an extraction others wait on
+        return await asyncio.shield(task)
+
+    async def _extract(self, video_id: str, guild_id: Optional[int]) -> dict:
+        info = await self.resolver.extract(f"https://www.youtube.com/watch?v={video_id}", guild_id=guild_id)
+        stream = {
+            'url': info['url'],
+            'thumbnail': info.get('thumbnail'),
+            'codec': info.get('acodec'),
+            'abr': info.get('abr'),
+        }
+        self.cache.set_stream(video_id, stream)
+        return stream
+
+    async def probe_stream(self, video_id: str, stream: dict) -> Tuple[str, int]:
+        # only when yt-dlp didn't say; the result is cached with the stream
+        async with timed('ffmpeg_probe'):
+            codec, bitrate = await discord.FFmpegOpusAudio.probe(stream['url'])
+        stream['codec'], stream['abr'] = codec, bitrate
+        self.cache.set_stream(video_id, stream)
+        return codec, bitrate
+
+    async def warm(self, track: Track, guild_id: int):
+        """
+        Resolve and probe a track ahead of time, unless it plays from disk.
+        """
+        # a track in the audio cache plays from disk and needs no stream URL
+        if self.audio_cache.has(track.video_id):
+            return
+        # the stream cache drops URLs shortly before expire=, so this re-resolves stale ones
+        stream = await self.resolve_stream(track.video_id, guild_id)
+        if stream_probe(stream) is None:
+            await self.probe_stream(track.video_id, stream)
+        self.loudness.analyze(track.video_id, stream['url'])
+
+    # ---- sources ----
+
+    async def open_stream(self, track: Track, guild_id: int) -> Tuple[str, str, int, bool]:
+        """
+        (input, codec, bitrate, remote) for a track: the local copy when the
+        audio cache has one, otherwise its (usually prefetched) stream URL.
+        """
+        local = self.audio_cache.open(track.video_id)
+        if local is not None:
+            return local[0], 'opus', local[1], False
+        stream = await self.resolve_stream(track.video_id, guild_id)
+        codec, bitrate = stream_probe(stream) or await self.probe_stream(track.video_id, stream)
+        if self.loudness.gain(track.video_id) is None:
+            self.loudness.analyze(track.video_id, stream['url'])   # for the next time it plays
+        if not track.secret:
+            self.audio_cache.consider(
+                track.video_id, stream['url'],
+                plays=self.history.plays(track.video_id), codec=codec, abr=bitrate, duration=track.duration,
+            )
+        return stream['url'], codec, bitrate, True
+
+    def source_args(self, track: Track, guild_id: int, codec: str, bitrate: int, remote: bool, start: float = 0.0) -> dict:
+        """
+        FFmpegOpusAudio arguments for an opened stream. Opus sources
+        (YouTube's usual bestaudio) are passed through with codec copy;
+        anything else, or a guild asking for less than the source has, is
+        transcoded to the guild's target bitrate. So is a track whose
+        measured loudness is too far off target, with a fixed volume gain.
+
+        ``start`` seeks on the input side: ffmpeg jumps there with an HTTP
+        range request (or a file seek) instead of decoding its way to it, so
+        seeks are near instant.
+        """
+        gain = self.loudness.gain(track.video_id)
+        options = FFMPEG_OPTS
+        if gain:
+            # a filter needs decoded audio, so this can't be a codec copy
+            options = f"{FFMPEG_OPTS} -af volume={gain}dB"
+        target = self.bitrates.get(guild_id)
+        if gain or codec != 'opus' or (target and bitrate and target < bitrate):
+            # discord.py maps codec='opus' to -c:a copy and anything else to libopus
+            codec = None
+            bitrate = target or DEFAULT_BITRATE
+        before = FFMPEG_BEFORE_OPTS if remote else ''
+        if start:
+            before = f"-ss {start:.2f} {before}"
+        return {
+            'codec': codec,
+            'bitrate': bitrate or DEFAULT_BITRATE,
+            'before_options': before or None,
+            'options': options,
+        }
+
+    async def make_source(self, track: Track, guild_id: int, start: float = 0.0) -> discord.FFmpegOpusAudio:
+        source, codec, bitrate, remote = await self.open_stream(track, guild_id)
+        return discord.FFmpegOpusAudio(source, **self.source_args(track, guild_id, codec, bitrate, remote, start))
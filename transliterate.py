@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from cache import TTLCache
+from lyrics import LyricsTimeline
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# ----------------- Configuration -----------------
+
+SUBTITLE_DEFAULT = os.getenv('HIMARI_LYRICS_SUBTITLES', '')       # backend shown under lyrics, empty = none
+TRANSLATE_TO     = os.getenv('HIMARI_TRANSLATE_TO', 'en')
+SUBTITLE_MAXSIZE = int(os.getenv('HIMARI_SUBTITLE_MAXSIZE', '2048'))
+SUBTITLE_TTL     = 30 * 24 * 3600
+
+# -------------------------------------------------
+
+Convert = Callable[[List[str]], List[str]]
+
+_KANA   = re.compile(r'[぀-ヿ]')
+_HANGUL = re.compile(r'[가-힯]')
+_HAN    = re.compile(r'[一-鿿]')
+
+
+# ---- backends ----
+# each factory imports its library on first use and returns a batch
+# converter: every line of a track goes through it in one call
+
+def _romaji() -> Convert:
+    import pykakasi
+    kks = pykakasi.kakasi()
+
+    def convert(lines: List[str]) -> List[str]:
+        return [' '.join(p['hepburn'] for p in kks.convert(line) if p['hepburn'].strip()) for line in lines]
+    return convert
+
+
+def _pinyin() -> Convert:
+    from pypinyin import lazy_pinyin
+
+    def convert(lines: List[str]) -> List[str]:
+        return [' '.join(lazy_pinyin(line)) for line in lines]
+    return convert
+
+
+def _latin() -> Convert:
+    from unidecode import unidecode
+
+    def convert(lines: List[str]) -> List[str]:
+        return [unidecode(line) for line in lines]
+    return convert
+
+
+def _source_language(lines: List[str]) -> Optional[str]:
+    # good enough for the languages people want translated lyrics for
+    text = ''.join(lines)
+    if _KANA.search(text):
+        return 'ja'
+    if _HANGUL.search(text):
+        return 'ko'
+    if _HAN.search(text):
+        return 'zh'
+    return None
+
+
+def _translate() -> Convert:
+    from argostranslate import translate
+    if not translate.get_installed_languages():
+        raise ImportError('no argostranslate language packages are installed')
+
+    def convert(lines: List[str]) -> List[str]:
+        source = _source_language(lines)
+        if source is None or source == TRANSLATE_TO:
+            return list(lines)
+        translation = translate.get_translation_from_codes(source, TRANSLATE_TO)
+        if translation is None:
+            raise LookupError(f"No argostranslate package for {source} -> {TRANSLATE_TO}")
+        return [translation.translate(line) if line.strip() else line for line in lines]
+    return convert
+
+
+BACKENDS: Dict[str, Callable[[], Convert]] = {
+    'romaji': _romaji,
+    'pinyin': _pinyin,
+    'latin': _latin,
+    'translate': _translate,
+}
+
+
+_loaded: Dict[str, Optional[Convert]] = {}
+_load_lock = threading.Lock()
+
+
+def register(name: str, factory: Callable[[], Convert]):
+    """
+    Add a backend: ``factory`` returns a function converting a batch of lines.
+    """
+    BACKENDS[name] = factory
+
+
+def backend(name: str) -> Optional[Convert]:
+    """
+    The converter for ``name``, or None if its library isn't installed.
+    Blocking: the first call imports the library.
+    """
+    with _load_lock:
+        if name not in _loaded:
+            try:
+                _loaded[name] = BACKENDS[name]()
+            except ImportError as e:
+                logger.warning(f"Lyrics backend '{name}' is unavailable: {e}")
+                _loaded[name] = None
+        return _loaded[name]
+
+
+def available(name: str) -> bool:
+    return name in BACKENDS and _loaded.get(name, True) is not None
+
+
+# ---- pipeline ----
+
+def map_lines(timeline: LyricsTimeline, convert: Convert) -> LyricsTimeline:
+    """
+    The same timeline with every distinct line run through ``convert`` in
+    one batch; timestamps stay as they are, so the two line up index for index.
+    """
+    chunks = timeline.text.split('\n')
+    offsets, pos = {}, 0
+    for i, chunk in enumerate(chunks):
+        offsets[pos] = i
+        pos += len(chunk) + 1
+    converted = convert(chunks)
+    if len(converted) != len(chunks):
+        raise ValueError(f"Backend returned {len(converted)} lines for {len(chunks)}")
+    lines = [
+        (ts, converted[offsets[start]])
+        for ts, start in zip(timeline.times, timeline.starts)
+    ]
+    return LyricsTimeline.from_lines(lines)
+
+
+_LRC_PREFIX = re.compile(r'(?:\s*\[[^\]]*\])*\s*')
+
+
+def convert_lrc(raw: str, name: str) -> str:
+    """
+    Convert the text of raw LRC (or plain lyrics) with backend ``name``,
+    keeping every tag; unchanged if it isn't installed. Blocking.
+    """
+    convert = backend(name)
+    if convert is None:
+        return raw
+    tags, texts = [], []
+    for line in raw.splitlines():
+        m = _LRC_PREFIX.match(line)
+        tags.append(m.group(0))
+        texts.append(line[m.end():])
+    return '\n'.join(t + c for t, c in zip(tags, convert(texts)))
+
+
+class Subtitles:
+    """
+    Romanized or translated copies of lyric timelines, for showing under
+    the original line.
+
+    A whole track is converted in one job on a worker thread, so the
+    event loop never runs a backend and the now-playing loop only looks
+    lines up. Results are cached per (track, backend) in the lyrics
+    database.
+    """
+
+    def __init__(self, db=None):
+        self.entries = TTLCache(
+            'subtitles', SUBTITLE_MAXSIZE, db,
+            dumps=LyricsTimeline.to_json, loads=LyricsTimeline.from_json,
+        )
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='subtitles')
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def _convert(self, name: str, timeline: LyricsTimeline) -> Optional[LyricsTimeline]:
+        convert = backend(name)
+        if convert is None:
+            return None
+        with timed('lyrics_subtitles'):
+            return map_lines(timeline, convert)
+
+    async def load(self, key: str, timeline: LyricsTimeline, name: str) -> Optional[LyricsTimeline]:
+        """
+        ``timeline`` converted with backend ``name``; None if it isn't installed.
+        """
+        if not len(timeline) or not available(name):
+            return None
+        # translations are cached per target language, so changing it doesn't serve stale ones
+        cache_key = f"{key}|translate:{TRANSLATE_TO}" if name == 'translate' else f"{key}|{name}"
+        hit = self.entries.get(cache_key)
+        if hit is not None:
+            return hit
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = self._inflight[cache_key] = asyncio.ensure_future(
+                asyncio.get_running_loop().run_in_executor(self._pool, self._convert, name, timeline)
+            )
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        result = await asyncio.shield(task)
+        if result is not None:
+            self.entries.set(cache_key, result, time.time() + SUBTITLE_TTL)
+        return result
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)